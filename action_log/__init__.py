@@ -0,0 +1,217 @@
+import threading
+import typing
+from array import array
+from collections.abc import Sequence
+from basic_types import Action, LazyText
+from persistent_collections import PersistentVector
+
+_ID_SIZE = 16
+_ID_LIMIT = 1 << (8 * _ID_SIZE)
+# Descriptions mostly have default values, so they are kept in a string table. Names are usually unique,
+# they are stored as UTF-8 in one bytearray. LazyText names and descriptions are kept as they are and
+# formatted only when their action is read
+_STRING_FIELDS = ('short_description', 'full_description', 'visibility_level')
+_OBJECT_FIELDS = ('previous_value', 'actual_value', 'function', 'rollback_function')
+
+
+class _Columns:
+    """
+    Storage shared by ColumnarActionLog versions. Every column has one entry per action.
+    Names which are not str (mostly LazyText) are in name_objects, None for names in names.
+    Fields that can't be packed (id that is not 128 bit int, time that is not float) and
+    changes_value of actions which don't change the value are kept in irregular dict with (position, field name) keys
+    """
+    __slots__ = ('ids', 'times', 'durations', 'names', 'name_ends', 'name_objects', 'strings', 'string_numbers',
+                 'lazy_string_numbers', 'irregular') + _STRING_FIELDS + _OBJECT_FIELDS
+
+    def __init__(self):
+        self.ids = bytearray()
+        self.times = array('d')
+        self.durations = array('d')
+        self.names = bytearray()
+        self.name_ends = array('Q')
+        self.name_objects = []
+        self.strings = []  # string table, string columns keep numbers of strings in it
+        self.string_numbers = {}
+        self.lazy_string_numbers = {}  # id of LazyText -> its number, the table keeps it alive
+        self.irregular = {}
+        for field_name in _STRING_FIELDS:
+            setattr(self, field_name, array('I'))
+        for field_name in _OBJECT_FIELDS:
+            setattr(self, field_name, [])
+
+    def __len__(self) -> int:
+        return len(self.durations)
+
+    def truncated(self, length: int) -> '_Columns':
+        columns = _Columns()
+        columns.ids = self.ids[:length * _ID_SIZE]
+        columns.times = self.times[:length]
+        columns.durations = self.durations[:length]
+        columns.name_ends = self.name_ends[:length]
+        columns.names = self.names[:columns.name_ends[-1] if length else 0]
+        columns.name_objects = self.name_objects[:length]
+        columns.strings = self.strings  # string table is append only, so it can be shared
+        columns.string_numbers = self.string_numbers
+        columns.lazy_string_numbers = self.lazy_string_numbers
+        columns.irregular = {k: v for k, v in self.irregular.items() if k[0] < length}
+        for field_name in _STRING_FIELDS + _OBJECT_FIELDS:
+            setattr(columns, field_name, getattr(self, field_name)[:length])
+        return columns
+
+    def string_number(self, string: str) -> int:
+        if type(string) is LazyText:
+            # LazyText is hashed by its formatted text, so it is looked up by identity to stay unformatted
+            string_numbers, key = self.lazy_string_numbers, id(string)
+        else:
+            string_numbers, key = self.string_numbers, string
+        number = string_numbers.get(key)
+        if number is None:
+            number = string_numbers[key] = len(self.strings)
+            self.strings.append(string)
+        return number
+
+    def string(self, number: int) -> str:
+        string = self.strings[number]
+        return str(string) if type(string) is LazyText else string
+
+    def append(self, action: Action) -> None:
+        position = len(self)
+        if type(action.id) is int and 0 <= action.id < _ID_LIMIT:
+            self.ids += action.id.to_bytes(_ID_SIZE, 'big')
+        else:
+            self.ids += bytes(_ID_SIZE)
+            self.irregular[position, 'id'] = action.id
+        if type(action.time) is float:
+            self.times.append(action.time)
+        else:
+            self.times.append(0)
+            self.irregular[position, 'time'] = action.time
+        if type(action.name) is str:
+            self.names += action.name.encode()
+            self.name_objects.append(None)
+        else:
+            self.name_objects.append(action.name)
+        self.name_ends.append(len(self.names))
+        self.durations.append(action.duration_in_seconds)
+        for field_name in _STRING_FIELDS:
+            getattr(self, field_name).append(self.string_number(getattr(action, field_name)))
+        for field_name in _OBJECT_FIELDS:
+            getattr(self, field_name).append(getattr(action, field_name))
+        if not action.changes_value:
+            self.irregular[position, 'changes_value'] = False
+
+
+class ColumnarActionLog(Sequence):
+    """
+    Immutable append-only sequence of actions stored by columns: ids as 16 bytes, times as floats,
+    durations as floats and strings as numbers in a string table. Action objects are created only when they are
+    read, single fields can be read without creating actions with column().
+    Can be used instead of PersistentVector as Game.actions_list: Game(actions_list=ColumnarActionLog())
+    Versions share columns the same way as FloatLog versions share their array
+    """
+    __slots__ = ('_columns', '_length')
+    _append_lock = threading.Lock()
+
+    def __init__(self, actions: typing.Iterable[Action] = ()):
+        self._columns = _Columns()
+        for action in actions:
+            self._columns.append(action)
+        self._length = len(self._columns)
+
+    def append(self, action: Action) -> 'ColumnarActionLog':
+        return self.extend((action,))
+
+    def extend(self, actions: typing.Iterable[Action]) -> 'ColumnarActionLog':
+        with self._append_lock:
+            if len(self._columns) == self._length:
+                columns = self._columns
+            else:
+                columns = self._columns.truncated(self._length)
+            for action in actions:
+                columns.append(action)
+        new_log = ColumnarActionLog.__new__(ColumnarActionLog)
+        new_log._columns = columns
+        new_log._length = len(columns)
+        return new_log
+
+    def __len__(self) -> int:
+        return self._length
+
+    def _id(self, position: int):
+        columns = self._columns
+        if columns.irregular and (position, 'id') in columns.irregular:
+            return columns.irregular[position, 'id']
+        return int.from_bytes(columns.ids[position * _ID_SIZE:(position + 1) * _ID_SIZE], 'big')
+
+    def _name(self, position: int):
+        columns = self._columns
+        name = columns.name_objects[position]
+        if name is not None:
+            return str(name) if type(name) is LazyText else name
+        return columns.names[columns.name_ends[position - 1] if position else 0:columns.name_ends[position]].decode()
+
+    def _action(self, position: int) -> Action:
+        columns = self._columns
+        if columns.irregular and (position, 'time') in columns.irregular:
+            action_time = columns.irregular[position, 'time']
+        else:
+            action_time = columns.times[position]
+        return Action(id=self._id(position),
+                      time=action_time,
+                      duration_in_seconds=columns.durations[position],
+                      name=self._name(position),
+                      previous_value=columns.previous_value[position],
+                      actual_value=columns.actual_value[position],
+                      function=columns.function[position],
+                      rollback_function=columns.rollback_function[position],
+                      short_description=columns.string(columns.short_description[position]),
+                      full_description=columns.string(columns.full_description[position]),
+                      visibility_level=columns.string(columns.visibility_level[position]),
+                      changes_value=not columns.irregular or (position, 'changes_value') not in columns.irregular)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self._action(i) for i in range(*index.indices(self._length)))
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError('ColumnarActionLog index out of range')
+        return self._action(index)
+
+    def __iter__(self) -> typing.Iterator[Action]:
+        for position in range(self._length):
+            yield self._action(position)
+
+    def column(self, field_name: str) -> typing.Sequence:
+        """
+        Values of one Action field for all actions, without creating Action objects
+        """
+        columns = self._columns
+        if field_name == 'id':
+            return [self._id(position) for position in range(self._length)]
+        if field_name == 'name':
+            return [self._name(position) for position in range(self._length)]
+        if field_name == 'duration_in_seconds':
+            return columns.durations[:self._length]
+        if field_name in _STRING_FIELDS:
+            return [columns.string(number) for number in getattr(columns, field_name)[:self._length]]
+        if field_name in _OBJECT_FIELDS:
+            return getattr(columns, field_name)[:self._length]
+        return [getattr(action, field_name) for action in self]
+
+    def __eq__(self, other) -> bool:
+        if self is other:
+            return True
+        if not isinstance(other, (ColumnarActionLog, PersistentVector, tuple, list)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __hash__(self) -> int:
+        return hash(tuple(self))
+
+    def __repr__(self) -> str:
+        return f'ColumnarActionLog({list(self)!r})'
+
+    def __reduce__(self):
+        return ColumnarActionLog, (tuple(self),)
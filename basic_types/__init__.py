@@ -1,28 +1,216 @@
 import typing
 import datetime
-from uuid import uuid4, UUID
+import functools
+import itertools
+import os
 import random
-from dataclasses import dataclass, replace, field
-from formula_parser import parse_formula_string
+import time
+from dataclasses import dataclass, replace, field, fields
+from formula_parser import compile_formula, FormulaTerm
+from dice_engine import roll_dice, negated, results_sum, Distribution, dice_distribution, sum_distribution, simulate, \
+    DiceRng
+from persistent_collections import PersistentVector, PersistentMap, FloatLog, PersistentHeap
 
 
-@dataclass(frozen=True)
+def _new_id_counter() -> typing.Iterator[int]:
+    return itertools.count(int.from_bytes(os.urandom(8), 'big') << 64)
+
+
+_id_counter = _new_id_counter()
+# Forked process must not repeat the ids of its parent
+os.register_at_fork(after_in_child=lambda: globals().update(_id_counter=_new_id_counter()))
+
+
+def new_id() -> int:
+    """
+    128 bit id: random 64 bit prefix of the process and a counter. It is unique as uuid4 is, but it doesn't ask
+    the system for random bytes every time and is kept as int, which takes less memory than UUID object
+    """
+    return next(_id_counter)
+
+
+def set_pickled_fields(instance, state) -> None:
+    """
+    __setstate__ of dataclasses. state is the list of field values of a slotted class or __dict__.
+    State of an instance pickled by an older version of the class goes through __init__,
+    so newer fields get their defaults
+    """
+    field_names, init_names = _pickled_field_names(type(instance))
+    if isinstance(state, dict) and all(name in state for name in field_names):
+        state = [state[name] for name in field_names]
+    elif not isinstance(state, dict) and len(state) < len(field_names):
+        state = dict(zip(field_names, state))
+    if isinstance(state, dict):
+        restored = type(instance)(**{name: value for name, value in state.items() if name in init_names})
+        state = [getattr(restored, name) for name in field_names]
+    for name, value in zip(field_names, state):
+        object.__setattr__(instance, name, value)
+
+
+@functools.lru_cache(maxsize=None)
+def _pickled_field_names(cls) -> typing.Tuple[typing.Tuple[str, ...], typing.FrozenSet[str]]:
+    # fields() is too slow to be called for every loaded instance
+    return tuple(f.name for f in fields(cls)), frozenset(f.name for f in fields(cls) if f.init)
+
+
+# Wall clock seconds when the monotonic clock started, so clock() is close to time.time() but never goes back
+_CLOCK_START = time.time() - time.monotonic()
+
+
+def clock() -> float:
+    """
+    Seconds since the epoch. It is much cheaper than datetime.now()
+    """
+    return _CLOCK_START + time.monotonic()
+
+
+@functools.total_ordering
+class LazyText:
+    """
+    Text which is formatted from template and arguments only when it is read, the arguments must not be changed
+    before that. Most action names and descriptions are never shown, so they are never formatted.
+    Equal to, ordered and has the same hash as the formatted str, pickled as str.
+    Operators of str work with it (in, +, indexing), other str methods are taken from the formatted text
+    """
+    __slots__ = ('template', 'arguments', '_text')
+
+    def __init__(self, template: str, *arguments):
+        self.template = template
+        self.arguments = arguments
+        self._text = None
+
+    def __str__(self) -> str:
+        if self._text is None:
+            self._text = self.template.format(*self.arguments)
+            self.arguments = ()
+        return self._text
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (str, LazyText)):
+            return str(self) == str(other)
+        return NotImplemented
+
+    def __lt__(self, other) -> bool:
+        if isinstance(other, (str, LazyText)):
+            return str(self) < str(other)
+        return NotImplemented
+
+    def __add__(self, other) -> str:
+        if isinstance(other, (str, LazyText)):
+            return str(self) + str(other)
+        return NotImplemented
+
+    def __radd__(self, other) -> str:
+        if isinstance(other, str):
+            return other + str(self)
+        return NotImplemented
+
+    def __contains__(self, text) -> bool:
+        return str(text) in str(self) if isinstance(text, LazyText) else text in str(self)
+
+    def __getitem__(self, index) -> str:
+        return str(self)[index]
+
+    def __iter__(self) -> typing.Iterator[str]:
+        return iter(str(self))
+
+    def __hash__(self) -> int:
+        return hash(str(self))
+
+    def __repr__(self) -> str:
+        return repr(str(self))
+
+    def __format__(self, format_spec: str) -> str:
+        return format(str(self), format_spec)
+
+    def __len__(self) -> int:
+        return len(str(self))
+
+    def __getattr__(self, name: str):
+        # str methods: lower(), startswith() and so on
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(str(self), name)
+
+    def __reduce__(self):
+        return str, (str(self),)
+
+
+@dataclass(frozen=True, slots=True)
+class NumericDelta:
+    """
+    Changing function which adds amount to a numeric value. Such changes commute and can be inverted,
+    so roll_back_value removes one of them from the middle of the history without replaying the following actions
+    """
+    amount: typing.Union[int, float]
+
+    def __call__(self, value: 'Value') -> 'Value':
+        return replace(value, value=value.value + self.amount)
+
+    def inverse(self) -> 'NumericDelta':
+        return NumericDelta(amount=-self.amount)
+
+
+@dataclass(frozen=True, slots=True)
+class RestoredValue:
+    """
+    Rollback function which gives back the value before the change. Unlike a closure it can be saved
+    and the versions of a game compare equal after they are loaded
+    """
+    previous_value: 'Value'
+
+    def __call__(self, _: 'Value' = None) -> 'Value':
+        return self.previous_value
+
+
+@dataclass(frozen=True, slots=True)
 class Value:
     value: typing.Any
     name: str = 'Noname value'
-    id: UUID = field(default_factory=uuid4)
-    actions_sequence: typing.Tuple['Action', ...] = ()
+    id: int = field(default_factory=new_id)
+    # Shared between versions of the value, so a change adds only its own action to the history
+    actions_sequence: PersistentVector = field(default_factory=PersistentVector)
     subscribers: list = ()
     short_description: str = 'No short description'
     full_description: str = 'No full description'
     children: typing.List['Value'] = ()
     parent: typing.Optional['Value'] = None
+    # Action id -> number of the first action with that id in actions_sequence
+    actions_index: PersistentMap = field(default_factory=PersistentMap, compare=False, repr=False)
+    # Number of the last action in actions_sequence whose function is not NumericDelta, -1 if there is none
+    non_delta_position: typing.Optional[int] = field(default=None, compare=False, repr=False)
+
+    def __post_init__(self):
+        if not isinstance(self.actions_sequence, PersistentVector):
+            object.__setattr__(self, 'actions_sequence', PersistentVector(self.actions_sequence))
+        if self.actions_sequence and not self.actions_index:
+            actions_index = PersistentMap()
+            for action_number, action in enumerate(self.actions_sequence):
+                if action.id not in actions_index:
+                    actions_index = actions_index.set(action.id, action_number)
+            object.__setattr__(self, 'actions_index', actions_index)
+        if self.non_delta_position is None:
+            non_delta_position = -1
+            for action_number, action in enumerate(self.actions_sequence):
+                if not isinstance(action.function, NumericDelta):
+                    non_delta_position = action_number
+            object.__setattr__(self, 'non_delta_position', non_delta_position)
+
+    def __setstate__(self, state):
+        set_pickled_fields(self, state)
 
     # def __repr__(self):
     #     return f'{self.name}: {self.value}'
 
     def append_action_to_sequence(self, a: 'Action') -> 'Value':
-        return replace(self, actions_sequence=self.actions_sequence + (a,))
+        actions_index = self.actions_index
+        if a.id not in actions_index:
+            actions_index = actions_index.set(a.id, len(self.actions_sequence))
+        non_delta_position = self.non_delta_position
+        if not isinstance(a.function, NumericDelta):
+            non_delta_position = len(self.actions_sequence)
+        return replace(self, actions_sequence=self.actions_sequence.append(a), actions_index=actions_index,
+                       non_delta_position=non_delta_position)
         # return self._replace(actions_sequence=self.actions_sequence + (a, ))
 
     @property
@@ -33,62 +221,118 @@ class Value:
             return self.actions_sequence[-1]
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Action:
-    id: UUID = field(default_factory=uuid4)
-    time: datetime.datetime = field(default_factory=datetime.datetime.now)
+    id: int = field(default_factory=new_id)
+    # Seconds since the epoch from clock(), datetime is accepted too
+    time: typing.Union[float, datetime.datetime] = field(default_factory=clock)
     duration_in_seconds: float = 0
-    name: str = f'Noname action'
+    name: typing.Union[str, LazyText] = f'Noname action'
     previous_value: typing.Optional[Value] = None
     actual_value: typing.Optional[Value] = None
     function: typing.Optional[typing.Callable] = None
     rollback_function: typing.Optional[typing.Callable] = None
-    short_description: str = f'No short description'
-    full_description: str = f'No full description'
+    short_description: typing.Union[str, LazyText] = f'No short description'
+    full_description: typing.Union[str, LazyText] = f'No full description'
     visibility_level: str = 'visible'
+    # False for actions which only mark the history, e.g. effect application. Replay keeps them as they are
+    changes_value: bool = True
 
+    def __setstate__(self, state):
+        set_pickled_fields(self, state)
 
-@dataclass(frozen=True)
+
+@dataclass(frozen=True, slots=True)
 class Effect:
     """
     Effect is an Action that has a duration
     """
     name: str
     action: Action
-    id: UUID = field(default_factory=uuid4)
+    id: int = field(default_factory=new_id)
     finished: bool = False
     duration_in_seconds: float = float("inf")
     short_description: str = 'No short description for effect'
     full_description: str = 'No full description for effect'
+    # Ids of values the effect was applied to
+    target_ids: typing.Tuple[int, ...] = ()
 
     # values: typing.List[Value] = []
 
+    def __setstate__(self, state):
+        set_pickled_fields(self, state)
+
     def get_value(self):
         if self.finished:
             return self.action.previous_value
         return self.action.actual_value
 
 
+@dataclass(frozen=True, slots=True)
+class ScheduledEffect:
+    effect: Effect
+    start_time: float
+
+    @property
+    def expiry_time(self) -> float:
+        return self.start_time + self.effect.duration_in_seconds
+
+
 @dataclass(frozen=True)
 class Timer:
     name: str = 'Noname timer'
-    ticks: typing.Tuple[float, ...] = field(default_factory=tuple)
+    ticks: FloatLog = field(default_factory=FloatLog)
     # actions_list: typing.List[Action] = field(default_factory=tuple)
-    subscribed_effects_dict: typing.Dict[Effect, dict] = field(default_factory=dict)
+    # Effect id -> ScheduledEffect, finished effects stay here too
+    effects: PersistentMap = field(default_factory=PersistentMap)
+    # (expiry time, effect id) of not finished effects, so tick looks only at effects that really expire
+    expiry_queue: PersistentHeap = field(default_factory=PersistentHeap, compare=False, repr=False)
+    # Seconds of the ticks removed by compact_ticks
+    compacted_seconds: float = 0
+
+    def __post_init__(self):
+        if not isinstance(self.ticks, FloatLog):
+            object.__setattr__(self, 'ticks', FloatLog(self.ticks))
+
+    def __setstate__(self, state):
+        if 'subscribed_effects_dict' in state:  # pickled before effects were kept by id
+            timer = Timer(name=state['name'], ticks=state['ticks'])
+            for effect, effect_state in state['subscribed_effects_dict'].items():
+                timer = _with_scheduled_effect(
+                        timer, ScheduledEffect(effect=effect, start_time=effect_state['start_time']))
+            state = timer.__dict__
+        set_pickled_fields(self, state)
 
     @property
     def seconds_passed(self):
-        return sum(self.ticks) if self.ticks else 0
+        return self.compacted_seconds + self.ticks.total
+
+    @property
+    def subscribed_effects_dict(self) -> typing.Dict[Effect, dict]:
+        return {s.effect: {'start_time': s.start_time} for s in self.effects.values()}
+
+    def compact_ticks(self) -> 'Timer':
+        """
+        Forgets separate ticks, only the total time passed is kept
+        """
+        return replace(self, ticks=FloatLog(), compacted_seconds=self.seconds_passed)
 
     @staticmethod
     def untick(*, action: Action):
         return timer_untick(action=action)
 
+    def target_ids(self, *, effect_id) -> typing.Tuple[int, ...]:
+        """
+        Ids of values the subscribed effect was applied to
+        """
+        scheduled_effect = self.effects.get(effect_id)
+        return () if scheduled_effect is None else scheduled_effect.effect.target_ids
+
     def find_effect_by_id(self, *, effect_id) -> typing.Optional[Effect]:
-        matching_effects = [e for e in self.subscribed_effects_dict.keys() if e.id == effect_id]
-        if not matching_effects:
+        scheduled_effect = self.effects.get(effect_id)
+        if scheduled_effect is None:
             return None
-        return matching_effects[0]
+        return scheduled_effect.effect
 
 
 @dataclass(frozen=True)
@@ -98,92 +342,148 @@ class Formula:
     """
     text_representation: str
     name: str = 'Noname formula'
-    id: UUID = field(default_factory=uuid4)
+    id: int = field(default_factory=new_id)
+    # Source of dice results, the shared module generator is used if it is None
+    rng: typing.Optional[DiceRng] = field(default=None, compare=False, repr=False)
+
+    def __setstate__(self, state):
+        set_pickled_fields(self, state)
+
+    def roll(self, *, rng: typing.Optional[DiceRng] = None) -> 'FormulaRoll':
+        """
+        Throws all dice of each token at once, no actions are created
+        """
+        rng = rng or self.rng
+        terms = compile_formula(self.text_representation)
+        results = []
+        for term in terms:
+            if not term.is_dice:
+                results.append((term.number,))
+                continue
+            dice_results = roll_dice(
+                    quantity=term.dice_quantity,
+                    minimal_possible_value=term.dice_min,
+                    maximal_possible_value=term.dice_max,
+                    rng=rng)
+            results.append(negated(dice_results) if term.is_negative else dice_results)
+        return FormulaRoll(formula=self, terms=terms, results=tuple(results))
+
+    def parse(self, *, rng: typing.Optional[DiceRng] = None) -> typing.List[Action]:
+        return self.roll(rng=rng).actions()
+
+    def distribution(self) -> Distribution:
+        """
+        Exact probabilities of all possible results, nothing is thrown
+        """
+        return _terms_distribution(compile_formula(self.text_representation))
+
+    def simulate(self, *, rolls_number: int, seed: typing.Optional[int] = None,
+                 processes: int = 1) -> typing.Sequence[int]:
+        """
+        Totals of many rolls at once, see dice_engine.simulate
+        """
+        return simulate(text_representation=self.text_representation, rolls_number=rolls_number, seed=seed,
+                        processes=processes)
+
+
+@functools.lru_cache(maxsize=1024)
+def _terms_distribution(terms: typing.Tuple[FormulaTerm, ...]) -> Distribution:
+    distributions = []
+    constant = 0
+    for term in terms:
+        if not term.is_dice:
+            constant += int(term.number)
+            continue
+        distribution = dice_distribution(
+                quantity=term.dice_quantity,
+                minimal_possible_value=term.dice_min,
+                maximal_possible_value=term.dice_max)
+        distributions.append(distribution.negated() if term.is_negative else distribution)
+    return sum_distribution(distributions).shifted(constant)
+
+
+@dataclass(frozen=True)
+class FormulaRoll:
+    """
+    Result of Formula.roll. Dice results of every term are kept in one array
+    """
+    formula: Formula
+    terms: typing.Tuple[FormulaTerm, ...]
+    results: typing.Tuple[typing.Sequence, ...]
 
-    def parse(self) -> typing.List[Action]:
-        lex_tokens = parse_formula_string(self.text_representation)
+    @property
+    def total(self):
+        return sum(results_sum(r) if t.is_dice else r[0] for t, r in zip(self.terms, self.results))
+
+    def actions(self) -> typing.List[Action]:
+        """
+        Action for every number token and for every thrown dice
+        """
+        text_representation = self.formula.text_representation
         actions_list = []
-        is_negative = False
-        token_number = 0
-        for lex in lex_tokens:
-            token_number += 1
-            lex_type, lex_value = getattr(lex, 'type'), getattr(lex, 'value')
-            if lex_type == 'sign':
-                if lex_value == '-':
-                    is_negative = True
-                elif lex_value == '+':
-                    is_negative = False
-
-            elif lex_type == 'number':
-                numeric_value = float(lex_value)
-                if is_negative:
-                    numeric_value = -numeric_value
-                number_action = Action(
-                        name=f'Action for token {token_number} from formula [{self.text_representation}]',
+        for term, term_results in zip(self.terms, self.results):
+            token_number = term.token_number
+            if not term.is_dice:
+                actions_list.append(Action(
+                        name=LazyText('Action for token {} from formula [{}]', token_number, text_representation),
                         actual_value=Value(
-                                name=f'Current value for token {token_number} from '
-                                f'formula [{self.text_representation}]',
-                                value=numeric_value),
+                                name=f'Current value for token {token_number} from formula [{text_representation}]',
+                                value=term_results[0]),
                         previous_value=Value(
-                                name=f'Previous value for token {token_number} from '
-                                f'formula [{self.text_representation}]',
-                                value=0)
-                )
-                actions_list.append(number_action)
-
-            elif lex_type == 'dice':
-                lex_value = lex_value.replace('к', 'd').replace('д', 'd')
-                dice_quantity, dice_max = lex_value.split('d')
-                if not dice_quantity:
-                    dice_quantity = 1
-                else:
-                    dice_quantity = int(dice_quantity)
-                dice_max = int(dice_max)
-                if dice_max < 0:
-                    raise ValueError('Dice max must be >= 0')
-                if dice_max == 0:
-                    dice_min = 0
-                else:
-                    dice_min = 1
-                for dice_number in range(1, dice_quantity + 1):
-                    dice_throw = DiceThrow(
-                            minimal_possible_value=dice_min,
-                            maximal_possible_value=dice_max,
-                            name=f'Dice d{dice_max} throw {dice_number} for token {token_number} for '
-                            f'formula [{self.text_representation}]',
-                            is_negative=is_negative)
-                    throwing_action = dice_throw.throw()
-                    actions_list.append(throwing_action)
-
+                                name=f'Previous value for token {token_number} from formula [{text_representation}]',
+                                value=0)))
+                continue
+
+            for dice_number, result in enumerate(term_results.tolist(), 1):
+                actions_list.append(Action(
+                        name=LazyText('Action for DiceThrow "Dice d{} throw {} for token {} for formula [{}]"',
+                                      term.dice_max, dice_number, token_number, text_representation),
+                        previous_value=Value(name=f'Previous value for DiceThrow is zero', value=0),
+                        actual_value=Value(name=f'Throw value', value=result)))
         return actions_list
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class DiceThrow:
     minimal_possible_value: int
     maximal_possible_value: int
     name: str = 'Noname dice throw'
-    id: UUID = field(default_factory=uuid4)
+    id: int = field(default_factory=new_id)
     is_negative: bool = False
+    # Source of dice results, global random is used if it is None
+    rng: typing.Optional[DiceRng] = field(default=None, compare=False, repr=False)
+
+    def __setstate__(self, state):
+        set_pickled_fields(self, state)
 
     def throw(self) -> Action:
-        result = random.randint(self.minimal_possible_value, self.maximal_possible_value)
+        if self.rng is None:
+            result = random.randint(self.minimal_possible_value, self.maximal_possible_value)
+        else:
+            result = int(self.rng.roll_dice(quantity=1,
+                                            minimal_possible_value=self.minimal_possible_value,
+                                            maximal_possible_value=self.maximal_possible_value)[0])
         if self.is_negative:
             result = -result
+        return self._throwing_action(result)
 
+    def _throwing_action(self, result: int) -> Action:
         throwing_action = Action(
-                name=f'Action for DiceThrow "{self.name}"',
-                time=datetime.datetime.now(),
+                name=LazyText('Action for DiceThrow "{}"', self.name),
                 previous_value=Value(name=f'Previous value for DiceThrow is zero', value=0),
                 actual_value=Value(name=f'Throw value', value=result)
         )
         return throwing_action
 
     def several_throws(self, number: int) -> typing.List[Action]:
-        actions = []
-        for _ in range(number):
-            actions.append(self.throw())
-        return actions
+        results = roll_dice(
+                quantity=number,
+                minimal_possible_value=self.minimal_possible_value,
+                maximal_possible_value=self.maximal_possible_value,
+                rng=self.rng)
+        if self.is_negative:
+            results = negated(results)
+        return [self._throwing_action(result) for result in results.tolist()]
 
 
 def change_value(*,
@@ -200,26 +500,23 @@ def change_value(*,
                 actual_value=value_to_change,
                 previous_value=value_to_change,
                 function=changing_function,
-                rollback_function=rollback_function)
+                rollback_function=rollback_function,
+                changes_value=False)
 
     new_value = replace(value_to_change, value=changing_function(value_to_change).value)
     # new_value = value_to_change._replace(value=action_to_perform.function(value_to_change).value)
 
     # If rollback function is not defined, it will be default: restore the previous state
     if rollback_function is None:
-        def default_rollback(v: Value = None) -> Value:
-            if not v:
-                pass
-            old_value = value_to_change
-            return old_value
-
-        rollback_function = default_rollback
+        rollback_function = RestoredValue(previous_value=value_to_change)
     if change_name == '':
-        change_name = f'Changing value {value_to_change.name} from {value_to_change.value} to {new_value.value}'
+        change_name = LazyText('Changing value {} from {} to {}', value_to_change.name, value_to_change.value,
+                               new_value.value)
     changing_action = Action(
             actual_value=new_value,
             previous_value=value_to_change,
             name=change_name,
+            function=changing_function,
             rollback_function=rollback_function)
 
     # fulfilled_action = action_to_perform._replace(
@@ -232,25 +529,34 @@ def change_value(*,
     return changing_action
 
 
+def _timer_with_ticks(timer: Timer, new_ticks: FloatLog) -> typing.Tuple[Timer, typing.List[Effect]]:
+    """
+    The timer after new_ticks and the effects finished by them
+    """
+    finished_effects = []
+    seconds_passed = timer.compacted_seconds + new_ticks.total
+    effects, expiry_queue = timer.effects, timer.expiry_queue
+    # Only effects which must finish are taken from the queue
+    while expiry_queue and expiry_queue.peek()[0] <= seconds_passed:
+        expiry_time, effect_id = expiry_queue.peek()
+        expiry_queue = expiry_queue.pop()
+        scheduled_effect = effects[effect_id]
+        if scheduled_effect.effect.finished or scheduled_effect.expiry_time != expiry_time:
+            continue  # effect was subscribed once again, this entry is outdated
+        # Not set_effect_finished: its action isn't recorded, so it isn't made for every expiration
+        finished_effect = replace(scheduled_effect.effect, finished=True)
+        effects = effects.set(effect_id, replace(scheduled_effect, effect=finished_effect))
+        finished_effects.append(finished_effect)
+    return replace(timer, ticks=new_ticks, effects=effects, expiry_queue=expiry_queue), finished_effects
+
+
 def timer_tick(*, timer: Timer, seconds: float) -> Action:
-    new_ticks = timer.ticks + (seconds, )
-    new_timer = replace(timer, ticks=new_ticks)
     # ticking_action = change_value(
     #         value_to_change=Value(value=timer),
     #         changing_function=lambda x: replace(x, ticks=new_ticks))
-
-    for effect, start_time_dict in new_timer.subscribed_effects_dict.copy().items():
-        if effect.finished:
-            continue
-        start_time = start_time_dict['start_time']
-        # If it is time for effect to finish
-        if start_time + effect.duration_in_seconds <= new_timer.seconds_passed:
-            del new_timer.subscribed_effects_dict[effect]  # unsubscribe effect
-            finished_effect, set_finished_action = set_effect_finished(effect=effect)
-            new_timer.subscribed_effects_dict[finished_effect] = start_time_dict
-
+    new_timer, _ = _timer_with_ticks(timer, timer.ticks.append(seconds))
     ticking_action = Action(
-            name=f'Timer {timer.name} ticks on {seconds} seconds',
+            name=LazyText('Timer {} ticks on {} seconds', timer.name, seconds),
             previous_value=Value(value=timer),
             actual_value=Value(value=new_timer))
 
@@ -283,33 +589,128 @@ def timer_tick(*, timer: Timer, seconds: float) -> Action:
     # return timer
 
 
+def timer_ticks(*, timer: Timer, seconds: typing.Iterable[float]) -> Action:
+    """
+    The same timer as timer_tick for every item of seconds gives, but made at once
+    """
+    new_timer, _ = _timer_with_ticks(timer, timer.ticks.extend(seconds))
+    return Action(
+            name=LazyText('Timer {} ticks {} times', timer.name, len(new_timer.ticks) - len(timer.ticks)),
+            previous_value=Value(value=timer),
+            actual_value=Value(value=new_timer))
+
+
+def _previous_version(previous_values: typing.Mapping, value: Value) -> Value:
+    return previous_values[value.id]
+
+
+def timer_tick_unapplying_effects(*,
+                                  timer: Timer,
+                                  seconds: float,
+                                  values: typing.Mapping) -> typing.Tuple[Action, typing.Optional[Action]]:
+    """
+    timer_tick which also removes effects finished by the tick from the values they were applied to
+    (Effect.target_ids), so only affected values are looked at. values is value id -> Value, e.g. Game.objects_dict.
+    Effects are removed by their action rollback_function, effects without it are only set finished.
+    Returns the ticking action and one action for all removals (None if nothing was removed):
+    its previous_value and actual_value keep dicts of changed values before and after,
+    every changed value has that action in its history
+    """
+    new_timer, finished_effects = _timer_with_ticks(timer, timer.ticks.append(seconds))
+    ticking_action = Action(
+            name=LazyText('Timer {} ticks on {} seconds', timer.name, seconds),
+            previous_value=Value(value=timer),
+            actual_value=Value(value=new_timer))
+    return ticking_action, _unapplying_action(finished_effects, values)
+
+
+def timer_ticks_unapplying_effects(*,
+                                   timer: Timer,
+                                   seconds: typing.Iterable[float],
+                                   values: typing.Mapping) -> typing.Tuple[Action, typing.Optional[Action]]:
+    """
+    timer_ticks which removes finished effects like timer_tick_unapplying_effects. Effects are removed
+    from values after all ticks, the same as timer_tick_unapplying_effects gives only if they finish at the last one
+    """
+    new_timer, finished_effects = _timer_with_ticks(timer, timer.ticks.extend(seconds))
+    ticking_action = Action(
+            name=LazyText('Timer {} ticks {} times', timer.name, len(new_timer.ticks) - len(timer.ticks)),
+            previous_value=Value(value=timer),
+            actual_value=Value(value=new_timer))
+    return ticking_action, _unapplying_action(finished_effects, values)
+
+
+def _without_effects(effects: typing.Tuple[Effect, ...], value: Value) -> Value:
+    for effect in effects:
+        if value.id in effect.target_ids:
+            value = replace(value, value=effect.action.rollback_function(value).value)
+    return value
+
+
+def _unapplying_action(finished_effects: typing.List[Effect], values: typing.Mapping) -> typing.Optional[Action]:
+    effects = tuple(e for e in finished_effects if e.action.rollback_function is not None)
+    # The function removes the effects from any value they were applied to, so replay repeats the removal
+    function = functools.partial(_without_effects, effects)
+    previous_values, changed_values = {}, {}
+    for effect in effects:
+        for value_id in effect.target_ids:
+            value = values.get(value_id)
+            if value is None or value_id in previous_values:
+                continue  # value doesn't exist any more or the effects are already removed from it
+            previous_values[value_id] = value
+            changed_values[value_id] = function(value)
+    if not changed_values:
+        return None
+
+    unapplying_action = Action(
+            name=LazyText('Effects {} finished', ', '.join(e.name for e in finished_effects)),
+            previous_value=Value(value=previous_values),
+            function=function,
+            rollback_function=functools.partial(_previous_version, previous_values))
+    changed_values = {value_id: value.append_action_to_sequence(unapplying_action)
+                      for value_id, value in changed_values.items()}
+    return replace(unapplying_action, actual_value=Value(value=changed_values))
+
+
 def timer_untick(*, action: Action) -> Timer:
     timer = action.previous_value.value
     # timer.actions_list.remove(action)
     return timer
 
 
-def roll_back_value(*, value: Value, action_id_to_rollback: str = "last") -> Value:
+def roll_back_value(*, value: Value, action_id_to_rollback: str = "last", replay: bool = False) -> Value:
+    """
+    Value without the action. For the action in the middle of the history the following actions are repeated,
+    unless all of them and the action itself are NumericDelta: then the opposite delta is added to the history
+    in O(1) and the action id is removed from actions_index. replay=True always repeats the following actions
+    """
     if not value.actions_sequence:
         return value
 
     if action_id_to_rollback == 'last':
         return value.last_action.rollback_function(value)
 
-    matching_actions = [a for a in value.actions_sequence if a.id == action_id_to_rollback]
-    if not matching_actions:
+    action_number = value.actions_index.get(action_id_to_rollback)
+    if action_number is None:
         return value
 
-    action = matching_actions[0]
-    action_number = value.actions_sequence.index(action)
+    action = value.actions_sequence[action_number]
+    if not replay and isinstance(action.function, NumericDelta) and value.non_delta_position < action_number:
+        rolled_back_value = change_value(
+                value_to_change=value,
+                changing_function=action.function.inverse(),
+                change_name=LazyText('Rolling back action {}', action.name)).actual_value
+        return replace(rolled_back_value, actions_index=rolled_back_value.actions_index.delete(action.id))
+
     rolled_back_value = action.rollback_function(value)
-    if action_number < len(value.actions_sequence):  # Not the last action, need to repeat all following
-        actions_to_repeat = [a for a in value.actions_sequence[action_number + 1:]]
-        for a in actions_to_repeat:
-            rolled_back_value = change_value(
-                    changing_function=a.rollback_function,
-                    value_to_change=rolled_back_value,
-                    rollback_function=action.function).actual_value
+    for a in value.actions_sequence[action_number + 1:]:
+        if not a.changes_value:
+            rolled_back_value = rolled_back_value.append_action_to_sequence(a)
+            continue
+        rolled_back_value = change_value(
+                changing_function=a.function,
+                value_to_change=rolled_back_value,
+                change_name=a.name).actual_value
 
     return rolled_back_value
 
@@ -323,7 +724,7 @@ def apply_effect_to_value(*,
         if effect.short_description:
             short_description = effect.short_description
         else:
-            short_description = f'Value {value.name} changed due to effect {effect.name} application'
+            short_description = LazyText('Value {} changed due to effect {} application', value.name, effect.name)
     if not full_description:
         if effect.full_description:
             full_description = effect.full_description
@@ -335,10 +736,11 @@ def apply_effect_to_value(*,
     # effect = effect._replace(action=effect_action)
 
     application_action = Action(
-            name=f'Effect {effect.name} was applied to value {value.name} (no value changing yet)',
+            name=LazyText('Effect {} was applied to value {} (no value changing yet)', effect.name, value.name),
             previous_value=value,
             short_description=short_description,
-            full_description=full_description)
+            full_description=full_description,
+            changes_value=False)
 
     updated_value = value.append_action_to_sequence(application_action)
     updated_value = change_value(
@@ -356,18 +758,56 @@ def apply_effect_to_value(*,
     #         full_description=full_description,
     #         previous_value=value,
     #         actual_value=updated_value)
-    effect = replace(effect, action=effect_action)
+    effect = replace(effect, action=effect_action, target_ids=effect.target_ids + (value.id,))
     # effect._replace(action=effect_action)
     return updated_value, effect
 
 
+def apply_effect_to_values(*,
+                           effect: Effect,
+                           values: typing.Iterable[Value],
+                           short_description: str = '',
+                           full_description: str = '') -> typing.Tuple[typing.List[Value], Effect]:
+    """
+    Applies the effect to all values in one pass, e.g. Fireball on 200 goblins.
+    Every value gets one action, the name and the descriptions of these actions are shared.
+    The effect knows the ids of all values, so one timer subscription is enough for the group
+    """
+    if not short_description:
+        short_description = effect.short_description or LazyText('Values changed due to effect {} application',
+                                                                 effect.name)
+    if not full_description:
+        full_description = effect.full_description or short_description
+    name = LazyText('Effect {} was applied', effect.name)
+    function = effect.action.function
+    updated_values = []
+    for value in values:
+        new_value = replace(value, value=function(value).value)
+        application_action = Action(
+                name=name,
+                previous_value=value,
+                actual_value=new_value,
+                function=function,
+                rollback_function=RestoredValue(previous_value=value),
+                short_description=short_description,
+                full_description=full_description)
+        # Unlike change_value the action is not made again to refer to the value with the action in history
+        updated_values.append(new_value.append_action_to_sequence(application_action))
+    effect_action = replace(effect.action, short_description=short_description, full_description=full_description)
+    return updated_values, replace(effect,
+                                   action=effect_action,
+                                   target_ids=effect.target_ids + tuple(v.id for v in updated_values))
+
+
 def unapply_effect_from_value(*, effect: Effect, value: Value, rollback_function: typing.Callable) -> Value:
+    description = LazyText('Removing effect {} from {}', effect.name, value.name)
     remove_effect_action = Action(
-            name=f'Effect "{effect.name}" removing from value "{value.name}"',
+            name=LazyText('Effect "{}" removing from value "{}"', effect.name, value.name),
             previous_value=value,
             function=effect.action.rollback_function,
-            short_description=f'Removing effect {effect.name} from {value.name}',
-            full_description=f'Removing effect {effect.name} from {value.name}')
+            short_description=description,
+            full_description=description,
+            changes_value=False)
     # rollback_action = Action(function=rollback_function)
     value = value.append_action_to_sequence(remove_effect_action)
     value = change_value(
@@ -379,8 +819,15 @@ def unapply_effect_from_value(*, effect: Effect, value: Value, rollback_function
 
 
 def subscribe_effect_to_timer(*, effect: Effect, timer: Timer) -> Timer:
-    timer.subscribed_effects_dict[effect] = {'start_time': timer.seconds_passed}
-    return timer
+    return _with_scheduled_effect(timer, ScheduledEffect(effect=effect, start_time=timer.seconds_passed))
+
+
+def _with_scheduled_effect(timer: Timer, scheduled_effect: ScheduledEffect) -> Timer:
+    effect = scheduled_effect.effect
+    expiry_queue = timer.expiry_queue
+    if not effect.finished and scheduled_effect.expiry_time != float('inf'):
+        expiry_queue = expiry_queue.push(scheduled_effect.expiry_time, effect.id)
+    return replace(timer, effects=timer.effects.set(effect.id, scheduled_effect), expiry_queue=expiry_queue)
 
 
 def set_effect_finished(*, effect: Effect) -> typing.Tuple[Effect, Action]:
@@ -389,7 +836,7 @@ def set_effect_finished(*, effect: Effect) -> typing.Tuple[Effect, Action]:
         # return effect._replace(finished=False)
 
     set_finished_action = Action(
-            name=f'Effect {effect.name} set finished',
+            name=LazyText('Effect {} set finished', effect.name),
             rollback_function=rollback_function)
 
     finished_effect = replace(effect, finished=True)
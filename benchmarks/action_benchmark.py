@@ -0,0 +1,60 @@
+"""
+Run from the repository root: python -m benchmarks.action_benchmark
+"""
+import datetime
+import os
+import time
+from basic_types import Action, Value, LazyText, DiceThrow, Formula, change_value
+from character import Character
+
+
+def eager_action(value: Value, new_value: Value) -> Action:
+    # The way actions were made before: random id, datetime and formatted name
+    return Action(id=int.from_bytes(os.urandom(16), 'big'),
+                  time=datetime.datetime.now(),
+                  name=f'Changing value {value.name} from {value.value} to {new_value.value}',
+                  previous_value=value,
+                  actual_value=new_value)
+
+
+def lazy_action(value: Value, new_value: Value) -> Action:
+    return Action(name=LazyText('Changing value {} from {} to {}', value.name, value.value, new_value.value),
+                  previous_value=value,
+                  actual_value=new_value)
+
+
+def benchmark_action_creation(*, actions_number: int = 100_000) -> None:
+    for value_name, value in (('int', Value(value=1)), ('Character', Value(value=Character(name='Kreodont')))):
+        new_value = Value(value=value.value)
+        timings = {}
+        for name, make_action in (('eager', eager_action), ('lazy', lazy_action)):
+            started = time.perf_counter()
+            for _ in range(actions_number):
+                make_action(value, new_value)
+            timings[name] = (time.perf_counter() - started) / actions_number
+            print(f'{name} Action of {value_name} value: {timings[name] * 1e6:.2f} us, '
+                  f'{1 / timings[name]:.0f} actions per second')
+        print(f'speedup: {timings["eager"] / timings["lazy"]:.1f}x')
+
+
+def benchmark_actions_of_functions(*, repeats: int = 20_000) -> None:
+    value = Value(value=Character(name='Kreodont'))
+    started = time.perf_counter()
+    for _ in range(repeats):
+        change_value(value_to_change=value, changing_function=lambda v: v)
+    print(f'change_value of Character: {(time.perf_counter() - started) / repeats * 1e6:.2f} us')
+    dice_throw = DiceThrow(minimal_possible_value=1, maximal_possible_value=20, name='d20')
+    started = time.perf_counter()
+    actions = dice_throw.several_throws(repeats)
+    print(f'DiceThrow.several_throws: {(time.perf_counter() - started) / len(actions) * 1e6:.2f} us per action')
+    formula = Formula(text_representation='100d6 + 5')
+    started = time.perf_counter()
+    for _ in range(repeats // 100):
+        actions = formula.parse()
+    print(f'Formula.parse: {(time.perf_counter() - started) / (repeats // 100) / len(actions) * 1e6:.2f} '
+          f'us per action')
+
+
+if __name__ == '__main__':
+    benchmark_action_creation()
+    benchmark_actions_of_functions()
@@ -0,0 +1,39 @@
+"""
+Run from the repository root: python -m benchmarks.action_log_benchmark
+"""
+import gc
+import time
+import tracemalloc
+from action_log import ColumnarActionLog
+from basic_types import Action, Value
+from persistent_collections import PersistentVector
+
+
+def benchmark_action_log(*, actions_number: int = 100_000) -> None:
+    value = Value(value=0)
+    for log_class in (PersistentVector, ColumnarActionLog):
+        gc.collect()
+        tracemalloc.start()
+        log = log_class()
+        for i in range(actions_number):
+            log = log.append(Action(previous_value=value, actual_value=value,
+                                    name=f'Changing value {value.name} from {i} to {i + 1}'))
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        started = time.perf_counter()
+        for _ in log:
+            pass
+        iteration_time = time.perf_counter() - started
+        started = time.perf_counter()
+        if isinstance(log, ColumnarActionLog):
+            total_duration = sum(log.column('duration_in_seconds'))
+        else:
+            total_duration = sum(a.duration_in_seconds for a in log)
+        column_time = time.perf_counter() - started
+        print(f'{log_class.__name__}: {memory / actions_number:.0f} bytes per action, '
+              f'iteration {iteration_time * 1e3:.1f} ms, durations sum {total_duration} in {column_time * 1e3:.1f} ms')
+
+
+if __name__ == '__main__':
+    benchmark_action_log()
@@ -0,0 +1,75 @@
+"""
+Run from the repository root: python -m benchmarks.dice_benchmark
+"""
+import time
+from basic_types import DiceThrow, Formula
+from formula_parser import compile_formula, formula_cache_info, formula_cache
+
+
+def per_dice_total(formula: Formula) -> float:
+    # The way Formula.parse worked before the dice engine: one DiceThrow and one Action per dice
+    total = 0
+    for term in compile_formula(formula.text_representation):
+        if not term.is_dice:
+            total += term.number
+            continue
+        for dice_number in range(1, term.dice_quantity + 1):
+            dice_throw = DiceThrow(minimal_possible_value=term.dice_min,
+                                   maximal_possible_value=term.dice_max,
+                                   name=f'Dice d{term.dice_max} throw {dice_number}',
+                                   is_negative=term.is_negative)
+            total += dice_throw.throw().actual_value.value
+    return total
+
+
+def benchmark_formula(*, text_representation: str = '100d6 + 50d8 - 10d4 + 5', rolls_number: int = 300) -> None:
+    formula = Formula(text_representation=text_representation)
+    timings = {}
+    for name, roll in (('per dice actions', per_dice_total),
+                       ('Formula.roll', lambda f: f.roll().total),
+                       ('Formula.parse', lambda f: sum(a.actual_value.value for a in f.parse()))):
+        started = time.perf_counter()
+        for _ in range(rolls_number):
+            roll(formula)
+        timings[name] = (time.perf_counter() - started) / rolls_number
+        print(f'{name}: {timings[name] * 1e6:.0f} us per roll of [{text_representation}]')
+    print(f'Formula.roll speedup: {timings["per dice actions"] / timings["Formula.roll"]:.0f}x')
+
+
+def benchmark_formula_cache(*, text_representation: str = '1d20+5', rolls_number: int = 20_000) -> None:
+    formula = Formula(text_representation=text_representation)
+    for maxsize in (0, 1024):
+        formula_cache.clear()
+        formula_cache.resize(maxsize)
+        started = time.perf_counter()
+        for _ in range(rolls_number):
+            formula.roll()
+        elapsed = time.perf_counter() - started
+        print(f'cache size {maxsize}: {elapsed / rolls_number * 1e6:.1f} us per roll of [{text_representation}], '
+              f'{formula_cache_info()}')
+
+
+def benchmark_distribution(*, text_representation: str = '1000d6 + 500d8 - 20d4',
+                           samples_number: int = 20_000) -> None:
+    formula = Formula(text_representation=text_representation)
+    started = time.perf_counter()
+    distribution = formula.distribution()
+    print(f'exact distribution of [{text_representation}]: {(time.perf_counter() - started) * 1e3:.1f} ms '
+          f'first time, mean {distribution.mean:.2f}, variance {distribution.variance:.2f}')
+    queries_number = 10_000
+    started = time.perf_counter()
+    for _ in range(queries_number):
+        distribution = formula.distribution()
+        distribution.percentile(90)
+        distribution.probability_at_least(5700)
+    print(f'cached distribution: {(time.perf_counter() - started) / queries_number * 1e6:.1f} us per query')
+    started = time.perf_counter()
+    totals = [formula.roll().total for _ in range(samples_number)]
+    print(f'Monte Carlo with {samples_number} rolls: {time.perf_counter() - started:.2f} s, '
+          f'mean {sum(totals) / samples_number:.2f}')
+
+
+if __name__ == '__main__':
+    benchmark_formula()
+    benchmark_formula_cache()
+    benchmark_distribution()
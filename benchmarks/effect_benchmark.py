@@ -0,0 +1,86 @@
+"""
+Run from the repository root: python -m benchmarks.effect_benchmark
+"""
+import gc
+import time
+import tracemalloc
+from dataclasses import replace
+from basic_types import Action, Effect, Timer, Value, apply_effect_to_value, apply_effect_to_values, \
+    subscribe_effect_to_timer, timer_tick, timer_tick_unapplying_effects, unapply_effect_from_value
+
+
+def fireball(value: Value) -> Value:
+    return replace(value, value=value.value - 28)
+
+
+def bless(value: Value) -> Value:
+    return replace(value, value=value.value + 2)
+
+
+def unbless(value: Value) -> Value:
+    return replace(value, value=value.value - 2)
+
+
+def apply_one_by_one(effect: Effect, values: list, timer: Timer):
+    updated_values = []
+    for value in values:
+        updated_value, effect = apply_effect_to_value(effect=effect, value=value)
+        updated_values.append(updated_value)
+    return updated_values, subscribe_effect_to_timer(effect=effect, timer=timer)
+
+
+def apply_at_once(effect: Effect, values: list, timer: Timer):
+    updated_values, effect = apply_effect_to_values(effect=effect, values=values)
+    return updated_values, subscribe_effect_to_timer(effect=effect, timer=timer)
+
+
+def benchmark_effect_application(*, targets_number: int = 200, repeats: int = 50) -> None:
+    goblins = [Value(value=30, name=f'Goblin {i}') for i in range(targets_number)]
+    effect = Effect(name='Fireball', action=Action(function=fireball), duration_in_seconds=60)
+    timings = {}
+    for name, apply in (('apply_effect_to_value loop', apply_one_by_one),
+                        ('apply_effect_to_values', apply_at_once)):
+        started = time.perf_counter()
+        for _ in range(repeats):
+            apply(effect, goblins, Timer())
+        timings[name] = (time.perf_counter() - started) / repeats / targets_number
+        gc.collect()
+        tracemalloc.start()
+        result = apply(effect, goblins, Timer())
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del result
+        print(f'{name}: {timings[name] * 1e6:.1f} us and {memory / targets_number:.0f} bytes per target')
+    print(f'speedup: {timings["apply_effect_to_value loop"] / timings["apply_effect_to_values"]:.1f}x')
+
+
+def benchmark_effect_expiry(*, targets_number: int = 40, values_number: int = 100_000, repeats: int = 20) -> None:
+    values = {v.id: v for v in (Value(value=i, name=f'Creature {i}') for i in range(values_number))}
+    allies, effect = apply_effect_to_values(
+            effect=Effect(name='Bless', action=Action(function=bless, rollback_function=unbless),
+                          duration_in_seconds=60),
+            values=list(values.values())[:targets_number])
+    values.update((v.id, v) for v in allies)
+    timer = subscribe_effect_to_timer(effect=effect, timer=Timer())
+
+    started = time.perf_counter()
+    for _ in range(repeats):
+        # Without the reverse index every value of the game is checked
+        finished_timer = timer_tick(timer=timer, seconds=60).actual_value.value
+        finished_effect = finished_timer.find_effect_by_id(effect_id=effect.id)
+        target_ids = set(finished_effect.target_ids)
+        changed = [unapply_effect_from_value(effect=finished_effect, value=v, rollback_function=unbless)
+                   for v in values.values() if v.id in target_ids]
+    scan_time = (time.perf_counter() - started) / repeats
+    started = time.perf_counter()
+    for _ in range(repeats):
+        _, unapplying_action = timer_tick_unapplying_effects(timer=timer, seconds=60, values=values)
+    index_time = (time.perf_counter() - started) / repeats
+    assert len(changed) == len(unapplying_action.actual_value.value) == targets_number
+    print(f'Bless on {targets_number} of {values_number} values expires: scan and unapply '
+          f'{scan_time * 1e3:.2f} ms, timer_tick_unapplying_effects {index_time * 1e3:.2f} ms')
+
+
+if __name__ == '__main__':
+    benchmark_effect_application()
+    benchmark_effect_expiry()
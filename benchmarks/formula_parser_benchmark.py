@@ -0,0 +1,32 @@
+"""
+Run from the repository root: python -m benchmarks.formula_parser_benchmark
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from formula_parser import parse_formula_string, parse_formula_string_with_ply
+
+FORMULAS = ['1d20+5', '3d6 - 2 + к4', '100d6 + 50d8 - 10d4 + 5', '2д10+д4-1', '6d6 + 5 корова -к6 + 15 +-ddd20']
+
+
+def tokenize_many(parse, formulas_number: int) -> None:
+    for number in range(formulas_number):
+        parse(FORMULAS[number % len(FORMULAS)])
+
+
+def benchmark_tokenizers(*, formulas_number: int = 50_000, threads_number: int = 4) -> None:
+    for name, parse in (('ply clone per thread', parse_formula_string_with_ply),
+                        ('regex tokenizer', parse_formula_string)):
+        started = time.perf_counter()
+        tokenize_many(parse, formulas_number)
+        elapsed = time.perf_counter() - started
+        print(f'{name}: {formulas_number / elapsed:,.0f} formulas per second in one thread')
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads_number) as executor:
+            for _ in range(threads_number):
+                executor.submit(tokenize_many, parse, formulas_number // threads_number)
+        elapsed = time.perf_counter() - started
+        print(f'{name}: {formulas_number / elapsed:,.0f} formulas per second in {threads_number} threads')
+
+
+if __name__ == '__main__':
+    benchmark_tokenizers()
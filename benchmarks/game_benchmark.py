@@ -0,0 +1,107 @@
+"""
+Run from the repository root: python -m benchmarks.game_benchmark
+"""
+import random
+import time
+from dataclasses import replace
+from basic_types import Action, Value
+from game import Game
+
+
+def benchmark_make_action(*, objects_number: int = 10_000, actions_number: int = 100_000) -> None:
+    game = Game()
+    started = time.perf_counter()
+    for i in range(objects_number):
+        game = game.make_action(action=Action(actual_value=Value(value=i, name=f'Object {i}')))
+    print(f'{objects_number} objects created in {time.perf_counter() - started:.2f}s')
+
+    ids = list(game.objects_dict)
+    rng = random.Random(0)
+    batch_size = actions_number // 10
+    started = batch_started = time.perf_counter()
+    for i in range(1, actions_number + 1):
+        old_value = game.objects_dict[rng.choice(ids)]
+        game = game.make_action(action=Action(previous_value=old_value,
+                                              actual_value=replace(old_value, value=old_value.value + 1)))
+        if i % batch_size == 0:
+            now = time.perf_counter()
+            print(f'  actions {i - batch_size}..{i}: {(now - batch_started) / batch_size * 1e6:.1f} us per action')
+            batch_started = now
+    elapsed = time.perf_counter() - started
+    print(f'{actions_number} actions over {objects_number} objects: {elapsed:.2f}s '
+          f'({elapsed / actions_number * 1e6:.1f} us per action)')
+
+
+def benchmark_make_actions(*, creatures_number: int = 500, rounds_number: int = 20) -> None:
+    # Area damage: every round all creatures lose hit points
+    game = Game()
+    creatures = [Action(actual_value=Value(value=100, name=f'Creature {i}')) for i in range(creatures_number)]
+    for name, apply in (('make_action', lambda g, actions: _one_by_one(g, actions)),
+                        ('make_actions', lambda g, actions: g.make_actions(actions=actions))):
+        started = time.perf_counter()
+        batch_game = apply(game, creatures)
+        for _ in range(rounds_number):
+            batch_game = apply(batch_game, [
+                Action(previous_value=v, actual_value=replace(v, value=v.value - 7), duration_in_seconds=0)
+                for v in batch_game.objects_dict.values()])
+        elapsed = time.perf_counter() - started
+        print(f'{name}: {rounds_number} rounds of damage to {creatures_number} creatures in {elapsed:.2f}s '
+              f'({elapsed / (rounds_number + 1) / creatures_number * 1e6:.1f} us per action), '
+              f'{len(batch_game.timer.ticks)} ticks')
+
+
+def benchmark_cancel_creation(*, objects_number: int = 1_000, actions_number: int = 50_000,
+                              cancels_number: int = 20) -> None:
+    game = Game(snapshot_interval=1_000)
+    for i in range(objects_number):
+        game = game.make_action(action=Action(actual_value=Value(value=i, name=f'Object {i}')))
+    ids = list(game.objects_dict)
+    rng = random.Random(0)
+    game = game.make_actions(actions=(
+        Action(previous_value=v, actual_value=replace(v, value=v.value + 1))
+        for v in (game.objects_dict[rng.choice(ids)] for _ in range(actions_number))))
+    # Objects created at the start of the session, so the nearest snapshot is far from the cancelled action
+    for name, cancel in (('from snapshot', lambda n: game._cancel_action_from_snapshot(action_number=n)),
+                         ('without replay', lambda n: game.cancel_action(action_id=game.actions_list[n].id))):
+        started = time.perf_counter()
+        for action_number in range(cancels_number):
+            cancelled_game = cancel(action_number)
+        elapsed = (time.perf_counter() - started) / cancels_number
+        print(f'cancel of object creation in {len(game.actions_list)} actions, {name}: {elapsed * 1e3:.2f} ms, '
+              f'{len(cancelled_game.actions_list)} actions left')
+
+
+def benchmark_undo(*, objects_number: int = 1_000, actions_number: int = 20_000, undos_number: int = 50) -> None:
+    game = Game()
+    for i in range(objects_number):
+        game = game.make_action(action=Action(actual_value=Value(value=i, name=f'Object {i}')))
+    ids = list(game.objects_dict)
+    rng = random.Random(0)
+    for _ in range(actions_number):
+        old_value = game.objects_dict[rng.choice(ids)]
+        game = game.make_action(action=Action(previous_value=old_value,
+                                              actual_value=replace(old_value, value=old_value.value + 1)))
+    for name, step_back in (('cancel_last_action', Game.cancel_last_action), ('undo', Game.undo)):
+        undone_game = game
+        started = time.perf_counter()
+        for _ in range(undos_number):
+            undone_game = step_back(undone_game)
+        elapsed = (time.perf_counter() - started) / undos_number
+        print(f'{name} in {len(game.actions_list)} actions: {elapsed * 1e6:.0f} us')
+    started = time.perf_counter()
+    for _ in range(undos_number):
+        undone_game = undone_game.redo()
+    print(f'redo: {(time.perf_counter() - started) / undos_number * 1e6:.0f} us')
+
+
+def _one_by_one(game: Game, actions) -> Game:
+    for action in actions:
+        game = game.make_action(action=action)
+    return game
+
+
+if __name__ == '__main__':
+    benchmark_make_action()
+    benchmark_make_actions()
+    benchmark_cancel_creation()
+    benchmark_undo()
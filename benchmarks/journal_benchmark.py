@@ -0,0 +1,39 @@
+"""
+Run from the repository root: python -m benchmarks.journal_benchmark
+"""
+import os
+import tempfile
+import time
+from basic_types import Value, Action
+from game import Game
+
+
+def benchmark_journal(*, actions_number: int = 5000, saves_number: int = 3) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        for sync_every in (1, 64):
+            game = Game.open_journal(filename=os.path.join(directory, f'{sync_every}.journal'),
+                                     sync_every=sync_every)
+            started = time.perf_counter()
+            for i in range(actions_number):
+                game = game.make_action(action=Action(actual_value=Value(value=i)))
+                if i % 1000 == 999:
+                    elapsed = time.perf_counter() - started
+                    print(f'journal, sync every {sync_every}: {elapsed / 1000 * 1e6:.0f} us per action '
+                          f'at {i + 1} actions')
+                    started = time.perf_counter()
+            game.journal.close()
+
+        game = Game()
+        filename = os.path.join(directory, 'rewrite.game')
+        for i in range(actions_number):
+            game = game.make_action(action=Action(actual_value=Value(value=i)))
+            if i % 1000 == 999:
+                started = time.perf_counter()
+                for _ in range(saves_number):
+                    game.save_to_disk(filename=filename, file_format='binary')
+                elapsed = (time.perf_counter() - started) / saves_number
+                print(f'save_to_disk after every action: {elapsed * 1e6:.0f} us per action at {i + 1} actions')
+
+
+if __name__ == '__main__':
+    benchmark_journal()
@@ -0,0 +1,61 @@
+"""
+Run from the repository root: python -m benchmarks.memory_benchmark
+"""
+import datetime
+import tracemalloc
+import typing
+import uuid
+from dataclasses import dataclass, field
+from basic_types import Action, Value
+from persistent_collections import PersistentVector, PersistentMap
+
+
+# Action and Value the way they were before slots and int ids
+@dataclass(frozen=True)
+class DictValue:
+    value: typing.Any
+    name: str = 'Noname value'
+    id: uuid.UUID = field(default_factory=uuid.uuid4)
+    actions_sequence: PersistentVector = field(default_factory=PersistentVector)
+    subscribers: list = ()
+    short_description: str = 'No short description'
+    full_description: str = 'No full description'
+    children: typing.List['DictValue'] = ()
+    parent: typing.Optional['DictValue'] = None
+    actions_index: PersistentMap = field(default_factory=PersistentMap, compare=False, repr=False)
+
+
+@dataclass(frozen=True)
+class DictAction:
+    id: uuid.UUID = field(default_factory=uuid.uuid4)
+    time: datetime.datetime = field(default_factory=datetime.datetime.now)
+    duration_in_seconds: float = 0
+    name: str = 'Noname action'
+    previous_value: typing.Optional[DictValue] = None
+    actual_value: typing.Optional[DictValue] = None
+    function: typing.Optional[typing.Callable] = None
+    rollback_function: typing.Optional[typing.Callable] = None
+    short_description: str = 'No short description'
+    full_description: str = 'No full description'
+    visibility_level: str = 'visible'
+
+
+def bytes_per_object(create: typing.Callable[[int], typing.Any], objects_number: int) -> float:
+    tracemalloc.start()
+    objects = [create(number) for number in range(objects_number)]
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return memory / objects_number
+
+
+def benchmark_memory(*, objects_number: int = 200_000) -> None:
+    for name, create in (('Value before', lambda number: DictValue(value=number)),
+                         ('Value after', lambda number: Value(value=number)),
+                         ('Action before', lambda number: DictAction(name='Hit')),
+                         ('Action after', lambda number: Action(name='Hit'))):
+        print(f'{name}: {bytes_per_object(create, objects_number):.0f} bytes per object')
+
+
+if __name__ == '__main__':
+    benchmark_memory()
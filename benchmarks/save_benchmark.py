@@ -0,0 +1,45 @@
+"""
+Run from the repository root: python -m benchmarks.save_benchmark
+"""
+import os
+import tempfile
+import time
+from dataclasses import replace
+from basic_types import Value, Action
+from game import Game
+
+
+def long_game(actions_number: int) -> Game:
+    game = Game()
+    objects = [Value(value=i, name=f'Monster {i}') for i in range(100)]
+    for value in objects:
+        game = game.make_action(action=Action(actual_value=value))
+    for i in range(actions_number - len(objects)):
+        old_value = game.objects_dict[objects[i % len(objects)].id]
+        game = game.make_action(action=Action(previous_value=old_value,
+                                              actual_value=replace(old_value, value=old_value.value - 1),
+                                              name=f'Monster {i % len(objects)} is hit',
+                                              duration_in_seconds=6))
+    return game
+
+
+def benchmark_save(*, actions_number: int = 20_000) -> None:
+    game = long_game(actions_number)
+    with tempfile.TemporaryDirectory() as directory:
+        for file_format in ('pickle', 'binary'):
+            filename = os.path.join(directory, f'{file_format}.game')
+            started = time.perf_counter()
+            assert game.save_to_disk(filename=filename, file_format=file_format) == 'OK'
+            save_time = time.perf_counter() - started
+            started = time.perf_counter()
+            loaded_game = Game.load_from_disk(filename=filename)
+            load_time = time.perf_counter() - started
+            started = time.perf_counter()
+            loaded_game.actions_list[actions_number // 2]
+            read_time = time.perf_counter() - started
+            print(f'{file_format}: {os.path.getsize(filename) / len(game.actions_list):.0f} bytes per action, '
+                  f'save {save_time:.2f} s, load {load_time:.2f} s, reading one action {read_time * 1e6:.0f} us')
+
+
+if __name__ == '__main__':
+    benchmark_save()
@@ -0,0 +1,67 @@
+"""
+Run from the repository root: python -m benchmarks.search_benchmark
+"""
+import random
+import time
+import tracemalloc
+from basic_types import Value, Action
+from character import Character
+from game import Game
+
+
+def linear_search(game: Game, text_to_search: str) -> dict:
+    # full_text_search before the search index
+    return {k: v for k, v in game.objects_dict.items() if
+            text_to_search in v.name or
+            text_to_search in v.short_description or
+            text_to_search in v.full_description or
+            text_to_search in str(v.value)}
+
+
+def benchmark_search(*, objects_number: int = 100_000, queries_number: int = 200) -> None:
+    objects = [Value(name=f'Monster {i}', value=Character(name=f'Goblin {i}') if i % 10 == 0 else i)
+               for i in range(objects_number)]
+    started = time.perf_counter()
+    game = Game(objects_dict={value.id: value for value in objects})
+    print(f'indexing {objects_number} objects: {time.perf_counter() - started:.1f} s')
+    actions_number = 1000
+    started = time.perf_counter()
+    for i in range(actions_number):
+        game = game.make_action(action=Action(actual_value=Value(name=f'Ancient red dragon {i}', value=546)))
+    print(f'make_action: {(time.perf_counter() - started) / actions_number * 1e6:.0f} us')
+    for query in ('red dragon 7', 'Goblin 4242', 'Monster 9999'):
+        started = time.perf_counter()
+        for _ in range(queries_number):
+            found = game.full_text_search(text_to_search=query)
+        indexed_time = (time.perf_counter() - started) / queries_number
+        started = time.perf_counter()
+        expected = linear_search(game, query)
+        linear_time = time.perf_counter() - started
+        assert found == expected
+        print(f'[{query}]: {len(found)} found, index {indexed_time * 1e3:.3f} ms, linear scan {linear_time * 1e3:.0f} ms')
+
+
+def benchmark_index_memory(*, characters_number: int = 100, changes_number: int = 10_000,
+                           searches_every: int = 100) -> None:
+    tracemalloc.start()
+    game = Game(snapshot_interval=0, undo_limit=0)
+    for i in range(characters_number):
+        game = game.add_character(f'Hero {i}')
+    ids = list(game.objects_dict)
+    rng = random.Random(0)
+    started = time.perf_counter()
+    for i in range(changes_number):
+        game = game.make_action(action=Character.change_character_field_action(
+                container_value=game.objects_dict[rng.choice(ids)], field_name='strength', new_field_value=i))
+        if i % searches_every == 0:
+            game.full_text_search(text_to_search='strength=1')
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{changes_number} character changes with a search every {searches_every}: {elapsed:.1f} s, '
+          f'peak {peak / 1024 / 1024:.0f} MiB, {len(game.search_index)} strings in the index')
+
+
+if __name__ == '__main__':
+    benchmark_search()
+    benchmark_index_memory()
@@ -0,0 +1,28 @@
+"""
+Run from the repository root: python -m benchmarks.simulation_benchmark
+"""
+import os
+import time
+from basic_types import Formula
+from dnd_types import Roll
+
+
+def benchmark_simulation(*, text_representation: str = '8d6 + 3', rolls_number: int = 20_000_000) -> None:
+    formula = Formula(text_representation=text_representation)
+    objects_rolls_number = 2000
+    started = time.perf_counter()
+    for _ in range(objects_rolls_number):
+        Roll(type='attack', formula=formula).value
+    elapsed = time.perf_counter() - started
+    print(f'Roll objects: {objects_rolls_number / elapsed:,.0f} rolls per second of [{text_representation}]')
+    cores_number = os.cpu_count() or 1
+    for processes in sorted({1, 2, 4, cores_number}):
+        started = time.perf_counter()
+        formula.simulate(rolls_number=rolls_number, seed=1, processes=processes)
+        elapsed = time.perf_counter() - started
+        print(f'simulate with {processes} processes: {rolls_number / elapsed:,.0f} rolls per second '
+              f'({cores_number} cores available)')
+
+
+if __name__ == '__main__':
+    benchmark_simulation()
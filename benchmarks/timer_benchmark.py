@@ -0,0 +1,26 @@
+"""
+Run from the repository root: python -m benchmarks.timer_benchmark
+"""
+import random
+import time
+from basic_types import Action, Effect, Timer, subscribe_effect_to_timer, timer_tick
+
+
+def benchmark_timer_tick(*, effects_number: int = 10_000, ticks_number: int = 2_000) -> None:
+    rng = random.Random(0)
+    timer = Timer()
+    for i in range(effects_number):
+        effect = Effect(name=f'Effect {i}', action=Action(), duration_in_seconds=rng.randrange(6, 6 * 600, 6))
+        timer = subscribe_effect_to_timer(effect=effect, timer=timer)
+
+    started = time.perf_counter()
+    for _ in range(ticks_number):
+        timer = timer_tick(timer=timer, seconds=6).actual_value.value
+    elapsed = time.perf_counter() - started
+    finished = sum(1 for s in timer.effects.values() if s.effect.finished)
+    print(f'{ticks_number} ticks with {effects_number} concurrent effects ({finished} finished): '
+          f'{elapsed:.2f}s ({elapsed / ticks_number * 1e6:.1f} us per tick)')
+
+
+if __name__ == '__main__':
+    benchmark_timer_tick()
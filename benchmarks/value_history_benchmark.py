@@ -0,0 +1,48 @@
+"""
+Run from the repository root: python -m benchmarks.value_history_benchmark
+"""
+import time
+import tracemalloc
+from dataclasses import replace
+import random
+from basic_types import Value, NumericDelta, change_value, roll_back_value
+
+
+def increment(v: Value) -> Value:
+    return replace(v, value=v.value + 1)
+
+
+def benchmark_value_history(*, changes_numbers: tuple = (1_000, 5_000, 10_000)) -> None:
+    for changes_number in changes_numbers:
+        tracemalloc.start()
+        started = time.perf_counter()
+        value = Value(value=0)
+        for _ in range(changes_number):
+            value = change_value(value_to_change=value, changing_function=increment).actual_value
+        elapsed = time.perf_counter() - started
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f'{changes_number} changes: {memory / 1024 / 1024:.1f} MiB ({memory / changes_number:.0f} bytes per change), '
+              f'{elapsed:.2f}s')
+
+
+def benchmark_middle_rollback(*, changes_numbers: tuple = (1_000, 10_000), rollbacks_number: int = 20) -> None:
+    rng = random.Random(0)
+    for changes_number in changes_numbers:
+        value = Value(value=100)
+        for _ in range(changes_number):
+            value = change_value(value_to_change=value, changing_function=NumericDelta(amount=-rng.randrange(10)),
+                                 change_name='Hit').actual_value
+        action_ids = [a.id for a in value.actions_sequence[changes_number // 2:changes_number // 2 + rollbacks_number]]
+        for replay in (True, False):
+            started = time.perf_counter()
+            for action_id in action_ids:
+                rolled_back_value = roll_back_value(value=value, action_id_to_rollback=action_id, replay=replay)
+            elapsed = (time.perf_counter() - started) / rollbacks_number
+            print(f'rollback of the middle of {changes_number} deltas, {"replay" if replay else "opposite delta"}: '
+                  f'{elapsed * 1e6:.0f} us, value {rolled_back_value.value}')
+
+
+if __name__ == '__main__':
+    benchmark_value_history()
+    benchmark_middle_rollback()
@@ -1,35 +1,76 @@
-from dataclasses import dataclass, field, replace, asdict
+from dataclasses import dataclass, field, fields, replace
 import typing
-from uuid import UUID, uuid4
-from basic_types import Action, Value
-from dacite import from_dict
+from dacite import WrongTypeError
+from basic_types import Action, Value, LazyText, new_id, set_pickled_fields
 
 
-@dataclass(frozen=True)
+class WrongFieldTypeError(WrongTypeError, TypeError):
+    """
+    dacite.WrongTypeError, as it was raised when fields were changed with dacite, and a TypeError
+    """
+
+
+def _type_validator(hint) -> typing.Callable[[typing.Any], bool]:
+    """
+    Function checking that a value has the type hint type, made once for every field
+    """
+    if hint is typing.Any:
+        return lambda value: True
+    origin = typing.get_origin(hint)
+    arguments = typing.get_args(hint)
+    if origin is typing.Union:
+        validators = [_type_validator(argument) for argument in arguments]
+        return lambda value: any(validator(value) for validator in validators)
+    if origin is dict and arguments:
+        key_validator, value_validator = (_type_validator(argument) for argument in arguments)
+        return lambda value: isinstance(value, dict) and all(
+                key_validator(k) and value_validator(v) for k, v in value.items())
+    if origin is not None:
+        return lambda value: isinstance(value, origin)
+    return lambda value: isinstance(value, hint)
+
+
+@dataclass(frozen=True, slots=True)
 class Character:
-    id: UUID = field(default_factory=uuid4)
+    id: int = field(default_factory=new_id)
     name: str = 'Noname character'
     strength: int = 0
     dexterity: int = 0
 
     relationships: typing.Dict['Character', tuple] = field(default_factory=dict)
 
+    def __setstate__(self, state):
+        set_pickled_fields(self, state)
+
     def change_field(self, *, field_name: str, new_value: typing.Any) -> 'Character':
-        if field_name not in self.__dict__:
+        validator = _field_validators.get(field_name)
+        if validator is None:
             return self
-
-        self_as_dict = asdict(self)
-        self_as_dict[field_name] = new_value
-        return from_dict(data_class=Character, data=self_as_dict)
+        if not validator(new_value):
+            raise _wrong_type_error(field_name, new_value)
+        return _changed_copy(self, {field_name: new_value})
 
     def change_several_fields(self, *, name_value_dict: typing.Dict[str, typing.Any]) -> 'Character':
-        self_as_dict = asdict(self)
-        for field_name, new_value in name_value_dict.items():
-            if field_name not in self.__dict__:
-                continue
+        """
+        Unknown fields are skipped, WrongFieldTypeError is raised if a value doesn't match the field type
+        """
+        changes = _validated_changes(name_value_dict)
+        if not changes:
+            return self
+        return _changed_copy(self, changes)
 
-            self_as_dict[field_name] = new_value
-        return from_dict(data_class=Character, data=self_as_dict)
+    @staticmethod
+    def change_fields_of_characters(*,
+                                    characters: typing.Iterable['Character'],
+                                    name_value_dict: typing.Dict[str, typing.Any],
+                                    ) -> typing.List['Character']:
+        """
+        The same changes for many characters, values are checked only once
+        """
+        changes = _validated_changes(name_value_dict)
+        if not changes:
+            return list(characters)
+        return [_changed_copy(character, changes) for character in characters]
 
     @staticmethod
     def change_character_field_action(*,
@@ -44,8 +85,8 @@ class Character:
         new_character = old_character.change_field(field_name=field_name, new_value=new_field_value)
         return Action(previous_value=container_value,
                       actual_value=replace(container_value, value=new_character),
-                      name=f'Action for change character "{old_character.name}" field '
-                      f'{field_name} to {new_field_value}')
+                      name=LazyText('Action for change character "{}" field {} to {}',
+                                    old_character.name, field_name, new_field_value))
 
     @staticmethod
     def change_character_several_fields_action(*,
@@ -59,7 +100,42 @@ class Character:
         new_character = old_character.change_several_fields(name_value_dict=changing_dict)
         return Action(previous_value=container_value,
                       actual_value=replace(container_value, value=new_character),
-                      name=f'Action for change character "{old_character.name}" field: {changing_dict}')
+                      name=LazyText('Action for change character "{}" field: {}',
+                                    old_character.name, dict(changing_dict)))
+
+
+# Type hints are resolved and validators are made only once
+_field_types = typing.get_type_hints(Character)
+_field_validators = {f.name: _type_validator(_field_types[f.name]) for f in fields(Character)}
+# Slot descriptors of the fields, they are read and written directly by _changed_copy
+_field_slots = tuple((Character.__dict__[field_name].__get__, Character.__dict__[field_name].__set__)
+                     for field_name in _field_validators)
+
+
+def _wrong_type_error(field_name: str, new_value: typing.Any) -> WrongFieldTypeError:
+    return WrongFieldTypeError(field_type=_field_types[field_name], value=new_value, field_path=field_name)
+
+
+def _validated_changes(name_value_dict: typing.Dict[str, typing.Any]) -> typing.Dict[str, typing.Any]:
+    changes = {}
+    for field_name, new_value in name_value_dict.items():
+        validator = _field_validators.get(field_name)
+        if validator is None:
+            continue
+        if not validator(new_value):
+            raise _wrong_type_error(field_name, new_value)
+        changes[field_name] = new_value
+    return changes
+
+
+def _changed_copy(character: Character, changes: typing.Dict[str, typing.Any]) -> Character:
+    # Values are already checked, so __init__ (that replace calls) is not needed
+    new_character = object.__new__(Character)
+    for get_field, set_field in _field_slots:
+        set_field(new_character, get_field(character))
+    for field_name, new_value in changes.items():
+        object.__setattr__(new_character, field_name, new_value)
+    return new_character
 
 
 if __name__ == '__main__':
@@ -0,0 +1,266 @@
+import bisect
+import functools
+import itertools
+import os
+import random
+import typing
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from formula_parser import compile_formula, FormulaTerm
+
+try:
+    import numpy
+except ImportError:  # numpy is optional, pure python fallback is used without it
+    numpy = None
+
+if numpy is not None:
+    _numpy_generator = numpy.random.default_rng()
+    # Forked process must not repeat the rolls of its parent, the random module is reseeded by Python itself
+    os.register_at_fork(after_in_child=lambda: globals().update(_numpy_generator=numpy.random.default_rng()))
+
+# Convolutions of longer arrays are done with FFT, shorter ones directly
+FFT_THRESHOLD = 256
+# Simulated rolls are split in chunks with this number of dice, every chunk has its own random stream
+SIMULATION_CHUNK_DICE = 1 << 20
+
+
+def new_seed() -> int:
+    return random.SystemRandom().getrandbits(64)
+
+
+def _stream_generator(seed: int, stream_number: int):
+    """
+    Independent random generator number stream_number for the seed, the same for the same arguments
+    """
+    if numpy is not None:
+        return numpy.random.default_rng(numpy.random.SeedSequence(seed, spawn_key=(stream_number,)))
+    return random.Random(f'{seed}:{stream_number}')
+
+
+def _generator_integers(generator, quantity: int, minimal_possible_value: int,
+                        maximal_possible_value: int) -> typing.Sequence[int]:
+    if numpy is not None and isinstance(generator, numpy.random.Generator):
+        return generator.integers(minimal_possible_value, maximal_possible_value + 1, size=quantity)
+    return array('q', generator.choices(range(minimal_possible_value, maximal_possible_value + 1), k=quantity))
+
+
+class DiceRng:
+    """
+    Reproducible source of dice results. Every throw gets its own stream: stream number position of the seed,
+    so to repeat throws only seed and position have to be stored, not the results.
+    Not locked, every thread or worker process should have its own DiceRng
+    """
+    __slots__ = ('seed', 'position')
+
+    def __init__(self, *, seed: typing.Optional[int] = None, position: int = 0):
+        self.seed = new_seed() if seed is None else seed
+        self.position = position
+
+    def roll_dice(self, *, quantity: int, minimal_possible_value: int,
+                  maximal_possible_value: int) -> typing.Sequence[int]:
+        generator = _stream_generator(self.seed, self.position)
+        self.position += 1
+        return _generator_integers(generator, quantity, minimal_possible_value, maximal_possible_value)
+
+    def __repr__(self) -> str:
+        return f'DiceRng(seed={self.seed!r}, position={self.position!r})'
+
+    def __reduce__(self):
+        return _dice_rng, (self.seed, self.position)
+
+
+def _dice_rng(seed: int, position: int) -> DiceRng:
+    return DiceRng(seed=seed, position=position)
+
+
+def roll_dice(*, quantity: int, minimal_possible_value: int, maximal_possible_value: int,
+              rng: typing.Optional[DiceRng] = None) -> typing.Sequence[int]:
+    """
+    Throws quantity dice at once. Returns numpy array if numpy is installed, otherwise array('q').
+    Without rng the shared module generator is used, so results can't be repeated
+    """
+    if rng is not None:
+        return rng.roll_dice(quantity=quantity,
+                             minimal_possible_value=minimal_possible_value,
+                             maximal_possible_value=maximal_possible_value)
+    if numpy is not None:
+        return _numpy_generator.integers(minimal_possible_value, maximal_possible_value + 1, size=quantity)
+    return array('q', random.choices(range(minimal_possible_value, maximal_possible_value + 1), k=quantity))
+
+
+def negated(results: typing.Sequence[int]) -> typing.Sequence[int]:
+    if numpy is not None and isinstance(results, numpy.ndarray):
+        return -results
+    return array('q', (-r for r in results))
+
+
+def results_sum(results: typing.Sequence[int]) -> int:
+    if numpy is not None and isinstance(results, numpy.ndarray):
+        return int(results.sum())
+    return sum(results)
+
+
+@dataclass(frozen=True)
+class Distribution:
+    """
+    Probability mass function of an integer random value: probabilities[i] is the probability of minimum + i
+    """
+    minimum: int
+    probabilities: typing.Tuple[float, ...]
+
+    @property
+    def maximum(self) -> int:
+        return self.minimum + len(self.probabilities) - 1
+
+    @functools.cached_property
+    def mean(self) -> float:
+        return self.minimum + sum(i * p for i, p in enumerate(self.probabilities))
+
+    @functools.cached_property
+    def variance(self) -> float:
+        mean = self.mean - self.minimum
+        return sum((i - mean) ** 2 * p for i, p in enumerate(self.probabilities))
+
+    @functools.cached_property
+    def _cumulative(self) -> typing.List[float]:
+        return list(itertools.accumulate(self.probabilities))
+
+    @functools.cached_property
+    def _at_least(self) -> typing.List[float]:
+        # Summed from the end, so small tail probabilities are not lost in 1 - cumulative
+        return list(itertools.accumulate(reversed(self.probabilities)))[::-1]
+
+    def probability(self, result: int) -> float:
+        if not self.minimum <= result <= self.maximum:
+            return 0.0
+        return self.probabilities[result - self.minimum]
+
+    def probability_at_least(self, result: int) -> float:
+        if result <= self.minimum:
+            return 1.0
+        if result > self.maximum:
+            return 0.0
+        return self._at_least[result - self.minimum]
+
+    def percentile(self, percent: float) -> int:
+        """
+        The smallest result that is not exceeded with the given probability in percents
+        """
+        if not 0 <= percent <= 100:
+            raise ValueError(f'Percent must be between 0 and 100, got {percent}')
+        # Floating point sums can stay a bit below 1, so the last result is returned then
+        position = bisect.bisect_left(self._cumulative, percent / 100 - 1e-12)
+        return self.minimum + min(position, len(self.probabilities) - 1)
+
+    def negated(self) -> 'Distribution':
+        return Distribution(minimum=-self.maximum, probabilities=self.probabilities[::-1])
+
+    def shifted(self, number: int) -> 'Distribution':
+        return Distribution(minimum=self.minimum + number, probabilities=self.probabilities)
+
+
+def _convolve(first: typing.Sequence[float], second: typing.Sequence[float]) -> typing.Sequence[float]:
+    if numpy is None:
+        result = [0.0] * (len(first) + len(second) - 1)
+        for i, first_probability in enumerate(first):
+            for j, second_probability in enumerate(second):
+                result[i + j] += first_probability * second_probability
+        return result
+    if min(len(first), len(second)) < FFT_THRESHOLD:
+        return numpy.convolve(first, second)
+    size = len(first) + len(second) - 1
+    fft_size = 1 << (size - 1).bit_length()
+    result = numpy.fft.irfft(numpy.fft.rfft(first, fft_size) * numpy.fft.rfft(second, fft_size), fft_size)[:size]
+    return numpy.clip(result, 0, None)  # FFT rounding errors can give tiny negative probabilities
+
+
+def _as_tuple(probabilities: typing.Sequence[float]) -> typing.Tuple[float, ...]:
+    if numpy is not None and isinstance(probabilities, numpy.ndarray):
+        return tuple(probabilities.tolist())
+    return tuple(probabilities)
+
+
+@functools.lru_cache(maxsize=1024)
+def dice_distribution(*, quantity: int, minimal_possible_value: int, maximal_possible_value: int) -> Distribution:
+    """
+    Distribution of the sum of quantity dice, single dice distribution is raised to the power by repeated squaring
+    """
+    sides = maximal_possible_value - minimal_possible_value + 1
+    power = (1.0,)
+    square = (1 / sides,) * sides
+    remaining = quantity
+    while remaining:
+        if remaining & 1:
+            power = _convolve(power, square)
+        remaining >>= 1
+        if remaining:
+            square = _convolve(square, square)
+    return Distribution(minimum=minimal_possible_value * quantity, probabilities=_as_tuple(power))
+
+
+def sum_distribution(distributions: typing.Iterable[Distribution]) -> Distribution:
+    """
+    Distribution of the sum of independent values
+    """
+    minimum = 0
+    probabilities = (1.0,)
+    for distribution in distributions:
+        minimum += distribution.minimum
+        probabilities = _convolve(probabilities, distribution.probabilities)
+    return Distribution(minimum=minimum, probabilities=_as_tuple(probabilities))
+
+
+def _simulate_chunk(terms: typing.Tuple[FormulaTerm, ...], rolls_number: int, seed: int,
+                    chunk_number: int) -> typing.Sequence[int]:
+    generator = _stream_generator(seed, chunk_number)
+    constant = int(sum(term.number for term in terms if not term.is_dice))
+    if numpy is not None:
+        totals = numpy.full(rolls_number, constant, dtype=numpy.int64)
+        for term in terms:
+            if not term.is_dice or not term.dice_quantity:
+                continue
+            term_totals = generator.integers(term.dice_min, term.dice_max + 1,
+                                             size=(rolls_number, term.dice_quantity)).sum(axis=1)
+            if term.is_negative:
+                totals -= term_totals
+            else:
+                totals += term_totals
+        return totals
+    totals = array('q', (constant,)) * rolls_number
+    for term in terms:
+        if not term.is_dice or not term.dice_quantity:
+            continue
+        sides = range(term.dice_min, term.dice_max + 1)
+        sign = -1 if term.is_negative else 1
+        for roll_number in range(rolls_number):
+            totals[roll_number] += sign * sum(generator.choices(sides, k=term.dice_quantity))
+    return totals
+
+
+def simulate(*, text_representation: str, rolls_number: int, seed: typing.Optional[int] = None,
+             processes: int = 1) -> typing.Sequence[int]:
+    """
+    Totals of rolls_number rolls of the formula, no objects are created for single rolls.
+    Returns numpy array if numpy is installed, otherwise array('q').
+    Rolls are split in chunks of fixed size and every chunk gets its own stream of the seed,
+    so with the same seed results don't depend on the number of processes
+    """
+    if seed is None:
+        seed = new_seed()
+    terms = compile_formula(text_representation)
+    dice_per_roll = max(1, sum(term.dice_quantity for term in terms if term.is_dice))
+    chunk_size = max(1, SIMULATION_CHUNK_DICE // dice_per_roll)
+    chunks = [min(chunk_size, rolls_number - start) for start in range(0, rolls_number, chunk_size)]
+    if processes > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(_simulate_chunk, [terms] * len(chunks), chunks, [seed] * len(chunks),
+                                        range(len(chunks))))
+    else:
+        results = [_simulate_chunk(terms, chunk, seed, chunk_number) for chunk_number, chunk in enumerate(chunks)]
+    if numpy is not None:
+        return numpy.concatenate(results) if results else numpy.zeros(0, dtype=numpy.int64)
+    totals = array('q')
+    for chunk_totals in results:
+        totals.extend(chunk_totals)
+    return totals
@@ -1,4 +1,5 @@
 from basic_types import Action, Formula, Value
+from dice_engine import DiceRng
 import typing
 from dataclasses import dataclass, field, replace
 from uuid import uuid4, UUID
@@ -18,10 +19,12 @@ class Roll:
     dependent_actions: typing.List[Action] = field(default_factory=list, hash=False)
     short_description: str = 'Roll without a short description'
     long_description: str = 'Roll without a long description'
+    # Source of dice results, formula rng is used if it is None
+    rng: typing.Optional[DiceRng] = field(default=None, compare=False, repr=False)
 
     def __post_init__(self):
         if not self.dependent_actions:
-            self.dependent_actions.extend(self.formula.parse())
+            self.dependent_actions.extend(self.formula.parse(rng=self.rng))
 
     def cancel(self) -> 'Roll':
         cancelled_actions_list = []
@@ -54,6 +57,13 @@ class Roll:
             previous_actions_list.append(replace(a, previous_value=a.actual_value, actual_value=Value(value=0)))
         return replace(self, dependent_actions=previous_actions_list + [manual_value_action, ])
 
+    def simulate(self, *, rolls_number: int, seed: typing.Optional[int] = None,
+                 processes: int = 1) -> typing.Sequence[int]:
+        """
+        Totals of the roll formula thrown rolls_number times, this roll is not changed
+        """
+        return self.formula.simulate(rolls_number=rolls_number, seed=seed, processes=processes)
+
     @property
     def value(self):
         return sum((a.actual_value.value for a in self.dependent_actions))
@@ -1,6 +1,9 @@
 import ply.lex as lex
 import re
+import threading
 import typing
+from collections import OrderedDict
+from dataclasses import dataclass
 tokens = ('dice', 'sign', 'number')
 t_dice = r'\d*(d|к|д)\d+'
 t_sign = r'\+|-'
@@ -13,23 +16,189 @@ def t_error(t):
     t.lexer.skip(1)
 
 
+# Template lexer, every thread uses its own clone, because ply lexer keeps the input inside
 lexer = lex.lex(reflags=re.UNICODE | re.DOTALL)
+_thread_data = threading.local()
 # test_string = '6d6 + 5 корова -к6 + 15 +-ddd20'
 # lexer.input(test_string)
 
+# The same rules as ply master regex has: string rules sorted by decreasing regex length
+_token_regex = re.compile('|'.join(f'(?P<{name}>{regex})' for name, regex in sorted(
+        (('dice', t_dice), ('sign', t_sign), ('number', t_number)), key=lambda rule: -len(rule[1]))),
+        re.UNICODE | re.DOTALL)
 
-def parse_formula_string(string) -> typing.List[lex.LexToken]:
+
+@dataclass(frozen=True)
+class FormulaToken:
+    type: str
+    value: str
+    lexpos: int
+
+
+def _thread_lexer() -> lex.Lexer:
+    thread_lexer = getattr(_thread_data, 'lexer', None)
+    if thread_lexer is None:
+        thread_lexer = _thread_data.lexer = lexer.clone()
+    return thread_lexer
+
+
+def parse_formula_string_with_ply(string) -> typing.List[lex.LexToken]:
     string = string.replace(' ', '').strip()  # making sure there is no spaces in string
     tokens_ = []
-    lexer.input(string)
+    thread_lexer = _thread_lexer()
+    thread_lexer.input(string)
     while True:
-        tk = lexer.token()
+        tk = thread_lexer.token()
         if not tk:
             break
         tokens_.append(tk)
     return tokens_
 
 
+def parse_formula_string(string) -> typing.List[FormulaToken]:
+    """
+    Gives the same tokens as ply lexer, but keeps no state between calls, so it can be used from any thread
+    """
+    string = string.replace(' ', '').strip()  # making sure there is no spaces in string
+    tokens_ = []
+    position = 0
+    length = len(string)
+    match = _token_regex.match
+    while position < length:
+        if string[position] in t_ignore:
+            position += 1
+            continue
+        token_match = match(string, position)
+        if token_match is None:
+            position += 1  # the same as t_error does
+            continue
+        tokens_.append(FormulaToken(type=token_match.lastgroup, value=token_match.group(), lexpos=position))
+        position = token_match.end()
+    return tokens_
+
+
+@dataclass(frozen=True)
+class FormulaTerm:
+    """
+    One token of formula: number or dice_quantity dice with values from dice_min to dice_max
+    """
+    token_number: int
+    is_dice: bool
+    is_negative: bool = False
+    number: float = 0
+    dice_quantity: int = 0
+    dice_min: int = 0
+    dice_max: int = 0
+
+
+def _compile_formula_string(string) -> typing.Tuple[FormulaTerm, ...]:
+    terms = []
+    is_negative = False
+    token_number = 0
+    for lex_token in parse_formula_string(string):
+        token_number += 1
+        lex_type, lex_value = getattr(lex_token, 'type'), getattr(lex_token, 'value')
+        if lex_type == 'sign':
+            is_negative = lex_value == '-'
+
+        elif lex_type == 'number':
+            numeric_value = float(lex_value)
+            terms.append(FormulaTerm(
+                    token_number=token_number,
+                    is_dice=False,
+                    is_negative=is_negative,
+                    number=-numeric_value if is_negative else numeric_value))
+
+        elif lex_type == 'dice':
+            lex_value = lex_value.replace('к', 'd').replace('д', 'd')
+            dice_quantity, dice_max = lex_value.split('d')
+            dice_max = int(dice_max)
+            if dice_max < 0:
+                raise ValueError('Dice max must be >= 0')
+            terms.append(FormulaTerm(
+                    token_number=token_number,
+                    is_dice=True,
+                    is_negative=is_negative,
+                    dice_quantity=int(dice_quantity) if dice_quantity else 1,
+                    dice_min=0 if dice_max == 0 else 1,
+                    dice_max=dice_max))
+    return tuple(terms)
+
+
+@dataclass(frozen=True)
+class FormulaCacheInfo:
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class FormulaCache:
+    """
+    Thread safe LRU cache of compiled formulas: formula text -> terms
+    """
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._terms_by_string = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, string) -> typing.Tuple[FormulaTerm, ...]:
+        with self._lock:
+            terms = self._terms_by_string.get(string)
+            if terms is not None:
+                self._terms_by_string.move_to_end(string)
+                self.hits += 1
+                return terms
+            self.misses += 1
+
+        terms = _compile_formula_string(string)
+        with self._lock:
+            if self.maxsize > 0:
+                self._terms_by_string[string] = terms
+                while len(self._terms_by_string) > self.maxsize:
+                    self._terms_by_string.popitem(last=False)
+        return terms
+
+    def resize(self, maxsize: int) -> None:
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._terms_by_string) > max(maxsize, 0):
+                self._terms_by_string.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._terms_by_string.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> FormulaCacheInfo:
+        with self._lock:
+            return FormulaCacheInfo(hits=self.hits,
+                                    misses=self.misses,
+                                    maxsize=self.maxsize,
+                                    currsize=len(self._terms_by_string))
+
+
+formula_cache = FormulaCache()
+
+
+def compile_formula(string) -> typing.Tuple[FormulaTerm, ...]:
+    """
+    Terms of the formula, every formula text is parsed only once while it stays in formula_cache
+    """
+    return formula_cache.get(string)
+
+
+def formula_cache_info() -> FormulaCacheInfo:
+    return formula_cache.info()
+
+
+def set_formula_cache_size(maxsize: int) -> None:
+    formula_cache.resize(maxsize)
+
+
 if __name__ == '__main__':
     for tk_ in parse_formula_string('2d6 + 12'):
         print(getattr(tk_, 'type'), getattr(tk_, 'value'))
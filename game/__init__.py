@@ -1,9 +1,81 @@
 from dataclasses import dataclass, field, replace
+from bisect import bisect_left, bisect_right
+import itertools
 import typing
-from basic_types import Action, Value, Timer, timer_tick
-from uuid import UUID
+from basic_types import Action, Value, Timer, timer_ticks, timer_tick_unapplying_effects, \
+    timer_ticks_unapplying_effects, Formula, FormulaRoll, set_pickled_fields
+from dice_engine import DiceRng, new_seed
+import os
 import pickle
 from character import Character
+from persistent_collections import PersistentMap, PersistentVector, PersistentStack
+from action_log import ColumnarActionLog
+from search_index import SearchIndex
+from game_storage import write_game_file, read_game_file, is_game_file, MappedActionLog, GameJournal, \
+    GameJournalError, write_checkpoint_file, read_checkpoint_file, read_journal_action, FORMAT_VERSION, \
+    JOURNAL_ACTION, JOURNAL_CANCEL, JOURNAL_UNDO, JOURNAL_REDO
+
+
+def _index_actions(actions_index: PersistentMap,
+                   actions: typing.Iterable[Action],
+                   first_action_number: int) -> PersistentMap:
+    if not actions_index:
+        # Building the map at once is cheaper, e.g. for a loaded game
+        new_index = {}
+        for action_number, action in enumerate(actions, first_action_number):
+            new_index.setdefault(action.id, action_number)
+        return PersistentMap(new_index)
+    for action_number, action in enumerate(actions, first_action_number):
+        if action.id not in actions_index:
+            actions_index = actions_index.set(action.id, action_number)
+    return actions_index
+
+
+def _chain_actions(object_actions: typing.Optional[PersistentMap],
+                   actions: typing.Iterable[Action],
+                   first_action_number: int) -> typing.Optional[PersistentMap]:
+    if object_actions is None:
+        return None
+    chains = {}
+    for action_number, action in enumerate(actions, first_action_number):
+        chains.setdefault(action.actual_value.id, []).append(action_number)
+        if action.previous_value is not None and action.previous_value.id != action.actual_value.id:
+            chains.setdefault(action.previous_value.id, []).append(action_number)
+    return object_actions.update((object_id, object_actions.get(object_id, PersistentVector()).extend(numbers))
+                                 for object_id, numbers in chains.items())
+
+
+def _search_texts(value: Value) -> typing.Tuple[str, ...]:
+    # Fields full_text_search looks in, the value is rendered only once per object version
+    return str(value.name), str(value.short_description), str(value.full_description), str(value.value)
+
+
+def _with_unapplied_effects(objects_dict: PersistentMap,
+                            search_texts: PersistentMap,
+                            unapplying_action: typing.Optional[Action]) -> typing.Tuple[PersistentMap, PersistentMap]:
+    """
+    Objects and their search texts after the timer tick removed finished effects from them
+    """
+    if unapplying_action is None:
+        return objects_dict, search_texts
+    changed_values = unapplying_action.actual_value.value
+    return objects_dict.update(changed_values), search_texts.update(
+            (value_id, _search_texts(value)) for value_id, value in changed_values.items())
+
+
+@dataclass(frozen=True)
+class GameSnapshot:
+    """
+    State of the game after the first actions_count actions
+    """
+    actions_count: int
+    actions_list: PersistentVector
+    actions_index: PersistentMap
+    objects_dict: PersistentMap
+    timer: Timer
+    search_texts: PersistentMap
+    object_actions: typing.Optional[PersistentMap] = None
+    removed_numbers: typing.Tuple[int, ...] = ()
 
 
 @dataclass(frozen=True)
@@ -16,10 +88,56 @@ class Game:
     4. Full text search must be supported by name, short_description, full_description
     5. Timer is changed by time consuming actions
     """
-    actions_list: typing.Tuple[Action, ...] = field(default_factory=tuple)
-    objects_dict: typing.Dict[UUID, Value] = field(default_factory=dict)
+    # PersistentVector or ColumnarActionLog (more compact, actions are created on access),
+    # games loaded from binary files have MappedActionLog
+    actions_list: typing.Union[PersistentVector, ColumnarActionLog, MappedActionLog] = field(
+            default_factory=PersistentVector)
+    objects_dict: PersistentMap = field(default_factory=PersistentMap)
     timer: Timer = field(default_factory=Timer)
     name: str = 'Noname game'
+    # Every snapshot_interval actions the state is remembered, so cancel_action doesn't need to replay
+    # the whole game. 0 switches snapshots off (cancel always replays all actions)
+    snapshot_interval: int = field(default=1000, compare=False)
+    snapshots: PersistentVector = field(default_factory=PersistentVector, compare=False, repr=False)
+    # Action id -> number of the first action with that id, see action_position
+    actions_index: PersistentMap = field(default_factory=PersistentMap, compare=False, repr=False)
+    # Object id -> numbers of the actions which changed the object or took its state, so cancelling the object
+    # creation removes only them. Kept for PersistentVector actions_list only, None otherwise
+    object_actions: typing.Optional[PersistentMap] = field(default=None, compare=False, repr=False)
+    # Sorted numbers of the actions removed from actions_list without replay, the numbers of the other
+    # actions don't change
+    removed_numbers: typing.Tuple[int, ...] = field(default=(), compare=False, repr=False)
+    # Dice of the game are thrown by DiceRng(seed=dice_seed, position=dice_position), so rolls of a session
+    # are repeated when it is played again with the same seed
+    dice_seed: typing.Optional[int] = field(default=None, compare=False)
+    dice_position: int = field(default=0, compare=False)
+    # Object id -> texts of the object for full_text_search, the index is shared between game versions
+    search_texts: PersistentMap = field(default_factory=PersistentMap, compare=False, repr=False)
+    search_index: SearchIndex = field(default_factory=SearchIndex, compare=False, repr=False)
+    # Changes of the game are appended there, see open_journal
+    journal: typing.Optional[GameJournal] = field(default=None, compare=False, repr=False)
+    # (journal generation, game version without these stacks) of the versions before the last changes
+    # and of the undone ones. They aren't saved, a loaded game starts a new history
+    undo_versions: PersistentStack = field(default_factory=PersistentStack, compare=False, repr=False)
+    redo_versions: PersistentStack = field(default_factory=PersistentStack, compare=False, repr=False)
+    # At least undo_limit last versions can be restored, older ones are dropped when there are twice as many
+    undo_limit: int = field(default=100, compare=False)
+
+    def __post_init__(self):
+        if self.dice_seed is None:
+            object.__setattr__(self, 'dice_seed', new_seed())
+        # Both containers are shared between game versions, so they must be persistent
+        if not isinstance(self.actions_list, (PersistentVector, ColumnarActionLog, MappedActionLog)):
+            object.__setattr__(self, 'actions_list', PersistentVector(self.actions_list))
+        if not isinstance(self.objects_dict, PersistentMap):
+            object.__setattr__(self, 'objects_dict', PersistentMap(self.objects_dict))
+        if self.actions_list and not self.actions_index:
+            object.__setattr__(self, 'actions_index', _index_actions(PersistentMap(), self.actions_list, 0))
+        if self.object_actions is None and isinstance(self.actions_list, PersistentVector):
+            object.__setattr__(self, 'object_actions', _chain_actions(PersistentMap(), self.actions_list, 0))
+        if self.objects_dict and not self.search_texts:
+            object.__setattr__(self, 'search_texts', PersistentMap(
+                    (object_id, _search_texts(game_object)) for object_id, game_object in self.objects_dict.items()))
 
     @property
     def last_action(self) -> typing.Optional[Action]:
@@ -27,7 +145,46 @@ class Game:
             return None
         return self.actions_list[-1]
 
+    def action_position(self, *, action_id: int) -> typing.Optional[int]:
+        """
+        Position of the action in actions_list, None if the game has no such action
+        """
+        action_number = self.actions_index.get(action_id)
+        if action_number is None:
+            return None
+        return action_number - bisect_left(self.removed_numbers, action_number)
+
+    def _next_action_number(self) -> int:
+        return len(self.actions_list) + len(self.removed_numbers)
+
+    def dice_rng(self) -> DiceRng:
+        return DiceRng(seed=self.dice_seed, position=self.dice_position)
+
+    def roll(self, *, formula: Formula) -> typing.Tuple['Game', FormulaRoll]:
+        """
+        Rolls the formula with the game dice, the game remembers only how many throws were made
+        """
+        self._check_journal_head()
+        rng = self.dice_rng()
+        formula_roll = formula.roll(rng=rng)
+        if self.journal is not None:
+            self.journal.append_dice(dice_seed=self.dice_seed, dice_position=rng.position)
+        return self._journal_head(replace(self, dice_position=rng.position)), formula_roll
+
+    def _check_journal_head(self) -> None:
+        if self.journal is not None and self.journal.head is not self:
+            raise GameJournalError('Only the last version of a game with journal can be changed')
+
+    def _journal_head(self, new_game: 'Game') -> 'Game':
+        """
+        Makes new_game the version the journal continues
+        """
+        if self.journal is not None:
+            self.journal.head = new_game
+        return new_game
+
     def make_action(self, *, action: Action) -> 'Game':
+        self._check_journal_head()
         new_game_state = self
         # Object did't exist before that action
 
@@ -36,42 +193,357 @@ class Game:
         if action.actual_value.id not in self.objects_dict and action.previous_value is not None:
             return self  # Do nothing
 
+        objects_dict = self.objects_dict.set(action.actual_value.id, action.actual_value)
+        ticking_action, unapplying_action = timer_tick_unapplying_effects(
+                timer=self.timer,
+                seconds=action.duration_in_seconds,
+                values=objects_dict)
+        objects_dict, search_texts = _with_unapplied_effects(
+                objects_dict,
+                self.search_texts.set(action.actual_value.id, _search_texts(action.actual_value)),
+                unapplying_action)
         new_game_state = replace(new_game_state,
-                                 objects_dict={**new_game_state.objects_dict,
-                                               **{action.actual_value.id: action.actual_value}},
-                                 actions_list=new_game_state.actions_list + (action,),
-                                 timer=timer_tick(
-                                         timer=self.timer,
-                                         seconds=action.duration_in_seconds,
-                                 ).actual_value.value,
-                                 )
+                                 objects_dict=objects_dict,
+                                 actions_list=new_game_state.actions_list.append(action),
+                                 actions_index=_index_actions(
+                                         new_game_state.actions_index, (action,), self._next_action_number()),
+                                 object_actions=_chain_actions(
+                                         self.object_actions, (action,), self._next_action_number()),
+                                 timer=ticking_action.actual_value.value,
+                                 search_texts=search_texts,
+                                 **self._undo_fields())
+        new_game_state = new_game_state._with_snapshot_if_due()
+        if self.journal is not None:
+            self.journal.append_action(action, objects=self.objects_dict)
+            self.journal.head = new_game_state
 
         return new_game_state
 
-    def cancel_action(self, *, action_id: UUID) -> 'Game':
-        list_actions_to_cancel = [a for a in self.actions_list if a.id == action_id]
-        if not list_actions_to_cancel:
+    def _with_snapshot_if_due(self) -> 'Game':
+        if not self.snapshot_interval or len(self.actions_list) % self.snapshot_interval:
             return self
+        return replace(self, snapshots=self.snapshots.append(GameSnapshot(
+                actions_count=len(self.actions_list),
+                actions_list=self.actions_list,
+                actions_index=self.actions_index,
+                objects_dict=self.objects_dict,
+                timer=self.timer,
+                search_texts=self.search_texts,
+                object_actions=self.object_actions,
+                removed_numbers=self.removed_numbers)))
+
+    def make_actions(self, *, actions: typing.Iterable[Action]) -> 'Game':
+        """
+        Gives the same game as make_action called for every action, but the game state, the timer and
+        the search index are updated once per batch (and at every snapshot the batch passes)
+        """
+        self._check_journal_head()
+        game = self
+        applied_actions = []
+        # Object id -> its last version in applied_actions
+        changed_objects = {}
+        # The batch ends at the action which finishes an effect, so the effect is removed from the values
+        # of that moment. Seconds are added in the same order as in the timer to get the same total
+        ticks_total, next_expiry_time = game.timer.ticks.total, game._next_expiry_time()
+        for action in actions:
+            object_id = action.actual_value.id
+            if action.previous_value is not None and object_id not in changed_objects \
+                    and object_id not in game.objects_dict:
+                continue  # see make_action
+            applied_actions.append(action)
+            changed_objects[object_id] = action.actual_value
+            ticks_total += action.duration_in_seconds
+            if self.snapshot_interval and \
+                    (len(game.actions_list) + len(applied_actions)) % self.snapshot_interval == 0 or \
+                    game.timer.compacted_seconds + ticks_total >= next_expiry_time:
+                game = game._with_applied_actions(applied_actions, changed_objects)
+                applied_actions, changed_objects = [], {}
+                ticks_total, next_expiry_time = game.timer.ticks.total, game._next_expiry_time()
+        if applied_actions:
+            game = game._with_applied_actions(applied_actions, changed_objects)
+        return self._journal_head(self._with_undo_version(game))
 
-        action_to_cancel = list_actions_to_cancel[0]
-        number_action_to_cancel = self.actions_list.index(action_to_cancel)
+    def _next_expiry_time(self) -> float:
+        if not self.timer.expiry_queue:
+            return float('inf')
+        return self.timer.expiry_queue.peek()[0]
+
+    def _with_applied_actions(self,
+                              applied_actions: typing.List[Action],
+                              changed_objects: typing.Dict[typing.Any, Value]) -> 'Game':
+        objects_dict = self.objects_dict.update(changed_objects)
+        ticking_action, unapplying_action = timer_ticks_unapplying_effects(
+                timer=self.timer,
+                seconds=[a.duration_in_seconds for a in applied_actions],
+                values=objects_dict)
+        objects_dict, search_texts = _with_unapplied_effects(
+                objects_dict,
+                self.search_texts.update((object_id, _search_texts(changed_object))
+                                         for object_id, changed_object in changed_objects.items()),
+                unapplying_action)
+        new_game_state = replace(self,
+                                 objects_dict=objects_dict,
+                                 actions_list=self.actions_list.extend(applied_actions),
+                                 actions_index=_index_actions(
+                                         self.actions_index, applied_actions, self._next_action_number()),
+                                 object_actions=_chain_actions(
+                                         self.object_actions, applied_actions, self._next_action_number()),
+                                 timer=ticking_action.actual_value.value,
+                                 search_texts=search_texts)
+        new_game_state = new_game_state._with_snapshot_if_due()
+        if self.journal is not None:
+            objects = self.objects_dict
+            for action in applied_actions:
+                self.journal.append_action(action, objects=objects)
+                objects = objects.set(action.actual_value.id, action.actual_value)
+        return new_game_state
+
+    def cancel_action(self, *, action_id: int) -> 'Game':
+        self._check_journal_head()
+        number_action_to_cancel = self.action_position(action_id=action_id)
+        if number_action_to_cancel is None:
+            return self
+        if self.journal is not None:
+            self.journal.append_cancel(action_id)
+            cancelled_game = replace(self, journal=None)._cancel_action(action_number=number_action_to_cancel)
+            return self._journal_head(self._with_undo_version(replace(cancelled_game, journal=self.journal)))
+        return self._with_undo_version(self._cancel_action(action_number=number_action_to_cancel))
+
+    def _cancel_action(self, *, action_number: int) -> 'Game':
+        if not self.snapshot_interval:
+            return self._replay_without_action(
+                    initial_game=Game(name=self.name,
+                                      snapshot_interval=self.snapshot_interval,
+                                      actions_list=type(self.actions_list)(),
+                                      dice_seed=self.dice_seed,
+                                      dice_position=self.dice_position,
+                                      search_index=self.search_index),
+                    action_number=action_number)
+        game_without_object = self._cancel_creation_without_replay(action_number=action_number)
+        if game_without_object is not None:
+            return game_without_object
+        return self._with_snapshots()._cancel_action_from_snapshot(action_number=action_number)
+
+    def _cancel_creation_without_replay(self, *, action_number: int) -> typing.Optional['Game']:
+        """
+        If the action creates an object, removes the actions of the object and gives the same result
+        as _replay_without_action, other objects are not replayed. None if that can't be done
+        """
+        action_to_cancel = self.actions_list[action_number]
+        if action_to_cancel.previous_value is not None or self.object_actions is None:
+            return None
+        if self.timer.compacted_seconds or len(self.timer.ticks) != len(self.actions_list):
+            return None  # ticks don't line up with the actions, e.g. after compact_ticks
+        object_id = action_to_cancel.actual_value.id
+        numbers = list(self.object_actions[object_id])
+        positions = [n - bisect_left(self.removed_numbers, n) for n in numbers]
+        if positions[0] != action_number:
+            return None  # object existed before the action
+        removed_actions = [self.actions_list[p] for p in positions]
+        if any(a.previous_value is None for a in removed_actions[1:]):
+            return None  # object is created again later, so its position in objects_dict changes
+        if self.timer.effects and any(a.duration_in_seconds for a in removed_actions):
+            return None  # effects would finish at other actions
+
+        objects_dict = self.objects_dict.delete(object_id)
+        search_texts = self.search_texts.delete(object_id)
+        object_actions = self.object_actions.delete(object_id)
+        actions_index = self.actions_index
+        for action in removed_actions:
+            if action.id in actions_index:
+                actions_index = actions_index.delete(action.id)
+
+        # State of the object moved to other objects, they get their versions before that
+        other_ids = {a.actual_value.id for a in removed_actions} | \
+                    {a.previous_value.id for a in removed_actions[1:]}
+        other_ids.discard(object_id)
+        removed = set(numbers)
+        for other_id in other_ids:
+            other_numbers = [n for n in self.object_actions[other_id] if n not in removed]
+            object_actions = object_actions.set(other_id, PersistentVector(other_numbers))
+            if not any(a.actual_value.id == other_id for a in removed_actions):
+                continue
+            for other_number in reversed(other_numbers):
+                other_action = self.actions_list[other_number - bisect_left(self.removed_numbers, other_number)]
+                if other_action.actual_value.id == other_id:
+                    other_object = other_action.actual_value
+                    break
+            else:
+                return None  # object was not created by an action
+            objects_dict = objects_dict.set(other_id, other_object)
+            search_texts = search_texts.set(other_id, _search_texts(other_object))
 
+        snapshots_number = bisect_right(self.snapshots, action_number, key=lambda s: s.actions_count)
+        return replace(self,
+                       actions_list=self.actions_list.without(positions),
+                       actions_index=actions_index,
+                       object_actions=object_actions,
+                       removed_numbers=tuple(sorted(self.removed_numbers + tuple(numbers))),
+                       objects_dict=objects_dict,
+                       search_texts=search_texts,
+                       timer=replace(self.timer, ticks=self.timer.ticks.without(positions)),
+                       snapshots=PersistentVector(self.snapshots[:snapshots_number]))
+
+    def _version_item(self) -> tuple:
+        generation = self.journal.generation if self.journal is not None else None
+        version = object.__new__(Game)
+        version.__dict__.update(self.__dict__, undo_versions=PersistentStack(), redo_versions=PersistentStack())
+        return generation, version
+
+    def _undo_fields(self) -> dict:
+        undo_versions = self.undo_versions.push(self._version_item())
+        if len(undo_versions) >= 2 * self.undo_limit:
+            undo_versions = undo_versions.limited(self.undo_limit)
+        return {'undo_versions': undo_versions, 'redo_versions': PersistentStack(), 'undo_limit': self.undo_limit}
+
+    def _with_undo_version(self, new_game: 'Game') -> 'Game':
+        if new_game is self:
+            return self
+        return replace(new_game, **self._undo_fields())
+
+    def _can_restore(self, versions: PersistentStack) -> bool:
+        if not versions:
+            return False
+        generation, _ = versions.peek()
+        # After checkpoint the journal can't bring back older versions
+        return generation is None or self.journal is None or generation == self.journal.generation
+
+    def undo(self) -> 'Game':
+        """
+        Gives the game before the last make_action, make_actions or cancel_action. O(1), dice are not rolled back
+        """
+        self._check_journal_head()
+        if not self._can_restore(self.undo_versions):
+            return self
+        if self.journal is not None:
+            self.journal.append_undo()
+        _, version = self.undo_versions.peek()
+        return self._journal_head(replace(version,
+                       undo_versions=self.undo_versions.pop(),
+                       redo_versions=self.redo_versions.push(self._version_item()),
+                       dice_position=self.dice_position,
+                       journal=self.journal))
+
+    def redo(self) -> 'Game':
+        """
+        Gives back the game version undone by the last undo. New changes of the game drop undone versions
+        """
+        self._check_journal_head()
+        if not self._can_restore(self.redo_versions):
+            return self
+        if self.journal is not None:
+            self.journal.append_redo()
+        _, version = self.redo_versions.peek()
+        return self._journal_head(replace(version,
+                       undo_versions=self.undo_versions.push(self._version_item()),
+                       redo_versions=self.redo_versions.pop(),
+                       dice_position=self.dice_position,
+                       journal=self.journal))
+
+    def _replay_without_action(self, *, initial_game: 'Game', action_number: int) -> 'Game':
+        """
+        Repeats all actions on top of initial_game except the action with action_number
+        """
+        action_to_cancel = self.actions_list[action_number]
         # if the action was new object creation, we then must ignore all actions made with this object
         if action_to_cancel.previous_value is None:
             ignoring_object_id = action_to_cancel.actual_value.id
         else:
             ignoring_object_id = None
 
-        game_with_action_cancelled = Game()
-        for action in self.actions_list[:number_action_to_cancel]:
-            game_with_action_cancelled = game_with_action_cancelled.make_action(action=action)
+        actions_after = (a for a in self.actions_list[action_number + 1:]
+                         if not (ignoring_object_id and a.previous_value and a.previous_value.id == ignoring_object_id))
+        return initial_game.make_actions(actions=itertools.chain(
+                self.actions_list[len(initial_game.actions_list):action_number], actions_after))
+
+    def _cancel_action_from_snapshot(self, *, action_number: int) -> 'Game':
+        """
+        Gives the same result as _replay_without_action from the empty game, but starts from the nearest snapshot.
+        Actions after the cancelled one are repeated only if they change the same object,
+        all other objects already have their final values in objects_dict
+        """
+        action_to_cancel = self.actions_list[action_number]
+        snapshots_number = bisect_right(self.snapshots, action_number, key=lambda s: s.actions_count)
+        if snapshots_number:
+            snapshot = self.snapshots[snapshots_number - 1]
+        else:
+            snapshot = GameSnapshot(actions_count=0,
+                                    actions_list=type(self.actions_list)(),
+                                    actions_index=PersistentMap(),
+                                    objects_dict=PersistentMap(),
+                                    timer=Timer(),
+                                    search_texts=PersistentMap(),
+                                    object_actions=None if self.object_actions is None else PersistentMap())
+        initial_game = Game(name=self.name,
+                            snapshot_interval=self.snapshot_interval,
+                            snapshots=PersistentVector(self.snapshots[:snapshots_number]),
+                            actions_list=snapshot.actions_list,
+                            actions_index=snapshot.actions_index,
+                            object_actions=snapshot.object_actions,
+                            removed_numbers=snapshot.removed_numbers,
+                            objects_dict=snapshot.objects_dict,
+                            timer=snapshot.timer,
+                            dice_seed=self.dice_seed,
+                            dice_position=self.dice_position,
+                            search_texts=snapshot.search_texts,
+                            search_index=self.search_index)
+
+        if self.timer.effects:
+            # Effects finish at other actions and change objects which are not replayed
+            return self._replay_without_action(initial_game=initial_game, action_number=action_number)
+        changed_object_id = action_to_cancel.actual_value.id
+        ignoring_object_id = changed_object_id if action_to_cancel.previous_value is None else None
+        actions_before = self.actions_list[snapshot.actions_count:action_number]
 
-        for action in self.actions_list[number_action_to_cancel + 1:]:
-            if ignoring_object_id and action.previous_value and action.previous_value.id == ignoring_object_id:
+        # State of the changed object right before the cancelled action (None if it didn't exist)
+        changed_object = snapshot.objects_dict.get(changed_object_id)
+        for action in actions_before:
+            if action.actual_value.id == changed_object_id:
+                changed_object = action.actual_value
+        existed_before = changed_object is not None
+
+        actions_after = []
+        for action in self.actions_list[action_number + 1:]:
+            actual_id = action.actual_value.id
+            previous_id = action.previous_value.id if action.previous_value is not None else None
+            if changed_object_id != actual_id and changed_object_id != previous_id:
+                actions_after.append(action)
+                continue
+            if previous_id is not None and previous_id != actual_id:
+                # Action moves state between objects, so more than one object is affected
+                return self._replay_without_action(initial_game=initial_game, action_number=action_number)
+            if ignoring_object_id and previous_id == ignoring_object_id:
                 continue
-            game_with_action_cancelled = game_with_action_cancelled.make_action(action=action)
+            if previous_id is not None and changed_object is None:
+                continue  # object doesn't exist any more, see make_action
+            if changed_object is None and not existed_before:
+                # Object is created again later, so its position in objects_dict changes
+                return self._replay_without_action(initial_game=initial_game, action_number=action_number)
+            changed_object = action.actual_value
+            actions_after.append(action)
+
+        if changed_object is None:
+            objects_dict = self.objects_dict.delete(changed_object_id)
+            search_texts = self.search_texts.delete(changed_object_id)
+        else:
+            objects_dict = self.objects_dict.set(changed_object_id, changed_object)
+            search_texts = self.search_texts.set(changed_object_id, _search_texts(changed_object))
 
-        return game_with_action_cancelled
+        replayed_actions = list(itertools.chain(actions_before, actions_after))
+        actions_list = snapshot.actions_list.extend(replayed_actions)
+        timer = timer_ticks(timer=snapshot.timer,
+                            seconds=[a.duration_in_seconds for a in replayed_actions]).actual_value.value
+        first_action_number = snapshot.actions_count + len(snapshot.removed_numbers)
+        actions_index = _index_actions(snapshot.actions_index, replayed_actions, first_action_number)
+        object_actions = _chain_actions(snapshot.object_actions, replayed_actions, first_action_number)
+
+        return replace(initial_game,
+                       actions_list=actions_list,
+                       actions_index=actions_index,
+                       object_actions=object_actions,
+                       objects_dict=objects_dict,
+                       search_texts=search_texts,
+                       timer=timer)
 
     def cancel_action_by_number(self, action_number: int) -> 'Game':
         if action_number > len(self.actions_list):
@@ -81,24 +553,104 @@ class Game:
     def cancel_last_action(self) -> 'Game':
         return self.cancel_action_by_number(action_number=-1)
 
-    def full_text_search(self, *, text_to_search) -> typing.Dict[UUID, Value]:
-        return {k: v for k, v in self.objects_dict.items() if
-                text_to_search in v.name or
-                text_to_search in v.short_description or
-                text_to_search in v.full_description or
-                text_to_search in str(v.value)}
+    def full_text_search(self, *, text_to_search) -> typing.Dict[int, Value]:
+        """
+        Objects with text_to_search in name, short_description, full_description or value
+        """
+        found_ids = self.search_index.find(text_to_search, search_texts=self.search_texts)
+        return dict(self.objects_dict.items_of(found_ids))
+
+    def __getstate__(self) -> dict:
+        # Snapshots and indexes are made from the actions and objects again, so files grow only with the actions
+        return {**self.__dict__,
+                'snapshots': PersistentVector(),
+                'actions_index': PersistentMap(),
+                'object_actions': None,
+                'removed_numbers': (),
+                'search_texts': PersistentMap(),
+                'undo_versions': PersistentStack(),
+                'redo_versions': PersistentStack()}
+
+    def __setstate__(self, state: dict) -> None:
+        # Games saved by older versions have plain containers and lack newer fields
+        set_pickled_fields(self, state)
+        self.__post_init__()
+
+    def _with_snapshots(self) -> 'Game':
+        """
+        The game with snapshots made by replaying its actions, loaded games have none (see __getstate__)
+        """
+        if not self.snapshot_interval or self.snapshots or len(self.actions_list) < self.snapshot_interval:
+            return self
+        replayed_game = Game(name=self.name,
+                             snapshot_interval=self.snapshot_interval,
+                             actions_list=type(self.actions_list)(),
+                             dice_seed=self.dice_seed,
+                             dice_position=self.dice_position,
+                             search_index=self.search_index).make_actions(actions=self.actions_list)
+        return replace(self, snapshots=replayed_game.snapshots)
 
-    def save_to_disk(self, *, filename) -> str:
+    def save_to_disk(self, *, filename, file_format: str = 'pickle') -> str:
+        """
+        file_format is 'pickle' or 'binary' (see game_storage). Binary files are smaller and are loaded without
+        decoding the actions, but they lose histories (actions_sequence) of values and functions that can't be
+        imported by name, such as lambdas. Games with such functions can't be pickled
+        """
         try:
-            with open(filename, 'wb') as output_file:
-                pickle.dump(self, output_file)
-                return 'OK'
+            if file_format == 'pickle':
+                with open(filename, 'wb') as output_file:
+                    pickle.dump(self, output_file)
+                    return 'OK'
+            self._write_game_file(filename)
+            return 'OK'
         except Exception as e:
             return str(e)
 
+    def _write_game_file(self, filename, **extra_state) -> None:
+        write_game_file(filename,
+                        state={'name': self.name,
+                               'timer': self.timer,
+                               'snapshot_interval': self.snapshot_interval,
+                               'dice_seed': self.dice_seed,
+                               'dice_position': self.dice_position,
+                               **extra_state},
+                        objects=self.objects_dict.values(),
+                        actions=self.actions_list)
+
+    @staticmethod
+    def _read_game_file(filename) -> typing.Tuple['Game', dict]:
+        state, objects, actions_list, action_ids = read_game_file(filename)
+        actions_index = {}
+        for action_number, action_id in enumerate(action_ids):
+            actions_index.setdefault(action_id, action_number)
+        game = Game(actions_list=actions_list,
+                    actions_index=PersistentMap(actions_index),
+                    objects_dict=PersistentMap((value.id, value) for value in objects),
+                    name=state['name'],
+                    timer=state['timer'],
+                    snapshot_interval=state['snapshot_interval'],
+                    dice_seed=state['dice_seed'],
+                    dice_position=state['dice_position'])
+        return game, state
+
+    def close(self) -> None:
+        """
+        Closes the journal and the file of a game loaded from a binary file.
+        Versions made from the game can't read the actions of the file after that
+        """
+        if isinstance(self.actions_list, MappedActionLog):
+            self.actions_list.close()
+        if self.journal is not None:
+            self.journal.close()
+
     @staticmethod
     def load_from_disk(*, filename) -> 'Game':
+        """
+        Loads both binary and pickle files. Actions of binary files are read from the file when they are needed
+        """
         try:
+            if is_game_file(filename):
+                return Game._read_game_file(filename)[0]
             with open(filename, 'rb') as input_file:
                 loaded_game = pickle.load(input_file)
                 return loaded_game
@@ -107,6 +659,61 @@ class Game:
             print(e)
             return Game()
 
+    @staticmethod
+    def open_journal(*, filename, sync_every: int = 64, sync_interval: float = 1.0) -> 'Game':
+        """
+        Recovers the game from the last checkpoint and the journal records after it.
+        The returned game and the games made from it append their changes to the journal
+        """
+        journal = GameJournal(filename, sync_every=sync_every, sync_interval=sync_interval)
+        game, checkpoint_generation = Game(), 0
+        if os.path.exists(journal.checkpoint_filename):
+            if is_game_file(journal.checkpoint_filename):
+                game, state = Game._read_game_file(journal.checkpoint_filename)  # checkpoint before version 4
+            else:
+                state = read_checkpoint_file(journal.checkpoint_filename)
+                game = state['game']
+            checkpoint_generation = state['journal_generation']
+        records, journal.recovered_records = journal.recovered_records, []
+        if journal.generation < checkpoint_generation:
+            # Crash after the checkpoint was written, all records of the journal are in the checkpoint
+            journal.start_generation(checkpoint_generation)
+            records = []
+        for kind, item in records:
+            if kind == JOURNAL_ACTION:
+                game = game.make_action(action=read_journal_action(item, objects=game.objects_dict))
+            elif kind == JOURNAL_CANCEL:
+                game = game.cancel_action(action_id=item)
+            elif kind == JOURNAL_UNDO:
+                game = game.undo()
+            elif kind == JOURNAL_REDO:
+                game = game.redo()
+            else:
+                game = replace(game, dice_seed=item[0], dice_position=item[1])
+        game = replace(game, journal=journal)
+        journal.head = game
+        if journal.version < FORMAT_VERSION:
+            # Records of older versions can't be followed by new ones
+            journal.write_checkpoint(game._write_checkpoint_file)
+        # New games get a random seed, it must be known when the journal is replayed
+        journal.append_dice(dice_seed=game.dice_seed, dice_position=game.dice_position)
+        return game
+
+    def checkpoint(self) -> str:
+        """
+        Saves the game next to the journal and empties the journal, so recovery replays only later changes
+        """
+        if self.journal is None:
+            return 'Game has no journal'
+        try:
+            self.journal.write_checkpoint(self._write_checkpoint_file)
+            return 'OK'
+        except Exception as e:
+            return str(e)
+
+    def _write_checkpoint_file(self, filename, generation: int) -> None:
+        write_checkpoint_file(filename, game=self, generation=generation)
+
     def add_character(self, character_name) -> 'Game':
         adding_action = Action(
                 name=f'Adding character "{character_name}"',
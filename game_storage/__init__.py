@@ -0,0 +1,726 @@
+"""
+Binary save format of Game.
+
+File layout (all numbers are little endian):
+    header: magic, format version and offsets of the sections
+    strings: table of descriptions, they repeat a lot, records keep only their numbers
+    state: pickled small state of the game (name, timer, dice seed...)
+    objects: current objects_dict, one length-prefixed record per Value
+    actions: action log, one length-prefixed record per Action
+    actions table: offsets of action records, action ids (16 bytes) and kinds of ids,
+                   so the log can be indexed without decoding it
+
+GameJournal is an append-only file of game changes, it is replayed on top of the last checkpoint after a crash.
+Its actions are pickled with references to the versions of values in the game they change, so a record keeps
+the histories of values without repeating them. Checkpoints are games pickled the same way.
+
+Records are sequences of tagged fields. Values are saved without their actions_sequence, the history of
+objects is the action log. Functions are saved by module and name, functions that can't be imported
+by name (lambdas, closures) are saved as None. Anything else that has no tag is pickled
+"""
+import datetime
+import importlib
+import io
+import mmap
+import pickle
+import os
+import struct
+import time
+import types
+import typing
+import zlib
+from array import array
+from collections.abc import Sequence
+from dataclasses import replace
+from uuid import UUID
+from basic_types import Action, Value, LazyText, RestoredValue
+from persistent_collections import PersistentVector
+
+MAGIC = b'CTGAME\x00\x00'
+# 2: int ids, kinds of ids in the actions table, names of values are in the strings table
+# 3: undo and redo records in the journal
+# 4: rollbacks restoring the previous value, pickled journal actions and checkpoints
+# 5: actions which don't change the value
+FORMAT_VERSION = 5
+# magic, version, offsets of strings, state, objects, actions and actions table, number of actions
+_HEADER = struct.Struct('<8sH6xQQQQQQ')
+_LENGTH = struct.Struct('<I')
+_DOUBLE = struct.Struct('<d')
+_EPOCH = datetime.datetime(1970, 1, 1)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+_ID_SIZE = 16
+
+(_NONE, _TRUE, _FALSE, _INT, _FLOAT, _TEXT, _SHARED_TEXT, _UUID, _DATETIME, _VALUE, _FUNCTION, _PICKLE,
+ _ID, _RESTORES_PREVIOUS, _KEEPS_VALUE) = range(15)
+# Kinds of ids in the actions table, ids of other types are only in the records
+_NO_ID, _UUID_ID, _INT_ID = range(3)
+_ID_LIMIT = 1 << (8 * _ID_SIZE)
+_SHARED_FIELDS = ('short_description', 'full_description', 'visibility_level')
+
+
+class GameFileError(Exception):
+    pass
+
+
+class GameJournalError(Exception):
+    pass
+
+
+def _write_varint(buffer: bytearray, number: int) -> None:
+    while number > 0x7f:
+        buffer.append(number & 0x7f | 0x80)
+        number >>= 7
+    buffer.append(number)
+
+
+def _function_name(function: typing.Callable) -> typing.Optional[str]:
+    module_name = getattr(function, '__module__', None)
+    qualified_name = getattr(function, '__qualname__', '')
+    if not module_name or '<' in qualified_name:
+        return None
+    try:
+        found = importlib.import_module(module_name)
+        for name in qualified_name.split('.'):
+            found = getattr(found, name)
+    except (ImportError, AttributeError):
+        return None
+    return f'{module_name}:{qualified_name}' if found is function else None
+
+
+class _Writer:
+    def __init__(self, *, shared_strings: bool = True):
+        # Journal records can't refer to a string table, they must be read one by one
+        self.shared_strings = shared_strings
+        self.strings = []
+        self.string_numbers = {}
+
+    def shared_text(self, buffer: bytearray, text) -> None:
+        if type(text) is LazyText:
+            text = str(text)
+        if type(text) is not str or not self.shared_strings:
+            self.field(buffer, text)
+            return
+        number = self.string_numbers.get(text)
+        if number is None:
+            number = self.string_numbers[text] = len(self.strings)
+            self.strings.append(text)
+        buffer.append(_SHARED_TEXT)
+        _write_varint(buffer, number)
+
+    def field(self, buffer: bytearray, item) -> None:
+        item_type = type(item)
+        if item_type is LazyText:
+            item, item_type = str(item), str
+        if item is None:
+            buffer.append(_NONE)
+        elif item_type is bool:
+            buffer.append(_TRUE if item else _FALSE)
+        elif item_type is int and item.bit_length() > 64 and 0 < item < _ID_LIMIT:
+            buffer.append(_ID)  # ids are random 128 bit numbers, they are shorter without varint
+            buffer += item.to_bytes(_ID_SIZE, 'big')
+        elif item_type is int:
+            buffer.append(_INT)
+            _write_varint(buffer, item << 1 if item >= 0 else (-item << 1) - 1)  # zigzag
+        elif item_type is float:
+            buffer.append(_FLOAT)
+            buffer += _DOUBLE.pack(item)
+        elif item_type is str:
+            encoded = item.encode()
+            buffer.append(_TEXT)
+            _write_varint(buffer, len(encoded))
+            buffer += encoded
+        elif item_type is UUID:
+            buffer.append(_UUID)
+            buffer += item.bytes
+        elif item_type is datetime.datetime and item.tzinfo is None:
+            buffer.append(_DATETIME)
+            buffer += struct.pack('<q', (item - _EPOCH) // _MICROSECOND)
+        elif item_type is Value:
+            buffer.append(_VALUE)
+            self.value(buffer, item)
+        elif isinstance(item, (types.FunctionType, types.BuiltinFunctionType)):
+            # Functions that can't be found by name are not saved
+            function_name = _function_name(item)
+            if function_name is None:
+                buffer.append(_NONE)
+            else:
+                buffer.append(_FUNCTION)
+                self.field(buffer, function_name)
+        else:
+            pickled = pickle.dumps(item, protocol=pickle.HIGHEST_PROTOCOL)
+            buffer.append(_PICKLE)
+            _write_varint(buffer, len(pickled))
+            buffer += pickled
+
+    def value(self, buffer: bytearray, value: Value) -> None:
+        self.field(buffer, value.id)
+        self.shared_text(buffer, value.name)  # the name is the same in all versions of the value
+        self.field(buffer, value.value)
+        self.shared_text(buffer, value.short_description)
+        self.shared_text(buffer, value.full_description)
+        links = (value.subscribers, value.children, value.parent)
+        self.field(buffer, None if links == ((), (), None) else links)
+
+    def action(self, buffer: bytearray, action: Action) -> None:
+        self.field(buffer, action.id)
+        self.field(buffer, action.time)
+        self.field(buffer, action.duration_in_seconds)
+        self.field(buffer, action.name)
+        self.field(buffer, action.previous_value)
+        self.field(buffer, action.actual_value)
+        if not action.changes_value:
+            buffer.append(_KEEPS_VALUE)  # only such actions have the tag before the function
+        self.field(buffer, action.function)
+        rollback_function = action.rollback_function
+        if type(rollback_function) is RestoredValue and rollback_function.previous_value is action.previous_value:
+            buffer.append(_RESTORES_PREVIOUS)  # the previous value is already in the record
+        else:
+            self.field(buffer, rollback_function)
+        for field_name in _SHARED_FIELDS:
+            self.shared_text(buffer, getattr(action, field_name))
+
+
+class _Reader:
+    __slots__ = ('data', 'position', 'strings')
+
+    def __init__(self, data, position: int, strings: typing.List[str]):
+        self.data = data
+        self.position = position
+        self.strings = strings
+
+    def varint(self) -> int:
+        data = self.data
+        number = shift = 0
+        while True:
+            byte = data[self.position]
+            self.position += 1
+            number |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return number
+            shift += 7
+
+    def take(self, size: int) -> bytes:
+        start = self.position
+        self.position += size
+        return bytes(self.data[start:self.position])
+
+    def field(self):
+        tag = self.data[self.position]
+        self.position += 1
+        if tag == _NONE:
+            return None
+        if tag == _TRUE:
+            return True
+        if tag == _FALSE:
+            return False
+        if tag == _INT:
+            number = self.varint()
+            return number >> 1 if not number & 1 else -((number + 1) >> 1)
+        if tag == _FLOAT:
+            return _DOUBLE.unpack(self.take(_DOUBLE.size))[0]
+        if tag == _TEXT:
+            return self.take(self.varint()).decode()
+        if tag == _SHARED_TEXT:
+            return self.strings[self.varint()]
+        if tag == _UUID:
+            return UUID(bytes=self.take(_ID_SIZE))
+        if tag == _ID:
+            return int.from_bytes(self.take(_ID_SIZE), 'big')
+        if tag == _DATETIME:
+            return _EPOCH + datetime.timedelta(microseconds=struct.unpack('<q', self.take(8))[0])
+        if tag == _VALUE:
+            return self.value()
+        if tag == _FUNCTION:
+            module_name, qualified_name = self.field().split(':')
+            found = importlib.import_module(module_name)
+            for name in qualified_name.split('.'):
+                found = getattr(found, name)
+            return found
+        if tag == _PICKLE:
+            return pickle.loads(self.take(self.varint()))
+        raise GameFileError(f'Unknown field tag {tag} at {self.position - 1}')
+
+    def value(self) -> Value:
+        value_id, name, value, short_description, full_description, links = (self.field() for _ in range(6))
+        subscribers, children, parent = links or ((), (), None)
+        return Value(id=value_id, name=name, value=value, short_description=short_description,
+                     full_description=full_description, subscribers=subscribers, children=children, parent=parent)
+
+    def action(self) -> Action:
+        fields = [self.field() for _ in range(6)]
+        changes_value = self.data[self.position] != _KEEPS_VALUE
+        if not changes_value:
+            self.position += 1
+        fields.append(self.field())
+        if self.data[self.position] == _RESTORES_PREVIOUS:
+            self.position += 1
+            fields.append(RestoredValue(previous_value=fields[4]))
+        else:
+            fields.append(self.field())
+        fields.extend(self.field() for _ in range(len(_SHARED_FIELDS)))
+        return Action(id=fields[0], time=fields[1], duration_in_seconds=fields[2], name=fields[3],
+                      previous_value=fields[4], actual_value=fields[5], function=fields[6],
+                      rollback_function=fields[7], short_description=fields[8], full_description=fields[9],
+                      visibility_level=fields[10], changes_value=changes_value)
+
+
+def _write_record(output_file, buffer: bytearray) -> int:
+    output_file.write(_LENGTH.pack(len(buffer)))
+    output_file.write(buffer)
+    return _LENGTH.size + len(buffer)
+
+
+def write_game_file(filename, *, state: dict, objects: typing.Iterable[Value],
+                    actions: typing.Iterable[Action]) -> None:
+    """
+    The file is written next to filename and replaces it at the end: actions of a game loaded from filename
+    are read from the mapped old file while the new one is written
+    """
+    temporary_filename = f'{filename}.new'
+    _write_game_file(temporary_filename, state=state, objects=objects, actions=actions)
+    os.replace(temporary_filename, filename)
+
+
+def _write_game_file(filename, *, state: dict, objects: typing.Iterable[Value],
+                     actions: typing.Iterable[Action]) -> None:
+    writer = _Writer()
+    offsets = array('Q')
+    ids = bytearray()
+    id_kinds = bytearray()
+    with open(filename, 'wb') as output_file:
+        output_file.write(bytes(_HEADER.size))
+        position = _HEADER.size
+
+        objects_offset = position
+        objects_data = bytearray()
+        records = []
+        for value in objects:
+            buffer = bytearray()
+            writer.value(buffer, value)
+            records.append(buffer)
+        objects_data += struct.pack('<Q', len(records))
+        output_file.write(objects_data)
+        position += len(objects_data)
+        for buffer in records:
+            position += _write_record(output_file, buffer)
+
+        actions_offset = position
+        for action in actions:
+            buffer = bytearray()
+            writer.action(buffer, action)
+            offsets.append(position)
+            if type(action.id) is int and 0 <= action.id < _ID_LIMIT:
+                ids += action.id.to_bytes(_ID_SIZE, 'big')
+                id_kinds.append(_INT_ID)
+            elif type(action.id) is UUID:
+                ids += action.id.bytes
+                id_kinds.append(_UUID_ID)
+            else:
+                ids += bytes(_ID_SIZE)
+                id_kinds.append(_NO_ID)
+            position += _write_record(output_file, buffer)
+
+        actions_table_offset = position
+        output_file.write(offsets.tobytes())
+        output_file.write(ids)
+        output_file.write(id_kinds)
+        position += len(offsets) * offsets.itemsize + len(ids) + len(id_kinds)
+
+        strings_offset = position
+        strings_data = bytearray(struct.pack('<Q', len(writer.strings)))
+        for text in writer.strings:
+            encoded = text.encode()
+            _write_varint(strings_data, len(encoded))
+            strings_data += encoded
+        output_file.write(strings_data)
+        position += len(strings_data)
+
+        state_offset = position
+        output_file.write(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL))
+
+        output_file.seek(0)
+        output_file.write(_HEADER.pack(MAGIC, FORMAT_VERSION, strings_offset, state_offset, objects_offset,
+                                       actions_offset, actions_table_offset, len(offsets)))
+
+
+def is_game_file(filename) -> bool:
+    with open(filename, 'rb') as input_file:
+        return input_file.read(len(MAGIC)) == MAGIC
+
+
+class MappedActionLog(Sequence):
+    """
+    Actions of a loaded game file. They stay in the mapped file and are decoded only when they are read.
+    New actions are kept in memory, versions share the file and the same way as PersistentVector versions
+    """
+    __slots__ = ('_data', '_offsets', '_strings', '_tail')
+
+    def __init__(self, actions: typing.Iterable[Action] = ()):
+        self._data = b''
+        self._offsets = array('Q')
+        self._strings = []
+        self._tail = PersistentVector(actions)
+
+    @classmethod
+    def _mapped(cls, data, offsets: array, strings: typing.List[str]) -> 'MappedActionLog':
+        log = cls.__new__(cls)
+        log._data, log._offsets, log._strings, log._tail = data, offsets, strings, PersistentVector()
+        return log
+
+    def append(self, action: Action) -> 'MappedActionLog':
+        new_log = MappedActionLog.__new__(MappedActionLog)
+        new_log._data, new_log._offsets, new_log._strings = self._data, self._offsets, self._strings
+        new_log._tail = self._tail.append(action)
+        return new_log
+
+    def extend(self, actions: typing.Iterable[Action]) -> 'MappedActionLog':
+        new_log = MappedActionLog.__new__(MappedActionLog)
+        new_log._data, new_log._offsets, new_log._strings = self._data, self._offsets, self._strings
+        new_log._tail = self._tail.extend(actions)
+        return new_log
+
+    def __len__(self) -> int:
+        return len(self._offsets) + len(self._tail)
+
+    def close(self) -> None:
+        """
+        Unmaps the file, actions from it can't be read after that by any version of the log
+        """
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+
+    def _action(self, position: int) -> Action:
+        if position >= len(self._offsets):
+            return self._tail[position - len(self._offsets)]
+        return _Reader(self._data, self._offsets[position] + _LENGTH.size, self._strings).action()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self._action(i) for i in range(*index.indices(len(self))))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('MappedActionLog index out of range')
+        return self._action(index)
+
+    def __iter__(self) -> typing.Iterator[Action]:
+        for position in range(len(self)):
+            yield self._action(position)
+
+    def __eq__(self, other) -> bool:
+        if self is other:
+            return True
+        if not isinstance(other, Sequence) or isinstance(other, (str, bytes)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __hash__(self) -> int:
+        return hash(tuple(self))
+
+    def __repr__(self) -> str:
+        return f'MappedActionLog({list(self)!r})'
+
+    def __reduce__(self):
+        return MappedActionLog, (tuple(self),)
+
+
+def read_game_file(filename) -> typing.Tuple[dict, typing.List[Value], MappedActionLog, typing.List]:
+    """
+    Gives the state, current objects, actions log and ids of actions in the log order.
+    Actions are not decoded, the file is mapped and the log reads them from it
+    """
+    with open(filename, 'rb') as input_file:
+        data = mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(data) < _HEADER.size:
+        raise GameFileError(f'{filename} is not a game file')
+    (magic, version, strings_offset, state_offset, objects_offset, actions_offset, actions_table_offset,
+     actions_count) = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise GameFileError(f'{filename} is not a game file')
+    if version > FORMAT_VERSION:
+        raise GameFileError(f'{filename} has format version {version}, only {FORMAT_VERSION} is supported')
+
+    reader = _Reader(data, strings_offset + 8, [])
+    strings = []
+    for _ in range(struct.unpack_from('<Q', data, strings_offset)[0]):
+        strings.append(reader.take(reader.varint()).decode())
+    state = pickle.loads(data[state_offset:])
+
+    objects = []
+    reader = _Reader(data, objects_offset + 8, strings)
+    for _ in range(struct.unpack_from('<Q', data, objects_offset)[0]):
+        record_length = _LENGTH.unpack_from(data, reader.position)[0]
+        reader.position += _LENGTH.size
+        record_end = reader.position + record_length
+        objects.append(reader.value())
+        reader.position = record_end
+
+    offsets = array('Q')
+    offsets.frombytes(data[actions_table_offset:actions_table_offset + actions_count * offsets.itemsize])
+    ids_offset = actions_table_offset + actions_count * offsets.itemsize
+    ids_data = data[ids_offset:ids_offset + actions_count * _ID_SIZE]
+    actions_log = MappedActionLog._mapped(data, offsets, strings)
+    if version >= 2:
+        kinds_offset = ids_offset + actions_count * _ID_SIZE
+        id_kinds = data[kinds_offset:kinds_offset + actions_count]
+    else:
+        # Version 1 had only UUID ids in the table, zeros for other ids
+        no_id = bytes(_ID_SIZE)
+        id_kinds = bytes(_UUID_ID if ids_data[position * _ID_SIZE:(position + 1) * _ID_SIZE] != no_id else _NO_ID
+                         for position in range(actions_count))
+    action_ids = []
+    for position, id_kind in enumerate(id_kinds):
+        id_bytes = ids_data[position * _ID_SIZE:(position + 1) * _ID_SIZE]
+        if id_kind == _INT_ID:
+            action_ids.append(int.from_bytes(id_bytes, 'big'))
+        elif id_kind == _UUID_ID:
+            action_ids.append(UUID(bytes=id_bytes))
+        else:
+            action_ids.append(actions_log[position].id)
+    return state, objects, actions_log, action_ids
+
+
+# Kinds of persistent ids of _ReferencingPickler
+_OBJECT, _CHANGED_OBJECT, _UNSAVED_FUNCTION = range(3)
+# Fields of Value a changed version may have other than the version in the game, besides the history
+_VALUE_FIELDS = ('value', 'name', 'subscribers', 'short_description', 'full_description', 'children', 'parent')
+
+
+class _ReferencingPickler(pickle.Pickler):
+    """
+    Pickles the versions of values that are in objects (the game before the change) as references to them,
+    and versions made from them by appending actions as the reference, the changed fields and the new actions.
+    Functions that can't be imported by name are pickled as None, like in the records
+    """
+
+    def __init__(self, output_file, *, objects: typing.Mapping):
+        super().__init__(output_file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.objects = objects
+
+    def persistent_id(self, item):
+        item_type = type(item)
+        if item_type is Value:
+            game_object = self.objects.get(item.id)
+            if game_object is None:
+                return None
+            if game_object is item:
+                return _OBJECT, item.id
+            object_actions, actions = game_object.actions_sequence, item.actions_sequence
+            if len(actions) < len(object_actions) or \
+                    object_actions and actions[len(object_actions) - 1] is not object_actions[-1]:
+                return None  # not made from the version in the game
+            changed_fields = {name: getattr(item, name) for name in _VALUE_FIELDS
+                              if getattr(item, name) is not getattr(game_object, name)}
+            return _CHANGED_OBJECT, item.id, changed_fields, actions[len(object_actions):]
+        if item_type is types.FunctionType and _function_name(item) is None:
+            return _UNSAVED_FUNCTION,
+        return None
+
+
+class _ReferencingUnpickler(pickle.Unpickler):
+    def __init__(self, input_file, *, objects: typing.Mapping):
+        super().__init__(input_file)
+        self.objects = objects
+
+    def persistent_load(self, persistent_id):
+        kind = persistent_id[0]
+        if kind == _UNSAVED_FUNCTION:
+            return None
+        value = self.objects[persistent_id[1]]
+        if kind == _CHANGED_OBJECT:
+            _, _, changed_fields, actions = persistent_id
+            value = replace(value, **changed_fields)
+            for action in actions:
+                value = value.append_action_to_sequence(action)
+        return value
+
+
+def write_checkpoint_file(filename, *, game, generation: int) -> None:
+    """
+    Unlike game files checkpoints keep histories of values, they are what the journal continues
+    """
+    with open(filename, 'wb') as output_file:
+        _ReferencingPickler(output_file, objects={}).dump({'journal_generation': generation, 'game': game})
+
+
+def read_checkpoint_file(filename) -> dict:
+    with open(filename, 'rb') as input_file:
+        return _ReferencingUnpickler(input_file, objects={}).load()
+
+
+def read_journal_action(record, *, objects: typing.Mapping) -> Action:
+    """
+    Action of a journal record, objects must be the game the action was made to
+    """
+    if isinstance(record, Action):
+        return record  # journals before version 4 have no references
+    return _ReferencingUnpickler(io.BytesIO(record), objects=objects).load()
+
+
+JOURNAL_MAGIC = b'CTJRNL\x00\x00'
+# magic, format version, generation: number of the checkpoint the journal continues
+_JOURNAL_HEADER = struct.Struct('<8sH6xQ')
+# length and crc32 of the record
+_FRAME = struct.Struct('<II')
+JOURNAL_ACTION, JOURNAL_CANCEL, JOURNAL_DICE, JOURNAL_UNDO, JOURNAL_REDO = range(5)
+
+
+def _read_journal_records(data: bytes) -> typing.Tuple[int, int, typing.List[tuple], int]:
+    """
+    Gives format version, generation, records and the length of the valid part:
+    a record torn by a crash ends the journal
+    """
+    if len(data) < _JOURNAL_HEADER.size:
+        return FORMAT_VERSION, 0, [], 0
+    magic, version, generation = _JOURNAL_HEADER.unpack_from(data)
+    if magic != JOURNAL_MAGIC:
+        raise GameFileError('Not a game journal')
+    if version > FORMAT_VERSION:
+        raise GameFileError(f'Journal has format version {version}, only {FORMAT_VERSION} is supported')
+    records = []
+    position = _JOURNAL_HEADER.size
+    while position + _FRAME.size <= len(data):
+        length, checksum = _FRAME.unpack_from(data, position)
+        payload = data[position + _FRAME.size:position + _FRAME.size + length]
+        if len(payload) < length or zlib.crc32(payload) != checksum:
+            break
+        reader = _Reader(payload, 1, [])
+        kind = payload[0]
+        if kind == JOURNAL_ACTION and version >= 4:
+            records.append((kind, payload[1:]))  # see read_journal_action
+        elif kind == JOURNAL_ACTION:
+            records.append((kind, reader.action()))
+        elif kind == JOURNAL_CANCEL:
+            records.append((kind, reader.field()))
+        elif kind == JOURNAL_DICE:
+            records.append((kind, (reader.field(), reader.field())))
+        else:
+            records.append((kind, None))
+        position += _FRAME.size + length
+    return version, generation, records, position
+
+
+class GameJournal:
+    """
+    Append-only file of game changes: made actions, cancelled action ids, undo and redo, dice seed and position.
+    Records are written with group commit: they are collected in memory and written with one fsync
+    when there are sync_every of them or sync_interval seconds passed since the last sync,
+    so a crash loses at most the last not synced batch. sync_every=1 syncs every record.
+    Appending costs the same for any session length, checkpoint() of Game starts a new generation.
+    The journal follows one line of game versions: only head, the last version, can be changed
+    """
+
+    def __init__(self, filename, *, sync_every: int = 64, sync_interval: float = 1.0):
+        self.filename = filename
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self._pending = bytearray()
+        self._pending_records = 0
+        self._last_sync = time.monotonic()
+        self._writer = _Writer(shared_strings=False)
+        data = b''
+        if os.path.exists(filename):
+            with open(filename, 'rb') as input_file:
+                data = input_file.read()
+        self.head = None
+        # Records of the file when it was opened, for recovery
+        self.version, self.generation, self.recovered_records, valid_length = _read_journal_records(data)
+        if not valid_length:
+            self.start_generation(self.generation)
+        else:
+            self._file = open(filename, 'r+b')
+            self._file.truncate(valid_length)  # a torn record must not be followed by new ones
+            self._file.seek(valid_length)
+
+    @property
+    def checkpoint_filename(self) -> str:
+        return f'{self.filename}.checkpoint'
+
+    def start_generation(self, generation: int) -> None:
+        """
+        Replaces the journal with the empty one
+        """
+        temporary_filename = f'{self.filename}.new'
+        with open(temporary_filename, 'wb') as output_file:
+            output_file.write(_JOURNAL_HEADER.pack(JOURNAL_MAGIC, FORMAT_VERSION, generation))
+            output_file.flush()
+            os.fsync(output_file.fileno())
+        os.replace(temporary_filename, self.filename)
+        self._file = open(self.filename, 'r+b')
+        self._file.seek(0, os.SEEK_END)
+        self.version = FORMAT_VERSION
+        self.generation = generation
+
+    def _append(self, kind: int, write: typing.Callable[[bytearray], None]) -> None:
+        payload = bytearray((kind,))
+        write(payload)
+        self._pending += _FRAME.pack(len(payload), zlib.crc32(payload))
+        self._pending += payload
+        self._pending_records += 1
+        if self._pending_records >= self.sync_every or time.monotonic() - self._last_sync >= self.sync_interval:
+            self.sync()
+
+    def append_action(self, action: Action, *, objects: typing.Mapping) -> None:
+        """
+        objects are the objects of the game the action is made to
+        """
+        def write(payload: bytearray) -> None:
+            pickled = io.BytesIO()
+            _ReferencingPickler(pickled, objects=objects).dump(action)
+            payload += pickled.getbuffer()
+
+        self._append(JOURNAL_ACTION, write)
+
+    def append_cancel(self, action_id) -> None:
+        self._append(JOURNAL_CANCEL, lambda payload: self._writer.field(payload, action_id))
+
+    def append_dice(self, *, dice_seed: int, dice_position: int) -> None:
+        def write(payload: bytearray) -> None:
+            self._writer.field(payload, dice_seed)
+            self._writer.field(payload, dice_position)
+
+        self._append(JOURNAL_DICE, write)
+
+    def append_undo(self) -> None:
+        self._append(JOURNAL_UNDO, lambda payload: None)
+
+    def append_redo(self) -> None:
+        self._append(JOURNAL_REDO, lambda payload: None)
+
+    def sync(self) -> None:
+        """
+        Writes all collected records with one fsync
+        """
+        if self._pending:
+            self._file.write(self._pending)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._pending = bytearray()
+            self._pending_records = 0
+        self._last_sync = time.monotonic()
+
+    def write_checkpoint(self, write: typing.Callable[[str, int], None]) -> None:
+        """
+        write(filename, generation) saves the game, after that the journal starts from the empty generation.
+        The checkpoint knows its generation, so a crash between the two steps doesn't replay records twice
+        """
+        self.sync()
+        temporary_filename = f'{self.checkpoint_filename}.new'
+        write(temporary_filename, self.generation + 1)
+        with open(temporary_filename, 'rb') as checkpoint_file:
+            os.fsync(checkpoint_file.fileno())
+        os.replace(temporary_filename, self.checkpoint_filename)
+        self._file.close()
+        self.start_generation(self.generation + 1)
+
+    def close(self) -> None:
+        self.sync()
+        self._file.close()
+
+    def __reduce__(self):
+        # Open file can't be saved, a loaded game has no journal
+        return _no_journal, ()
+
+
+def _no_journal() -> None:
+    return None
@@ -0,0 +1,790 @@
+import functools
+import operator
+import typing
+import threading
+from array import array
+from bisect import bisect_right
+from itertools import islice
+from collections.abc import Mapping, Sequence
+
+CHUNK_SIZE = 32
+# PersistentMap.update builds the trie again if at least 1/BULK_UPDATE_RATIO of its keys are set
+BULK_UPDATE_RATIO = 2
+_HASH_MASK = (1 << 64) - 1
+_MISSING = object()
+
+
+class _BranchNode:
+    """
+    Inner node of PersistentVector. offsets[i] is the number of items stored in children[0..i]
+    """
+    __slots__ = ('children', 'offsets')
+
+    def __init__(self, children: tuple, offsets: tuple):
+        self.children = children
+        self.offsets = offsets
+
+
+def _push_chunk(node, height: int, chunk: tuple):
+    """
+    Appends full chunk to the rightmost path of the tree. Only nodes on that path are copied.
+    Returns (new_node, overflow_node); overflow_node is not None if node had no room for the chunk
+    """
+    if height == 1:
+        if len(node.children) < CHUNK_SIZE:
+            return _BranchNode(node.children + (chunk,), node.offsets + (node.offsets[-1] + len(chunk),)), None
+        return node, _BranchNode((chunk,), (len(chunk),))
+
+    new_child, overflow = _push_chunk(node.children[-1], height - 1, chunk)
+    if overflow is None:
+        return _BranchNode(node.children[:-1] + (new_child,),
+                           node.offsets[:-1] + (node.offsets[-1] + len(chunk),)), None
+    if len(node.children) < CHUNK_SIZE:
+        return _BranchNode(node.children + (overflow,), node.offsets + (node.offsets[-1] + len(chunk),)), None
+    return node, _BranchNode((overflow,), (len(chunk),))
+
+
+def _delete_from_node(node, height: int, index: int):
+    if height == 0:
+        return node[:index] + node[index + 1:]
+    child_number = bisect_right(node.offsets, index)
+    child_index = index - node.offsets[child_number - 1] if child_number else index
+    new_child = _delete_from_node(node.children[child_number], height - 1, child_index)
+    return _BranchNode(node.children[:child_number] + (new_child,) + node.children[child_number + 1:],
+                       node.offsets[:child_number] + tuple(offset - 1 for offset in node.offsets[child_number:]))
+
+
+class PersistentVector(Sequence):
+    """
+    Immutable sequence with structural sharing between versions.
+    Items are stored in chunks of CHUNK_SIZE in a shallow tree, the last chunk is kept separately (tail),
+    so append copies at most one chunk and one path of the tree: amortized O(log n) with base 32.
+    Every version stays valid after append
+    """
+    __slots__ = ('_root', '_height', '_tree_count', '_tail')
+
+    def __init__(self, items: typing.Iterable = ()):
+        self._root = None
+        self._height = 0
+        self._tree_count = 0
+        self._tail = ()
+        for item in items:
+            self._append_in_place(item)
+
+    def _append_in_place(self, item) -> None:
+        # Only used while the vector is not shared yet (construction)
+        if len(self._tail) < CHUNK_SIZE:
+            self._tail = self._tail + (item,)
+            return
+        self._root, self._height = self._tree_with_chunk(self._tail)
+        self._tree_count += len(self._tail)
+        self._tail = (item,)
+
+    def _tree_with_chunk(self, chunk: tuple) -> typing.Tuple[typing.Any, int]:
+        if self._root is None:
+            return chunk, 0
+        if self._height == 0:
+            return _BranchNode((self._root, chunk), (len(self._root), len(self._root) + len(chunk))), 1
+        new_root, overflow = _push_chunk(self._root, self._height, chunk)
+        if overflow is None:
+            return new_root, self._height
+        return _BranchNode((new_root, overflow), (self._tree_count, self._tree_count + len(chunk))), self._height + 1
+
+    def append(self, item) -> 'PersistentVector':
+        new_vector = PersistentVector.__new__(PersistentVector)
+        if len(self._tail) < CHUNK_SIZE:
+            new_vector._root = self._root
+            new_vector._height = self._height
+            new_vector._tree_count = self._tree_count
+            new_vector._tail = self._tail + (item,)
+            return new_vector
+
+        new_vector._root, new_vector._height = self._tree_with_chunk(self._tail)
+        new_vector._tree_count = self._tree_count + len(self._tail)
+        new_vector._tail = (item,)
+        return new_vector
+
+    def extend(self, items: typing.Iterable) -> 'PersistentVector':
+        """
+        The same as appending items one by one, but versions between them are not made
+        """
+        new_vector = PersistentVector.__new__(PersistentVector)
+        new_vector._root, new_vector._height = self._root, self._height
+        new_vector._tree_count, new_vector._tail = self._tree_count, self._tail
+        # The new vector isn't shared yet, the tree is changed only by copying paths
+        for item in items:
+            new_vector._append_in_place(item)
+        return new_vector
+
+    def without(self, indexes: typing.Iterable[int]) -> 'PersistentVector':
+        """
+        Vector without items at indexes. Only paths to them are copied, chunks can become shorter than CHUNK_SIZE
+        """
+        new_vector = PersistentVector.__new__(PersistentVector)
+        root, tree_count, tail = self._root, self._tree_count, self._tail
+        for index in sorted(set(indexes), reverse=True):
+            if index >= tree_count:
+                index -= tree_count
+                tail = tail[:index] + tail[index + 1:]
+            else:
+                root = _delete_from_node(root, self._height, index)
+                tree_count -= 1
+        new_vector._root, new_vector._height, new_vector._tree_count, new_vector._tail = \
+            root, self._height, tree_count, tail
+        return new_vector
+
+    def __len__(self) -> int:
+        return self._tree_count + len(self._tail)
+
+    def _item(self, index: int):
+        if index >= self._tree_count:
+            return self._tail[index - self._tree_count]
+        node = self._root
+        for _ in range(self._height):
+            child_number = bisect_right(node.offsets, index)
+            if child_number:
+                index -= node.offsets[child_number - 1]
+            node = node.children[child_number]
+        return node[index]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                return tuple(islice(self._iterate_from(start), max(stop - start, 0)))
+            return tuple(self._item(i) for i in range(start, stop, step))
+        length = len(self)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError('PersistentVector index out of range')
+        return self._item(index)
+
+    def _chunks(self) -> typing.Iterator[tuple]:
+        if self._root is not None:
+            stack = [(self._root, self._height)]
+            while stack:
+                node, height = stack.pop()
+                if height == 0:
+                    yield node
+                else:
+                    stack.extend((child, height - 1) for child in reversed(node.children))
+        yield self._tail
+
+    def __iter__(self) -> typing.Iterator:
+        for chunk in self._chunks():
+            yield from chunk
+
+    def _iterate_from(self, start: int) -> typing.Iterator:
+        for chunk in self._chunks():
+            if start >= len(chunk):
+                start -= len(chunk)
+                continue
+            yield from chunk[start:] if start else chunk
+            start = 0
+
+    def __eq__(self, other) -> bool:
+        if self is other:
+            return True
+        if not isinstance(other, (PersistentVector, tuple, list)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __hash__(self) -> int:
+        return hash(tuple(self))
+
+    def __repr__(self) -> str:
+        return f'PersistentVector({list(self)!r})'
+
+    def __reduce__(self):
+        return PersistentVector, (tuple(self),)
+
+
+class FloatLog(Sequence):
+    """
+    Immutable append-only sequence of floats with the running total of all items.
+    Versions share one compact array: the newest version appends in place, older versions see only
+    their first items, so append is O(1) amortized. Appending to an older version copies the array
+    """
+    __slots__ = ('_buffer', '_length', 'total')
+    _append_lock = threading.Lock()
+
+    def __init__(self, items: typing.Iterable[float] = ()):
+        self._buffer = array('d', items)
+        self._length = len(self._buffer)
+        self.total = 0.0
+        for item in self._buffer:
+            self.total += item
+
+    def append(self, item: float) -> 'FloatLog':
+        with self._append_lock:
+            if len(self._buffer) == self._length:
+                buffer = self._buffer
+            else:
+                buffer = self._buffer[:self._length]
+            buffer.append(item)
+        new_log = FloatLog.__new__(FloatLog)
+        new_log._buffer = buffer
+        new_log._length = self._length + 1
+        new_log.total = self.total + item
+        return new_log
+
+    def extend(self, items: typing.Iterable[float]) -> 'FloatLog':
+        items = array('d', items)
+        with self._append_lock:
+            if len(self._buffer) == self._length:
+                buffer = self._buffer
+            else:
+                buffer = self._buffer[:self._length]
+            buffer.extend(items)
+        new_log = FloatLog.__new__(FloatLog)
+        new_log._buffer = buffer
+        new_log._length = self._length + len(items)
+        new_log.total = self.total
+        for item in items:  # the same order of additions as in append, so the total is the same
+            new_log.total += item
+        return new_log
+
+    def without(self, indexes: typing.Iterable[int]) -> 'FloatLog':
+        indexes = sorted(set(indexes))
+        buffer, start = array('d'), 0
+        for index in indexes:
+            buffer += self._buffer[start:index]
+            start = index + 1
+        buffer += self._buffer[start:self._length]
+        new_log = FloatLog.__new__(FloatLog)
+        new_log._buffer = buffer
+        new_log._length = len(buffer)
+        if all(self._buffer[index] == 0 for index in indexes):
+            new_log.total = self.total
+        else:
+            # The same order of additions as in append, so the total is the same
+            new_log.total = functools.reduce(operator.add, buffer, 0.0)
+        return new_log
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self._buffer[:self._length][index])
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError('FloatLog index out of range')
+        return self._buffer[index]
+
+    def __iter__(self) -> typing.Iterator[float]:
+        return iter(self._buffer[:self._length])
+
+    def __eq__(self, other) -> bool:
+        if self is other:
+            return True
+        if isinstance(other, FloatLog):
+            return self._length == other._length and self._buffer[:self._length] == other._buffer[:other._length]
+        if not isinstance(other, (PersistentVector, tuple, list)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __hash__(self) -> int:
+        return hash(tuple(self))
+
+    def __repr__(self) -> str:
+        return f'FloatLog({list(self)!r})'
+
+    def __reduce__(self):
+        return FloatLog, (self._buffer[:self._length],)
+
+
+def _bit_position(key_hash: int, shift: int) -> int:
+    return 1 << ((key_hash >> shift) & 31)
+
+
+class _BitmapNode:
+    """
+    HAMT node. Every entry is either a leaf tuple (key_hash, key, value) or a child node
+    """
+    __slots__ = ('bitmap', 'entries')
+
+    def __init__(self, bitmap: int, entries: tuple):
+        self.bitmap = bitmap
+        self.entries = entries
+
+
+class _CollisionNode:
+    """
+    Keeps keys with the same full hash, entries are (key, value) pairs
+    """
+    __slots__ = ('key_hash', 'entries')
+
+    def __init__(self, key_hash: int, entries: tuple):
+        self.key_hash = key_hash
+        self.entries = entries
+
+
+def _pair_node(shift: int, first_leaf: tuple, second_leaf: tuple) -> _BitmapNode:
+    first_bit = _bit_position(first_leaf[0], shift)
+    second_bit = _bit_position(second_leaf[0], shift)
+    if first_bit == second_bit:
+        return _BitmapNode(first_bit, (_pair_node(shift + 5, first_leaf, second_leaf),))
+    if first_bit < second_bit:
+        return _BitmapNode(first_bit | second_bit, (first_leaf, second_leaf))
+    return _BitmapNode(first_bit | second_bit, (second_leaf, first_leaf))
+
+
+def _node_get(node, shift: int, key_hash: int, key, default):
+    while True:
+        if type(node) is _CollisionNode:
+            if node.key_hash == key_hash:
+                for entry_key, entry_value in node.entries:
+                    if entry_key == key:
+                        return entry_value
+            return default
+
+        bit = _bit_position(key_hash, shift)
+        if not node.bitmap & bit:
+            return default
+        entry = node.entries[(node.bitmap & (bit - 1)).bit_count()]
+        if type(entry) is tuple:
+            if entry[0] == key_hash and (entry[1] is key or entry[1] == key):
+                return entry[2]
+            return default
+        node = entry
+        shift += 5
+
+
+def _node_set(node, shift: int, key_hash: int, key, value) -> typing.Tuple[typing.Any, bool]:
+    """
+    Returns (new_node, True if key was added)
+    """
+    if type(node) is _CollisionNode:
+        if node.key_hash != key_hash:
+            wrapper = _BitmapNode(_bit_position(node.key_hash, shift), (node,))
+            return _node_set(wrapper, shift, key_hash, key, value)
+        for number, (entry_key, _) in enumerate(node.entries):
+            if entry_key == key:
+                entries = node.entries[:number] + ((key, value),) + node.entries[number + 1:]
+                return _CollisionNode(key_hash, entries), False
+        return _CollisionNode(key_hash, node.entries + ((key, value),)), True
+
+    bit = _bit_position(key_hash, shift)
+    number = (node.bitmap & (bit - 1)).bit_count()
+    entries = node.entries
+    if not node.bitmap & bit:
+        return _BitmapNode(node.bitmap | bit, entries[:number] + ((key_hash, key, value),) + entries[number:]), True
+
+    entry = entries[number]
+    if type(entry) is tuple:
+        entry_hash, entry_key, entry_value = entry
+        if entry_hash == key_hash and (entry_key is key or entry_key == key):
+            if entry_value is value:
+                return node, False
+            new_entry, added = (key_hash, key, value), False
+        elif entry_hash == key_hash:
+            new_entry, added = _CollisionNode(key_hash, ((entry_key, entry_value), (key, value))), True
+        else:
+            new_entry, added = _pair_node(shift + 5, entry, (key_hash, key, value)), True
+    else:
+        new_entry, added = _node_set(entry, shift + 5, key_hash, key, value)
+    return _BitmapNode(node.bitmap, entries[:number] + (new_entry,) + entries[number + 1:]), added
+
+
+def _node_delete(node, shift: int, key_hash: int, key):
+    """
+    Returns (new_node, True if key was removed). new_node may be None (empty) or a leaf tuple
+    that parent stores in place of the node
+    """
+    if type(node) is _CollisionNode:
+        if node.key_hash != key_hash:
+            return node, False
+        entries = tuple(e for e in node.entries if e[0] != key)
+        if len(entries) == len(node.entries):
+            return node, False
+        if len(entries) == 1:
+            return (key_hash,) + entries[0], True
+        return _CollisionNode(key_hash, entries), True
+
+    bit = _bit_position(key_hash, shift)
+    if not node.bitmap & bit:
+        return node, False
+    number = (node.bitmap & (bit - 1)).bit_count()
+    entry = node.entries[number]
+    if type(entry) is tuple:
+        if entry[0] != key_hash or not (entry[1] is key or entry[1] == key):
+            return node, False
+        new_entry = None
+    else:
+        new_entry, removed = _node_delete(entry, shift + 5, key_hash, key)
+        if not removed:
+            return node, False
+
+    if new_entry is None:
+        entries = node.entries[:number] + node.entries[number + 1:]
+        if not entries:
+            return None, True
+        if len(entries) == 1 and type(entries[0]) is tuple and shift:
+            return entries[0], True
+        return _BitmapNode(node.bitmap & ~bit, entries), True
+    if len(node.entries) == 1 and type(new_entry) is tuple and shift:
+        return new_entry, True
+    return _BitmapNode(node.bitmap, node.entries[:number] + (new_entry,) + node.entries[number + 1:]), True
+
+
+def _build_node(leaves: typing.List[tuple], shift: int):
+    """
+    Node with all leaves (key_hash, key, value) at once, keys are unique
+    """
+    groups = {}
+    for leaf in leaves:
+        groups.setdefault(_bit_position(leaf[0], shift), []).append(leaf)
+    bitmap = 0
+    entries = []
+    for bit in sorted(groups):
+        group = groups[bit]
+        bitmap |= bit
+        if len(group) == 1:
+            entries.append(group[0])
+        elif all(leaf[0] == group[0][0] for leaf in group):
+            entries.append(_CollisionNode(group[0][0], tuple((key, value) for _, key, value in group)))
+        else:
+            entries.append(_build_node(group, shift + 5))
+    return _BitmapNode(bitmap, tuple(entries))
+
+
+def _node_leaves(node) -> typing.Iterator[tuple]:
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if type(node) is _CollisionNode:
+            for entry_key, entry_value in node.entries:
+                yield node.key_hash, entry_key, entry_value
+            continue
+        for entry in node.entries:
+            if type(entry) is tuple:
+                yield entry
+            else:
+                stack.append(entry)
+
+
+def _changed_leaves(first, second, changed: typing.List[tuple]) -> None:
+    """
+    Appends (key, first value, second value) for keys whose values differ, _MISSING if the key is absent.
+    Subtrees shared by both versions are skipped
+    """
+    if first is second:
+        return
+    if type(first) is not _BitmapNode or type(second) is not _BitmapNode:
+        _compare_leaves(_node_leaves(first), _node_leaves(second), changed)
+        return
+    first_entries, second_entries = dict(_entries_by_bit(first)), dict(_entries_by_bit(second))
+    for bit in first_entries.keys() | second_entries.keys():
+        first_entry, second_entry = first_entries.get(bit), second_entries.get(bit)
+        if first_entry is second_entry:
+            continue
+        if type(first_entry) is _BitmapNode and type(second_entry) is _BitmapNode:
+            _changed_leaves(first_entry, second_entry, changed)
+        else:
+            _compare_leaves(_entry_leaves(first_entry), _entry_leaves(second_entry), changed)
+
+
+def _compare_leaves(first_leaves: typing.Iterable[tuple], second_leaves: typing.Iterable[tuple],
+                    changed: typing.List[tuple]) -> None:
+    first_values = {leaf[1]: leaf[2] for leaf in first_leaves}
+    for _, key, second_value in second_leaves:
+        first_value = first_values.pop(key, _MISSING)
+        if first_value is _MISSING or first_value[1] is not second_value[1]:
+            changed.append((key, first_value, second_value))
+    for key, first_value in first_values.items():
+        changed.append((key, first_value, _MISSING))
+
+
+def _entries_by_bit(node: _BitmapNode) -> typing.Iterator[tuple]:
+    bitmap = node.bitmap
+    for entry in node.entries:
+        bit = bitmap & -bitmap
+        bitmap ^= bit
+        yield bit, entry
+
+
+def _entry_leaves(entry) -> typing.Iterable[tuple]:
+    if entry is None:
+        return ()
+    if type(entry) is tuple:
+        return entry,
+    return _node_leaves(entry)
+
+
+_EMPTY_NODE = _BitmapNode(0, ())
+
+
+class PersistentMap(Mapping):
+    """
+    Immutable mapping (hash array mapped trie) with structural sharing between versions.
+    set and delete copy only one path of the trie: O(log n) with base 32.
+    Iteration order is the insertion order, the same as for dict
+    """
+    __slots__ = ('_root', '_count', '_next_order')
+
+    def __init__(self, items: typing.Union[typing.Mapping, typing.Iterable[tuple]] = ()):
+        # dict keeps the first position and the last value of repeated keys, the same as set does
+        items = dict(items)
+        self._root = _build_node([(hash(key) & _HASH_MASK, key, (order, value))
+                                  for order, (key, value) in enumerate(items.items())], 0) if items else _EMPTY_NODE
+        self._count = len(items)
+        self._next_order = len(items)
+
+    def _with_root(self, root, count: int, next_order: int) -> 'PersistentMap':
+        new_map = PersistentMap.__new__(PersistentMap)
+        new_map._root = root if root is not None else _EMPTY_NODE
+        new_map._count = count
+        new_map._next_order = next_order
+        return new_map
+
+    def set(self, key, value) -> 'PersistentMap':
+        key_hash = hash(key) & _HASH_MASK
+        previous = _node_get(self._root, 0, key_hash, key, _MISSING)
+        if previous is _MISSING:
+            root, _ = _node_set(self._root, 0, key_hash, key, (self._next_order, value))
+            return self._with_root(root, self._count + 1, self._next_order + 1)
+        if previous[1] is value:
+            return self
+        root, _ = _node_set(self._root, 0, key_hash, key, (previous[0], value))
+        return self._with_root(root, self._count, self._next_order)
+
+    def update(self, items: typing.Union[typing.Mapping, typing.Iterable[tuple]]) -> 'PersistentMap':
+        items = list(items.items() if isinstance(items, Mapping) else items)
+        if len(items) * BULK_UPDATE_RATIO < self._count:
+            new_map = self
+            for key, value in items:
+                new_map = new_map.set(key, value)
+            return new_map
+        # Many keys are changed, building the trie again is cheaper than copying a path for every key
+        leaves = {leaf[1]: leaf for leaf in _node_leaves(self._root)}
+        next_order = self._next_order
+        for key, value in items:
+            leaf = leaves.get(key)
+            if leaf is None:
+                leaves[key] = (hash(key) & _HASH_MASK, key, (next_order, value))
+                next_order += 1
+            else:
+                leaves[key] = (leaf[0], key, (leaf[2][0], value))
+        return self._with_root(_build_node(list(leaves.values()), 0) if leaves else None, len(leaves), next_order)
+
+    def delete(self, key) -> 'PersistentMap':
+        root, removed = _node_delete(self._root, 0, hash(key) & _HASH_MASK, key)
+        if not removed:
+            raise KeyError(key)
+        return self._with_root(root, self._count - 1, self._next_order)
+
+    def __getitem__(self, key):
+        entry = _node_get(self._root, 0, hash(key) & _HASH_MASK, key, _MISSING)
+        if entry is _MISSING:
+            raise KeyError(key)
+        return entry[1]
+
+    def get(self, key, default=None):
+        entry = _node_get(self._root, 0, hash(key) & _HASH_MASK, key, _MISSING)
+        if entry is _MISSING:
+            return default
+        return entry[1]
+
+    def __contains__(self, key) -> bool:
+        return _node_get(self._root, 0, hash(key) & _HASH_MASK, key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _ordered_items(self) -> typing.List[tuple]:
+        leaves = sorted(_node_leaves(self._root), key=lambda leaf: leaf[2][0])
+        return [(key, order_and_value[1]) for _, key, order_and_value in leaves]
+
+    def __iter__(self) -> typing.Iterator:
+        return iter([key for key, _ in self._ordered_items()])
+
+    def items(self):
+        return self._ordered_items()
+
+    def values(self):
+        return [value for _, value in self._ordered_items()]
+
+    def items_of(self, keys: typing.Iterable) -> typing.List[tuple]:
+        """
+        Items of the keys that are in the map in insertion order, without going through the whole map
+        """
+        entries = []
+        for key in keys:
+            entry = _node_get(self._root, 0, hash(key) & _HASH_MASK, key, _MISSING)
+            if entry is not _MISSING:
+                entries.append((entry[0], key, entry[1]))
+        entries.sort(key=lambda entry: entry[0])
+        return [(key, value) for _, key, value in entries]
+
+    def changes(self, other: 'PersistentMap') -> typing.List[tuple]:
+        """
+        (key, value here, value in other) for keys whose values are not the same objects, None for a missing key.
+        Parts shared by the versions are not visited, so it costs as much as the changes between them
+        """
+        changed = []
+        _changed_leaves(self._root, other._root, changed)
+        return [(key, None if first is _MISSING else first[1], None if second is _MISSING else second[1])
+                for key, first, second in changed]
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, PersistentMap) and self._root is other._root:
+            return True
+        return super().__eq__(other)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f'PersistentMap({dict(self._ordered_items())!r})'
+
+    def __reduce__(self):
+        return PersistentMap, (self._ordered_items(),)
+
+
+class _HeapNode:
+    __slots__ = ('key', 'item', 'left', 'right', 'rank')
+
+    def __init__(self, key, item, left, right, rank: int):
+        self.key = key
+        self.item = item
+        self.left = left
+        self.right = right
+        self.rank = rank
+
+
+def _merge_heap_nodes(first, second):
+    if first is None:
+        return second
+    if second is None:
+        return first
+    if second.key < first.key:
+        first, second = second, first
+    right = _merge_heap_nodes(first.right, second)
+    left = first.left
+    if left is None or left.rank < right.rank:
+        left, right = right, left
+    return _HeapNode(first.key, first.item, left, right, (right.rank if right is not None else 0) + 1)
+
+
+class PersistentHeap:
+    """
+    Immutable min-heap (leftist heap). push and pop are O(log n) and keep previous versions valid.
+    Items are ordered by key only, items themselves are never compared
+    """
+    __slots__ = ('_root', '_count')
+
+    def __init__(self, keys_and_items: typing.Iterable[tuple] = ()):
+        self._root = None
+        self._count = 0
+        for key, item in keys_and_items:
+            self._root = _merge_heap_nodes(self._root, _HeapNode(key, item, None, None, 1))
+            self._count += 1
+
+    def _with_root(self, root, count: int) -> 'PersistentHeap':
+        new_heap = PersistentHeap.__new__(PersistentHeap)
+        new_heap._root = root
+        new_heap._count = count
+        return new_heap
+
+    def push(self, key, item) -> 'PersistentHeap':
+        return self._with_root(_merge_heap_nodes(self._root, _HeapNode(key, item, None, None, 1)), self._count + 1)
+
+    def peek(self) -> tuple:
+        """
+        Returns (key, item) with the minimal key
+        """
+        if self._root is None:
+            raise IndexError('peek from empty heap')
+        return self._root.key, self._root.item
+
+    def pop(self) -> 'PersistentHeap':
+        """
+        Returns the heap without the minimal item
+        """
+        if self._root is None:
+            raise IndexError('pop from empty heap')
+        return self._with_root(_merge_heap_nodes(self._root.left, self._root.right), self._count - 1)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> typing.Iterator[tuple]:
+        """
+        Iterates over (key, item) pairs in no particular order
+        """
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            yield node.key, node.item
+            stack.extend(child for child in (node.left, node.right) if child is not None)
+
+    def __repr__(self) -> str:
+        return f'PersistentHeap({sorted(self, key=lambda pair: pair[0])!r})'
+
+    def __reduce__(self):
+        return PersistentHeap, (list(self),)
+
+
+class PersistentStack:
+    """
+    Immutable stack (linked list). push, peek and pop are O(1), versions share their bottom items
+    """
+    __slots__ = ('_top', '_count')
+
+    def __init__(self, items: typing.Iterable = ()):
+        """
+        items go from the bottom to the top
+        """
+        self._top = None
+        self._count = 0
+        for item in items:
+            self._top = (item, self._top)
+            self._count += 1
+
+    def _with_top(self, top, count: int) -> 'PersistentStack':
+        new_stack = PersistentStack.__new__(PersistentStack)
+        new_stack._top = top
+        new_stack._count = count
+        return new_stack
+
+    def push(self, item) -> 'PersistentStack':
+        return self._with_top((item, self._top), self._count + 1)
+
+    def peek(self):
+        if self._top is None:
+            raise IndexError('peek from empty stack')
+        return self._top[0]
+
+    def pop(self) -> 'PersistentStack':
+        """
+        Returns the stack without the top item
+        """
+        if self._top is None:
+            raise IndexError('pop from empty stack')
+        return self._with_top(self._top[1], self._count - 1)
+
+    def limited(self, count: int) -> 'PersistentStack':
+        """
+        Stack of the top count items, the bottom ones are dropped. O(count)
+        """
+        return PersistentStack(reversed(list(islice(self, count))))
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> typing.Iterator:
+        """
+        Iterates from the top to the bottom
+        """
+        node = self._top
+        while node is not None:
+            yield node[0]
+            node = node[1]
+
+    def __repr__(self) -> str:
+        return f'PersistentStack({list(self)[::-1]!r})'
+
+    def __reduce__(self):
+        return PersistentStack, (list(self)[::-1],)
@@ -0,0 +1,97 @@
+import threading
+import typing
+from persistent_collections import PersistentMap
+
+# Strings are indexed by all their substrings of GRAM_SIZE characters,
+# shorter queries are looked for in all indexed strings
+GRAM_SIZE = 3
+
+
+def _grams(text: str) -> typing.Set[str]:
+    return {text[start:start + GRAM_SIZE] for start in range(len(text) - GRAM_SIZE + 1)}
+
+
+class SearchIndex:
+    """
+    Substring index of object texts, shared by all versions of a game. It keeps the texts of one version:
+    a search from another version first moves the index to it, which costs as much as the changes between
+    the versions (see PersistentMap.changes), so strings of old versions don't pile up.
+    Every distinct string is indexed once by its n-grams, strings like default descriptions are the same
+    for many objects, so they take memory only once
+    """
+    __slots__ = ('_postings', '_owners', '_search_texts', '_lock')
+
+    def __init__(self):
+        self._postings = {}  # n-gram -> strings that have it
+        self._owners = {}  # string -> ids of objects that have it
+        self._search_texts = PersistentMap()  # object id -> texts of the indexed version
+        self._lock = threading.Lock()
+
+    def _add(self, object_id, texts: typing.Iterable[str]) -> None:
+        for text in texts:
+            owners = self._owners.get(text)
+            if owners is None:
+                owners = self._owners[text] = set()
+                postings = self._postings
+                for gram in _grams(text):
+                    posting = postings.get(gram)
+                    if posting is None:
+                        postings[gram] = {text}
+                    else:
+                        posting.add(text)
+            owners.add(object_id)
+
+    def _remove(self, object_id, texts: typing.Iterable[str]) -> None:
+        for text in texts:
+            owners = self._owners[text]
+            owners.discard(object_id)
+            if owners:
+                continue
+            del self._owners[text]
+            for gram in _grams(text):
+                posting = self._postings[gram]
+                posting.discard(text)
+                if not posting:
+                    del self._postings[gram]
+
+    def _move_to(self, search_texts: PersistentMap) -> None:
+        for object_id, old_texts, new_texts in self._search_texts.changes(search_texts):
+            if old_texts is not None:
+                self._remove(object_id, old_texts)
+            if new_texts is not None:
+                self._add(object_id, new_texts)
+        self._search_texts = search_texts
+
+    def _matching_strings(self, query: str) -> typing.List[str]:
+        if len(query) < GRAM_SIZE:
+            return [text for text in self._owners if query in text]
+        postings = []
+        for gram in _grams(query):
+            posting = self._postings.get(gram)
+            if not posting:
+                return []
+            postings.append(posting)
+        postings.sort(key=len)
+        return [text for text in postings[0].intersection(*postings[1:]) if query in text]
+
+    def find(self, query: str, *, search_texts: PersistentMap) -> typing.Set:
+        """
+        Ids of objects that have a string containing query. search_texts (object id -> strings) is
+        the version of the game to search in
+        """
+        with self._lock:
+            self._move_to(search_texts)
+            found = set()
+            for text in self._matching_strings(query):
+                found.update(self._owners[text])
+            return found
+
+    def __len__(self) -> int:
+        """
+        Number of indexed strings
+        """
+        return len(self._owners)
+
+    def __reduce__(self):
+        # Nothing is saved, the first search indexes the texts of its game
+        return SearchIndex, ()
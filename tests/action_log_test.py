@@ -0,0 +1,59 @@
+import datetime
+import pickle
+from action_log import ColumnarActionLog
+from basic_types import Action, Value, change_value, LazyText
+from game import Game
+from tests.game_test import random_session
+
+
+def test_columnar_log_gives_equal_actions():
+    value = Value(value=1)
+    actions = [
+        Action(actual_value=value, duration_in_seconds=6, name='Create value'),
+        change_value(value_to_change=value, changing_function=lambda v: Value(value=2)),
+        Action(id='custom id', time=datetime.datetime.now(datetime.timezone.utc)),
+        Action(name='Mark', changes_value=False),
+    ]
+    log = ColumnarActionLog()
+    for action in actions:
+        log = log.append(action)
+    assert len(log) == 4
+    assert list(log) == actions
+    assert log[-2].id == 'custom id'
+    assert log[1:] == tuple(actions[1:])
+    assert not log[3].changes_value and log[2].changes_value
+    assert list(log.column('duration_in_seconds')) == [6, 0, 0, 0]
+    assert log.column('name')[0] == 'Create value'
+
+
+def test_columnar_log_formats_lazy_texts_only_when_actions_are_read():
+    name, description = LazyText('Action {}', 1), LazyText('Description {}', 2)
+    log = ColumnarActionLog([Action(name=name, short_description=description, full_description=description)])
+    log = log.append(Action(name=LazyText('Action {}', 3)))
+    assert name._text is None and description._text is None
+    assert log[0].name == 'Action 1' and log[0].full_description == 'Description 2'
+    assert log.column('name') == ['Action 1', 'Action 3']
+    assert name._text == 'Action 1' and description._text == 'Description 2'
+
+
+def test_columnar_log_versions():
+    base = ColumnarActionLog(Action() for _ in range(10))
+    first = base.append(Action(name='first'))
+    second = base.append(Action(name='second'))
+    assert len(base) == 10
+    assert first[-1].name == 'first'
+    assert second[-1].name == 'second'
+    assert pickle.loads(pickle.dumps(second)) == second
+
+
+def test_game_with_columnar_log():
+    game = random_session(seed=5, actions_number=100, snapshot_interval=10)
+    columnar_game = Game(actions_list=ColumnarActionLog(), snapshot_interval=10)
+    for action in game.actions_list:
+        columnar_game = columnar_game.make_action(action=action)
+    assert isinstance(columnar_game.actions_list, ColumnarActionLog)
+    assert columnar_game == game
+    action_id = game.actions_list[42].id
+    cancelled_columnar_game = columnar_game.cancel_action(action_id=action_id)
+    assert isinstance(cancelled_columnar_game.actions_list, ColumnarActionLog)
+    assert cancelled_columnar_game == game.cancel_action(action_id=action_id)
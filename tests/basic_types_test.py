@@ -1,5 +1,14 @@
+import copyreg
+import pickle
+import uuid
+import random
+import time
+import tracemalloc
+import typing
+import pytest
 from basic_types import Action, Value, Effect, change_value, roll_back_value, \
-    apply_effect_to_value, unapply_effect_from_value, Timer, subscribe_effect_to_timer, timer_tick, DiceThrow, Formula
+    apply_effect_to_value, unapply_effect_from_value, Timer, subscribe_effect_to_timer, timer_tick, DiceThrow, Formula, \
+    LazyText, apply_effect_to_values, timer_tick_unapplying_effects, NumericDelta
 from dataclasses import replace
 
 
@@ -338,6 +347,17 @@ def test_that_timer_tick_changes_timers_ticks():
     assert timer.seconds_passed == 70
 
 
+def test_that_timer_ticks_can_be_compacted():
+    timer = Timer(ticks=(20, 30))
+    timer = timer_tick(timer=timer, seconds=5).actual_value.value
+    compacted_timer = timer.compact_ticks()
+    assert len(compacted_timer.ticks) == 0
+    assert compacted_timer.seconds_passed == 55
+    compacted_timer = timer_tick(timer=compacted_timer, seconds=5).actual_value.value
+    assert compacted_timer.seconds_passed == 60
+    assert timer.seconds_passed == 55
+
+
 def test_that_timer_tick_can_be_undone():
     timer = Timer(name='My timer')
     assert timer.seconds_passed == 0
@@ -377,6 +397,36 @@ def test_that_timer_tick_finishes_effect():
     assert value.value == 10
 
 
+def test_that_timer_finishes_only_expired_effects():
+    effects = [Effect(name=f'Effect {i}', action=Action(), duration_in_seconds=i) for i in range(1, 101)]
+    effects.append(Effect(name='Endless effect', action=Action()))
+    timer = Timer()
+    for effect in effects:
+        timer = subscribe_effect_to_timer(effect=effect, timer=timer)
+    assert len(timer.expiry_queue) == 100  # endless effect never expires, so it is not in the queue
+
+    timer_after_tick = timer_tick(timer=timer, seconds=30).actual_value.value
+    finished = [e for e in effects if timer_after_tick.find_effect_by_id(effect_id=e.id).finished]
+    assert finished == effects[:30]
+    assert len(timer_after_tick.expiry_queue) == 70
+    assert not any(timer.find_effect_by_id(effect_id=e.id).finished for e in effects)  # old version is intact
+
+    timer_after_tick = timer_tick(timer=timer_after_tick, seconds=1000).actual_value.value
+    assert timer_after_tick.find_effect_by_id(effect_id=effects[-2].id).finished is True
+    assert timer_after_tick.find_effect_by_id(effect_id=effects[-1].id).finished is False
+
+
+def test_that_resubscribed_effect_uses_new_start_time():
+    effect = Effect(name='Effect for 10 seconds', action=Action(), duration_in_seconds=10)
+    timer = subscribe_effect_to_timer(effect=effect, timer=Timer())
+    timer = timer_tick(timer=timer, seconds=5).actual_value.value
+    timer = subscribe_effect_to_timer(effect=effect, timer=timer)
+    timer = timer_tick(timer=timer, seconds=5).actual_value.value
+    assert timer.find_effect_by_id(effect_id=effect.id).finished is False
+    timer = timer_tick(timer=timer, seconds=5).actual_value.value
+    assert timer.find_effect_by_id(effect_id=effect.id).finished is True
+
+
 def test_d20_throw():
     dice_throw = DiceThrow(minimal_possible_value=1, maximal_possible_value=20, name='d20 throw')
     throw_action = dice_throw.throw()
@@ -438,3 +488,243 @@ def test_complicated_formula():
     actions = formula.parse()
     total_roll_value = sum((a.actual_value.value for a in actions))
     assert total_roll_value == -2.0
+
+
+def test_that_value_actions_index_points_to_action_positions():
+    def increment(v: Value) -> Value:
+        return replace(v, value=v.value + 1)
+
+    value = Value(name='some', value=0)
+    versions = [value]
+    for _ in range(50):
+        versions.append(change_value(value_to_change=versions[-1], changing_function=increment).actual_value)
+    value = versions[-1]
+    for action_number, action in enumerate(value.actions_sequence):
+        assert value.actions_index[action.id] == action_number
+    assert value.actions_sequence[-1].id not in versions[20].actions_index
+    assert Value(value=0, actions_sequence=value.actions_sequence).actions_index == value.actions_index
+
+
+def test_that_value_history_memory_grows_linearly():
+    def increment(v: Value) -> Value:
+        return replace(v, value=v.value + 1)
+
+    def memory_per_change(changes_number: int) -> float:
+        tracemalloc.start()
+        value = Value(value=0)
+        for _ in range(changes_number):
+            value = change_value(value_to_change=value, changing_function=increment).actual_value
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return memory / changes_number
+
+    assert memory_per_change(2000) < 2 * memory_per_change(250)
+
+
+def test_core_types_are_slotted_and_pickled():
+    value = Value(value=5, name='hp')
+    action = Action(name='hit', previous_value=value, actual_value=replace(value, value=3))
+    for item in (value, action, Effect(name='bless', action=action), DiceThrow(minimal_possible_value=1, maximal_possible_value=6)):
+        assert not hasattr(item, '__dict__')
+        assert isinstance(item.id, int)
+        restored = pickle.loads(pickle.dumps(item))
+        assert restored == item
+        assert hash(restored) == hash(item)
+
+
+class OldPickle:
+    """
+    Pickled as an instance of cls with state as __dict__, the way classes without __slots__ are pickled
+    """
+    def __init__(self, cls, state: dict):
+        self.cls = cls
+        self.state = state
+
+    def __reduce__(self):
+        return copyreg._reconstructor, (self.cls, object, None), self.state
+
+
+def test_instances_pickled_before_slots_are_loaded():
+    value_id, action_id = uuid.uuid4(), uuid.uuid4()
+    old_value = OldPickle(Value, {'value': 5, 'name': 'hp', 'id': value_id, 'actions_sequence': (),
+                                  'subscribers': (), 'children': (), 'parent': None})
+    old_action = OldPickle(Action, {'id': action_id, 'name': 'hit', 'duration_in_seconds': 6, 'actual_value': old_value})
+    value_with_history = OldPickle(Value, {'value': 3, 'name': 'hp', 'id': value_id, 'actions_sequence': (old_action,)})
+    loaded_value = pickle.loads(pickle.dumps(value_with_history))
+    assert (loaded_value.value, loaded_value.name, loaded_value.id) == (3, 'hp', value_id)
+    assert loaded_value.actions_sequence[0] == Action(id=action_id, time=loaded_value.actions_sequence[0].time,
+                                                      name='hit', duration_in_seconds=6,
+                                                      actual_value=Value(value=5, name='hp', id=value_id))
+    assert loaded_value.actions_index[action_id] == 0
+    effect = pickle.loads(pickle.dumps(OldPickle(Effect, {'name': 'bless', 'action': old_action})))
+    assert (effect.name, effect.action.id, effect.target_ids) == ('bless', action_id, ())
+
+
+def test_lazy_action_names():
+    value = Value(value=1, name='hp')
+    action = change_value(value_to_change=value, changing_function=lambda v: Value(value=2))
+    assert isinstance(action.name, LazyText)
+    assert action.name == 'Changing value hp from 1 to 2'
+    assert hash(action.name) == hash('Changing value hp from 1 to 2')
+    assert f'[{action.name}]' == '[Changing value hp from 1 to 2]'
+    assert action.name.startswith('Changing')
+    restored = pickle.loads(pickle.dumps(action.name))
+    assert type(restored) is str and restored == action.name
+
+
+def test_lazy_text_works_as_str():
+    name = LazyText('Changing value {} from {} to {}', 'hp', 1, 2)
+    assert 'hp' in name and LazyText('{}', 'hp') in name and 'mp' not in name
+    assert name + '!' == 'Changing value hp from 1 to 2!'
+    assert '> ' + name == '> Changing value hp from 1 to 2'
+    assert name[0:3] == 'Cha' and name[-1] == '2'
+    assert sorted([name, 'a', LazyText('{}', 'Z')]) == ['Changing value hp from 1 to 2', 'Z', 'a']
+    assert name > 'B' and name <= LazyText('{}', 'Changing value hp from 1 to 2')
+    assert list(LazyText('{}', 'ab')) == ['a', 'b']
+    formula_roll = Formula(text_representation='d6+2').roll()
+    assert all(type(a.actual_value.name) is str for a in formula_roll.actions())
+
+
+def test_action_ids_and_times():
+    first, second = Action(), Action()
+    assert first.id != second.id
+    assert 0 < first.id < 1 << 128
+    assert first.time <= second.time
+    assert abs(first.time - time.time()) < 1
+
+
+def test_effect_application_to_many_values():
+    def fireball(v: Value) -> Value:
+        return replace(v, value=v.value - 28)
+
+    goblins = [Value(value=30 + i, name=f'Goblin {i}') for i in range(50)]
+    effect = Effect(name='Fireball', action=Action(function=fireball), duration_in_seconds=6)
+    burnt_goblins, group_effect = apply_effect_to_values(effect=effect, values=goblins)
+    assert [g.value for g in burnt_goblins] == [apply_effect_to_value(effect=effect, value=g)[0].value for g in goblins]
+    assert group_effect.target_ids == tuple(g.id for g in goblins)
+    assert len({id(g.last_action.short_description) for g in burnt_goblins}) == 1
+    assert roll_back_value(value=burnt_goblins[3]) == goblins[3]
+    timer = subscribe_effect_to_timer(effect=group_effect, timer=Timer())
+    assert len(timer.effects) == len(timer.expiry_queue) == 1
+
+
+def test_finished_effect_is_removed_from_all_its_values():
+    def bless(v: Value) -> Value:
+        return replace(v, value=v.value + 2)
+
+    def unbless(v: Value) -> Value:
+        return replace(v, value=v.value - 2)
+
+    allies = {v.id: v for v in (Value(value=i, name=f'Ally {i}') for i in range(40))}
+    others = {v.id: v for v in (Value(value=i) for i in range(100))}
+    blessed, bless_effect = apply_effect_to_values(
+            effect=Effect(name='Bless', action=Action(function=bless, rollback_function=unbless), duration_in_seconds=60),
+            values=allies.values())
+    marked, mark_effect = apply_effect_to_values(
+            effect=Effect(name='Mark', action=Action(function=bless), duration_in_seconds=6), values=blessed[:5])
+    timer = subscribe_effect_to_timer(effect=bless_effect, timer=Timer())
+    timer = subscribe_effect_to_timer(effect=mark_effect, timer=timer)
+    assert timer.target_ids(effect_id=bless_effect.id) == tuple(allies)
+    values = {**others, **{v.id: v for v in blessed}, **{v.id: v for v in marked}}
+
+    tick_action, unapplying_action = timer_tick_unapplying_effects(timer=timer, seconds=6, values=values)
+    assert unapplying_action is None  # Mark has no rollback function, it is only finished
+    timer = tick_action.actual_value.value
+    assert timer.find_effect_by_id(effect_id=mark_effect.id).finished
+
+    tick_action, unapplying_action = timer_tick_unapplying_effects(timer=timer, seconds=60, values=values)
+    changed_values = unapplying_action.actual_value.value
+    assert list(changed_values) == list(allies)
+    assert [v.value for v in changed_values.values()] == [a.value + 2 * (n < 5) for n, a in enumerate(allies.values())]
+    assert all(v.last_action.id == unapplying_action.id for v in changed_values.values())
+    first_ally = changed_values[blessed[0].id]
+    assert roll_back_value(value=first_ally) == values[first_ally.id]
+    assert tick_action.actual_value.value.find_effect_by_id(effect_id=bless_effect.id).finished
+
+
+def increment_by_2(v: Value) -> Value:
+    return replace(v, value=v.value + 2)
+
+
+def double(v: Value) -> Value:
+    return replace(v, value=v.value * 2)
+
+
+def test_rollback_of_deltas_gives_the_same_value_as_replay():
+    rng = random.Random(1)
+    for _ in range(30):
+        value = Value(value=100)
+        for _ in range(rng.randrange(1, 40)):
+            if rng.random() < 0.9:
+                changing_function = NumericDelta(amount=rng.choice((rng.randrange(-20, 20), rng.random())))
+            else:
+                changing_function = increment_by_2 if rng.random() < 0.5 else double
+            value = change_value(value_to_change=value, changing_function=changing_function).actual_value
+        for _ in range(3):
+            action = rng.choice(value.actions_sequence)
+            replayed_value = roll_back_value(value=value, action_id_to_rollback=action.id, replay=True)
+            rolled_back_value = roll_back_value(value=value, action_id_to_rollback=action.id)
+            assert rolled_back_value.value == pytest.approx(replayed_value.value)
+            value = rolled_back_value
+
+
+def with_operations(value: Value, operations: list) -> typing.Tuple[Value, list]:
+    # Plain changes, Bless applications and their removals by unapply_effect_from_value or by the timer.
+    # Gives the value and ids of the change actions
+    effects, change_ids = [], []
+    for operation, changing_function in operations:
+        if operation == 'change':
+            value = change_value(value_to_change=value, changing_function=changing_function).actual_value
+            change_ids.append(value.last_action.id)
+        elif operation == 'bless':
+            value, effect = apply_effect_to_value(value=value, effect=Effect(
+                    name='Bless', action=Action(function=increment_by_2, rollback_function=NumericDelta(amount=-2)),
+                    duration_in_seconds=1))
+            effects.append(effect)
+        elif operation == 'unapply':
+            value = unapply_effect_from_value(effect=effects.pop(), value=value, rollback_function=NumericDelta(amount=-2))
+        else:
+            timer = subscribe_effect_to_timer(effect=effects.pop(), timer=Timer())
+            _, unapplying_action = timer_tick_unapplying_effects(timer=timer, seconds=1, values={value.id: value})
+            value = unapplying_action.actual_value.value[value.id]
+    return value, change_ids
+
+
+def test_rollback_with_effects_gives_the_same_value_as_history_without_the_action():
+    rng = random.Random(2)
+    for _ in range(30):
+        operations, blessings = [], 0
+        for _ in range(rng.randrange(1, 30)):
+            dice = rng.random()
+            if dice < 0.2:
+                operations.append(('bless', None))
+                blessings += 1
+            elif dice < 0.4 and blessings:
+                operations.append((rng.choice(('unapply', 'expire')), None))
+                blessings -= 1
+            else:
+                operations.append(('change', rng.choice((NumericDelta(amount=rng.randrange(-20, 20)), double))))
+        changes = [n for n, (operation, _) in enumerate(operations) if operation == 'change']
+        if not changes:
+            continue
+        value, change_ids = with_operations(Value(value=10), operations)
+        change_number = rng.randrange(len(changes))
+        operations_without_change = operations[:changes[change_number]] + operations[changes[change_number] + 1:]
+        expected_value = with_operations(Value(value=10, id=value.id), operations_without_change)[0].value
+        for replay in (False, True):
+            rolled_back_value = roll_back_value(value=value, action_id_to_rollback=change_ids[change_number],
+                                                replay=replay).value
+            assert rolled_back_value == expected_value
+
+
+def test_delta_is_rolled_back_without_replay():
+    value = Value(value=50)
+    for amount in (-5, -7, 3):
+        value = change_value(value_to_change=value, changing_function=NumericDelta(amount=amount)).actual_value
+    middle_action = value.actions_sequence[1]
+    rolled_back_value = roll_back_value(value=value, action_id_to_rollback=middle_action.id)
+    assert rolled_back_value.value == 48
+    assert list(rolled_back_value.actions_sequence[:3]) == list(value.actions_sequence)
+    assert rolled_back_value.last_action.function == NumericDelta(amount=7)
+    assert roll_back_value(value=rolled_back_value, action_id_to_rollback=middle_action.id) == rolled_back_value
+    assert roll_back_value(value=rolled_back_value) == value
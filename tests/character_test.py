@@ -1,5 +1,7 @@
+import pytest
+from dacite import WrongTypeError
 from game import Game
-from character import Character
+from character import Character, WrongFieldTypeError
 
 
 def test_changing_character_parameters():
@@ -34,3 +36,23 @@ def test_change_several_parameters():
     assert kolobok.strength == 14
     assert kolobok.dexterity == 8
     assert not hasattr(kolobok, 'stupidity')
+
+
+def test_changing_fields_checks_types_and_skips_unknown_fields():
+    kolobok = Character(name='Kolobok')
+    assert kolobok.change_field(field_name='stupidity', new_value=22) is kolobok
+    changed = kolobok.change_several_fields(name_value_dict={'strength': 14, 'stupidity': 22})
+    assert (changed.strength, changed.name, changed.id) == (14, 'Kolobok', kolobok.id)
+    assert kolobok.strength == 0
+    with pytest.raises(WrongTypeError, match='wrong value type for field "strength" - should be "int"'):
+        kolobok.change_field(field_name='strength', new_value='very strong')
+    with pytest.raises(WrongFieldTypeError):
+        kolobok.change_field(field_name='relationships', new_value={'friend': ()})
+    assert kolobok.change_field(field_name='relationships', new_value={}).relationships == {}
+
+
+def test_changing_fields_of_many_characters():
+    party = [Character(name=name) for name in ('Gimli', 'Legolas', 'Aragorn')]
+    changed_party = Character.change_fields_of_characters(characters=party, name_value_dict={'dexterity': 18})
+    assert [c.dexterity for c in changed_party] == [18, 18, 18]
+    assert [c.name for c in changed_party] == ['Gimli', 'Legolas', 'Aragorn']
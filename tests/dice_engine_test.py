@@ -0,0 +1,154 @@
+import itertools
+import os
+import pickle
+import pytest
+import dice_engine
+from dice_engine import roll_dice, negated, results_sum, dice_distribution, simulate, DiceRng
+from basic_types import Formula, DiceThrow
+from dnd_types import Roll
+
+
+def check_roll_dice():
+    results = roll_dice(quantity=1000, minimal_possible_value=1, maximal_possible_value=6)
+    assert len(results) == 1000
+    assert set(results.tolist()) == {1, 2, 3, 4, 5, 6}
+    assert results_sum(results) == sum(results.tolist())
+    assert results_sum(negated(results)) == -results_sum(results)
+    assert roll_dice(quantity=3, minimal_possible_value=0, maximal_possible_value=0).tolist() == [0, 0, 0]
+
+
+def test_roll_dice():
+    check_roll_dice()
+
+
+def test_roll_dice_without_numpy(monkeypatch):
+    monkeypatch.setattr(dice_engine, 'numpy', None)
+    check_roll_dice()
+
+
+def test_formula_roll_doesnt_create_actions_until_requested():
+    formula_roll = Formula(text_representation='100d6 - 2d1 + 5').roll()
+    assert 100 + 3 <= formula_roll.total <= 600 + 3
+    assert len(formula_roll.results[0]) == 100
+    actions = formula_roll.actions()
+    assert len(actions) == 103
+    assert sum(a.actual_value.value for a in actions) == formula_roll.total
+    assert actions[100].actual_value.value == -1
+    assert actions[0].name == 'Action for DiceThrow "Dice d6 throw 1 for token 1 for formula [100d6 - 2d1 + 5]"'
+
+
+def brute_force_counts(dice, constant):
+    counts = {}
+    for throws in itertools.product(*(range(1, abs(sides) + 1) for sides in dice)):
+        total = constant + sum(-t if sides < 0 else t for t, sides in zip(throws, dice))
+        counts[total] = counts.get(total, 0) + 1
+    return counts
+
+
+def test_formula_distribution_is_exact():
+    distribution = Formula(text_representation='4d6-1d4+2').distribution()
+    counts = brute_force_counts((6, 6, 6, 6, -4), 2)
+    assert (distribution.minimum, distribution.maximum) == (min(counts), max(counts))
+    assert sum(distribution.probabilities) == pytest.approx(1)
+    for total, count in counts.items():
+        assert distribution.probability(total) == pytest.approx(count / sum(counts.values()))
+
+
+def test_distribution_statistics():
+    distribution = Formula(text_representation='8d6+3').distribution()
+    assert distribution.mean == pytest.approx(31)
+    assert distribution.variance == pytest.approx(8 * 35 / 12)
+    assert distribution.percentile(50) == 31
+    assert distribution.percentile(0) == 11
+    assert distribution.percentile(100) == 51
+    assert distribution.probability_at_least(11) == 1
+    assert distribution.probability_at_least(51) == pytest.approx(1 / 6 ** 8)
+    assert distribution.probability_at_least(52) == 0
+    assert Formula(text_representation='8d6+3').distribution() is distribution
+
+
+def test_large_distribution_with_fft_matches_direct_convolution(monkeypatch):
+    fft_distribution = Formula(text_representation='300d6').distribution()
+    assert fft_distribution.mean == pytest.approx(1050)
+    assert fft_distribution.variance == pytest.approx(300 * 35 / 12)
+    dice_distribution.cache_clear()
+    monkeypatch.setattr(dice_engine, 'numpy', None)
+    python_distribution = dice_distribution(quantity=300, minimal_possible_value=1, maximal_possible_value=6)
+    dice_distribution.cache_clear()
+    assert python_distribution.minimum == fft_distribution.minimum
+    assert python_distribution.probabilities == pytest.approx(fft_distribution.probabilities, abs=1e-12)
+
+
+def test_simulation_is_reproducible_with_any_number_of_processes(monkeypatch):
+    monkeypatch.setattr(dice_engine, 'SIMULATION_CHUNK_DICE', 1000)
+    totals = simulate(text_representation='8d6 + 3', rolls_number=1000, seed=42)
+    assert len(totals) == 1000
+    assert 11 <= min(totals) and max(totals) <= 51
+    assert totals.tolist() == simulate(text_representation='8d6 + 3', rolls_number=1000, seed=42,
+                                       processes=3).tolist()
+    assert totals.tolist() != simulate(text_representation='8d6 + 3', rolls_number=1000, seed=43).tolist()
+
+
+def test_simulation_matches_distribution():
+    formula = Formula(text_representation='4d6 - 1d4 + 2')
+    totals = Roll(type='attack', formula=formula).simulate(rolls_number=200_000, seed=1)
+    assert sum(totals.tolist()) / len(totals) == pytest.approx(formula.distribution().mean, abs=0.05)
+
+
+def test_simulation_without_numpy(monkeypatch):
+    monkeypatch.setattr(dice_engine, 'numpy', None)
+    monkeypatch.setattr(dice_engine, 'SIMULATION_CHUNK_DICE', 100)
+    totals = simulate(text_representation='d20 - 2d1', rolls_number=500, seed=7)
+    assert len(totals) == 500
+    assert set(totals.tolist()) == set(range(-1, 19))
+    assert totals == simulate(text_representation='d20 - 2d1', rolls_number=500, seed=7)
+
+
+def check_dice_rng():
+    rng = DiceRng(seed=5)
+    first = rng.roll_dice(quantity=10, minimal_possible_value=1, maximal_possible_value=20).tolist()
+    second = rng.roll_dice(quantity=10, minimal_possible_value=1, maximal_possible_value=20).tolist()
+    assert rng.position == 2
+    assert first != second
+    resumed = pickle.loads(pickle.dumps(DiceRng(seed=5, position=1)))
+    assert resumed.roll_dice(quantity=10, minimal_possible_value=1, maximal_possible_value=20).tolist() == second
+
+
+def test_dice_rng():
+    check_dice_rng()
+
+
+def test_dice_rng_without_numpy(monkeypatch):
+    monkeypatch.setattr(dice_engine, 'numpy', None)
+    check_dice_rng()
+
+
+def test_throws_with_the_same_seed_are_repeated():
+    def throws(seed):
+        rng = DiceRng(seed=seed)
+        dice_throw = DiceThrow(minimal_possible_value=1, maximal_possible_value=100, rng=rng)
+        formula = Formula(text_representation='10d20 - d4 + 3')
+        roll = Roll(type='attack', formula=formula, rng=rng)
+        return ([dice_throw.throw().actual_value.value for _ in range(5)],
+                [a.actual_value.value for a in dice_throw.several_throws(5)],
+                formula.roll(rng=rng).total,
+                Formula(text_representation='3d6', rng=rng).roll().total,
+                roll.value)
+
+    assert throws(1) == throws(1)
+    assert throws(1) != throws(2)
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_forked_process_rolls_other_dice():
+    read_end, write_end = os.pipe()
+    child_pid = os.fork()
+    if child_pid == 0:
+        os.write(write_end, pickle.dumps(list(roll_dice(quantity=20, minimal_possible_value=1,
+                                                        maximal_possible_value=1000))))
+        os._exit(0)
+    os.close(write_end)
+    with os.fdopen(read_end, 'rb') as child_output:
+        child_rolls = pickle.loads(child_output.read())
+    os.waitpid(child_pid, 0)
+    assert child_rolls != list(roll_dice(quantity=20, minimal_possible_value=1, maximal_possible_value=1000))
@@ -0,0 +1,63 @@
+import random
+from concurrent.futures import ThreadPoolExecutor
+from formula_parser import compile_formula, FormulaCache, formula_cache_info, set_formula_cache_size, formula_cache, \
+    parse_formula_string, parse_formula_string_with_ply
+
+
+def test_compile_formula():
+    terms = compile_formula('3d6 - 2 + к4')
+    assert [t.is_dice for t in terms] == [True, False, True]
+    assert (terms[0].dice_quantity, terms[0].dice_min, terms[0].dice_max) == (3, 1, 6)
+    assert terms[1].number == -2.0
+    assert (terms[2].dice_quantity, terms[2].dice_max, terms[2].is_negative) == (1, 4, False)
+
+
+def test_formula_cache_hits_and_misses():
+    cache = FormulaCache(maxsize=2)
+    first_terms = cache.get('1d20+5')
+    assert cache.get('1d20+5') is first_terms
+    cache.get('2d6')
+    cache.get('3d8')  # 1d20+5 is the least recently used, so it is removed
+    cache.get('1d20+5')
+    info = cache.info()
+    assert (info.hits, info.misses, info.maxsize, info.currsize) == (1, 4, 2, 2)
+    cache.resize(1)
+    assert cache.info().currsize == 1
+
+
+def test_global_formula_cache():
+    formula_cache.clear()
+    compile_formula('1d20+5')
+    compile_formula('1d20+5')
+    assert formula_cache_info().hits == 1
+    assert formula_cache_info().misses == 1
+    set_formula_cache_size(0)
+    compile_formula('1d20+5')
+    assert formula_cache_info().currsize == 0
+    set_formula_cache_size(1024)
+
+
+def test_tokenizer_gives_the_same_tokens_as_ply():
+    rng = random.Random(5)
+    strings = ['6d6 + 5 корова -к6 + 15 +-ddd20', '', 'd', '12д', '\t3d6\n']
+    strings += [''.join(rng.choices('0123456789dкд+- x\t', k=rng.randrange(30))) for _ in range(2000)]
+    for string in strings:
+        assert [(t.type, t.value, t.lexpos) for t in parse_formula_string(string)] == \
+               [(t.type, t.value, t.lexpos) for t in parse_formula_string_with_ply(string)]
+
+
+def test_tokenizing_from_many_threads():
+    formulas = {f'{n}d{n + 2} + {n}': [('dice', f'{n}d{n + 2}'), ('sign', '+'), ('number', str(n))]
+                for n in range(1, 50)}
+
+    def tokenize(parse):
+        for _ in range(20):
+            for text, expected in formulas.items():
+                if [(t.type, t.value) for t in parse(text)] != expected:
+                    return False
+        return True
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = [executor.submit(tokenize, parse)
+                   for parse in (parse_formula_string, parse_formula_string_with_ply) * 8]
+    assert all(result.result() for result in results)
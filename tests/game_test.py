@@ -1,6 +1,15 @@
+import os
+import pickle
+import random
+from dataclasses import replace
+import pytest
 from game import Game
-from basic_types import Value, Action, change_value
+from game_storage import GameJournalError
+from basic_types import Value, Action, Effect, change_value, roll_back_value, Formula, apply_effect_to_values, \
+    subscribe_effect_to_timer
 from character import Character
+from action_log import ColumnarActionLog
+from persistent_collections import PersistentVector
 
 
 def test_new_game_creation():
@@ -88,15 +97,34 @@ def test_cancel_object_creation_action():
     assert len(game.objects_dict) == 1
 
 
-def test_save_and_load():
+def test_save_and_load(tmp_path):
     game = Game()
     game = game.make_action(action=Action(actual_value=Value(value=42)))
-    save_game_result = game.save_to_disk(filename='test_save_and_load.game')
+    save_game_result = game.save_to_disk(filename=str(tmp_path / 'test_save_and_load.game'))
     assert save_game_result == 'OK'
-    loaded_game = Game.load_from_disk(filename='test_save_and_load.game')
+    loaded_game = Game.load_from_disk(filename=str(tmp_path / 'test_save_and_load.game'))
     assert loaded_game == game
 
 
+def test_game_saved_before_persistent_collections_is_loaded():
+    # Pickled by the first version of Game: plain tuple and dicts, UUID ids, no search index
+    game = Game.load_from_disk(filename=os.path.join(os.path.dirname(__file__), 'data', 'baseline_game.pickle'))
+    assert [v.value for v in game.objects_dict.values()][1] == 42
+    kolobok = list(game.objects_dict.values())[0]
+    assert kolobok.value.strength == 16 and kolobok.value.name == 'Kolobok'
+    assert len(game.actions_list) == 3 and game.timer.seconds_passed == 13
+    assert game.timer.find_effect_by_id(effect_id=next(iter(game.timer.effects))).name == 'Bless'
+    answer = game.actions_list[2].actual_value
+    assert game.full_text_search(text_to_search='Answer') == {answer.id: answer}
+    game = game.make_action(action=Character.change_character_field_action(
+            container_value=kolobok, field_name='dexterity', new_field_value=12))
+    assert list(game.objects_dict.values())[0].value.dexterity == 12
+    game = game.cancel_action_by_number(0)
+    assert len(game.objects_dict) == 1
+    game = game.make_action(action=Action(actual_value=Value(value=0), duration_in_seconds=60))
+    assert game.timer.effects[next(iter(game.timer.effects))].effect.finished
+
+
 def test_that_long_actions_change_timer():
     game = Game()
     game = game.make_action(action=Action(actual_value=Value(value=42), duration_in_seconds=13))
@@ -140,3 +168,430 @@ def test_changing_character_parameters():
     assert kolobok.strength == 0
     game = game.cancel_last_action()
     assert len(game.objects_dict) == 0
+
+
+def test_that_previous_game_versions_are_not_changed_by_new_actions():
+    game = Game()
+    versions = [game]
+    for i in range(100):
+        game = game.make_action(action=Action(actual_value=Value(value=i)))
+        versions.append(game)
+    assert len(versions[50].objects_dict) == 50
+    assert len(versions[50].actions_list) == 50
+    assert [v.value for v in versions[100].objects_dict.values()] == list(range(100))
+
+
+def random_session(*, seed: int, actions_number: int, snapshot_interval: int) -> Game:
+    rng = random.Random(seed)
+    game = Game(snapshot_interval=snapshot_interval)
+    for i in range(actions_number):
+        objects = list(game.objects_dict.values())
+        dice = rng.random()
+        if not objects or dice < 0.15:
+            action = Action(actual_value=Value(value=i), duration_in_seconds=rng.choice((0, 6)))
+        elif dice < 0.2:
+            action = Action(actual_value=rng.choice(objects))  # object is created once again
+        elif dice < 0.23:
+            source, target = rng.choice(objects), rng.choice(objects)
+            action = Action(previous_value=source, actual_value=replace(target, value=source.value))
+        else:
+            old_value = rng.choice(objects)
+            action = Action(previous_value=old_value,
+                            actual_value=replace(old_value, value=old_value.value + 1),
+                            duration_in_seconds=rng.choice((0, 1, 60)))
+        game = game.make_action(action=action)
+    return game
+
+
+def test_that_cancel_from_snapshot_gives_the_same_result_as_full_replay():
+    for seed in range(20):
+        game = random_session(seed=seed, actions_number=120, snapshot_interval=7)
+        rng = random.Random(seed)
+        for _ in range(4):
+            action_id = rng.choice(game.actions_list).id
+            game_from_snapshot = game.cancel_action(action_id=action_id)
+            fully_replayed_game = replace(game, snapshot_interval=0).cancel_action(action_id=action_id)
+            assert game_from_snapshot == fully_replayed_game
+            assert list(game_from_snapshot.objects_dict) == list(fully_replayed_game.objects_dict)
+            assert [game_from_snapshot.action_position(action_id=a.id) for a in game.actions_list] == \
+                [fully_replayed_game.action_position(action_id=a.id) for a in game.actions_list]
+            game = game_from_snapshot
+
+
+def test_that_snapshots_are_made_every_interval():
+    game = Game(snapshot_interval=10)
+    for i in range(35):
+        game = game.make_action(action=Action(actual_value=Value(value=i)))
+    assert [s.actions_count for s in game.snapshots] == [10, 20, 30]
+    assert len(game.snapshots[1].objects_dict) == 20
+    game = game.cancel_action_by_number(action_number=25)
+    assert [s.actions_count for s in game.snapshots] == [10, 20]
+
+
+def test_that_snapshots_are_not_saved_and_made_again_on_cancel():
+    game = random_session(seed=3, actions_number=120, snapshot_interval=7)
+    loaded_game = pickle.loads(pickle.dumps(game))
+    assert len(loaded_game.snapshots) == 0
+    assert len(pickle.dumps(game)) == len(pickle.dumps(replace(game, snapshots=type(game.snapshots)())))
+    assert loaded_game.actions_index == game.actions_index
+    action_id = game.actions_list[50].id
+    cancelled_game = loaded_game.cancel_action(action_id=action_id)
+    expected_game = game.cancel_action(action_id=action_id)
+    assert cancelled_game == expected_game
+    assert [s.actions_count for s in cancelled_game.snapshots] == [s.actions_count for s in expected_game.snapshots]
+
+
+def test_that_actions_index_points_to_action_positions():
+    game = random_session(seed=1, actions_number=200, snapshot_interval=50)
+    assert len(game.actions_index) == len(game.actions_list)
+    for action_number, action in enumerate(game.actions_list):
+        assert game.actions_index[action.id] == action_number
+    previous_game = game
+    game = game.make_action(action=Action(actual_value=Value(value='new')))
+    assert game.actions_index[game.last_action.id] == len(game.actions_list) - 1
+    assert game.last_action.id not in previous_game.actions_index
+
+
+def test_creation_is_cancelled_without_replay(monkeypatch):
+    game = Game(snapshot_interval=10)
+    for i in range(30):
+        game = game.make_action(action=Action(actual_value=Value(value=i, name=f'Goblin {i}')))
+    goblin, other = (game.objects_dict[game.actions_list[n].actual_value.id] for n in (25, 27))
+    game = game.make_action(action=Action(previous_value=goblin, actual_value=replace(goblin, value=100)))
+    game = game.make_action(action=Action(previous_value=goblin, actual_value=replace(other, value=100)))
+    game = game.make_action(action=Action(actual_value=Value(value='after')))
+
+    monkeypatch.setattr(Game, 'make_action', None)
+    monkeypatch.setattr(Game, 'make_actions', None)
+    cancelled_game = game.cancel_action(action_id=game.actions_list[25].id)
+    assert goblin.id not in cancelled_game.objects_dict
+    assert cancelled_game.objects_dict[other.id] == other
+    assert len(cancelled_game.actions_list) == 30
+    assert not cancelled_game.full_text_search(text_to_search='Goblin 25')
+    assert [cancelled_game.action_position(action_id=a.id) for a in cancelled_game.actions_list] == list(range(30))
+    assert [s.actions_count for s in cancelled_game.snapshots] == [10, 20]
+    monkeypatch.undo()
+    cancelled_game = cancelled_game.cancel_action(action_id=cancelled_game.last_action.id)
+    assert cancelled_game == replace(game, snapshot_interval=0).cancel_action_by_number(25).cancel_last_action()
+
+
+def test_creation_is_cancelled_after_ticks_compaction():
+    game = Game()
+    for seconds in (5, 7):
+        game = game.make_action(action=Action(actual_value=Value(value=seconds), duration_in_seconds=seconds))
+    game = replace(game, timer=game.timer.compact_ticks())
+    game = game.make_action(action=Action(actual_value=Value(value=11), duration_in_seconds=11))
+    for position, seconds_left in ((1, 16), (0, 18)):
+        cancelled_game = game.cancel_action_by_number(position)
+        assert cancelled_game.timer.seconds_passed == seconds_left
+        assert cancelled_game == replace(game, snapshot_interval=0).cancel_action_by_number(position)
+
+
+def test_game_rolls_are_repeated_with_the_same_seed():
+    def play(game):
+        totals = []
+        for text_representation in ('d20 + 5', '8d6', 'd20 + 5'):
+            game, formula_roll = game.roll(formula=Formula(text_representation=text_representation))
+            totals.append(formula_roll.total)
+            game = game.make_action(action=Action(actual_value=Value(value=formula_roll.total)))
+        return game, totals
+
+    game, totals = play(Game())
+    assert game.dice_position == 3
+    replayed_game, replayed_totals = play(Game(dice_seed=game.dice_seed))
+    assert replayed_totals == totals
+    loaded_game = pickle.loads(pickle.dumps(game))
+    assert (loaded_game.dice_seed, loaded_game.dice_position) == (game.dice_seed, game.dice_position)
+    assert play(loaded_game)[1] == play(game)[1]
+    cancelled_game = game.cancel_last_action()
+    assert (cancelled_game.dice_seed, cancelled_game.dice_position) == (game.dice_seed, 3)
+
+
+def linear_search(game: Game, text_to_search: str) -> dict:
+    # full_text_search before the search index
+    return {k: v for k, v in game.objects_dict.items() if
+            text_to_search in v.name or
+            text_to_search in v.short_description or
+            text_to_search in v.full_description or
+            text_to_search in str(v.value)}
+
+
+def test_full_text_search_gives_the_same_results_as_linear_search():
+    queries = ('', '1', '12', '123', '1234', 'value', 'Noname', 'description', 'Gimli', 'Gandalf', 'xyz', "'")
+    for seed in range(5):
+        game = random_session(seed=seed, actions_number=150, snapshot_interval=9)
+        game = game.add_character('Gimli').add_character('Gandalf the Grey')
+        rng = random.Random(seed)
+        versions = [game]
+        for _ in range(4):
+            versions.append(versions[-1].cancel_action(action_id=rng.choice(versions[-1].actions_list).id))
+        # an older branch keeps its own results after newer versions add texts to the shared index
+        versions.append(versions[1].make_action(action=Action(actual_value=Value(value='1234 Gandalf'))))
+        versions.append(pickle.loads(pickle.dumps(versions[-1])))
+        for version in versions:
+            for query in queries:
+                found = version.full_text_search(text_to_search=query)
+                expected = linear_search(version, query)
+                assert found == expected
+                assert list(found) == list(expected)
+
+
+def test_search_index_keeps_texts_of_one_version():
+    game = Game().add_character('Gimli')
+    gimli = game.last_action.actual_value
+    versions = [game]
+    for strength in range(1, 200):
+        gimli = game.objects_dict[gimli.id]
+        game = game.make_action(action=Character.change_character_field_action(
+                container_value=gimli, field_name='strength', new_field_value=strength))
+        versions.append(game)
+        assert game.full_text_search(text_to_search=f'strength={strength},') == {gimli.id: game.objects_dict[gimli.id]}
+    assert len(game.search_index) == 4
+    assert versions[5].full_text_search(text_to_search='strength=5,')
+    assert not versions[5].full_text_search(text_to_search='strength=199,')
+    assert game.undo().full_text_search(text_to_search='strength=198,')
+    assert len(game.search_index) == 4
+
+
+def double(value: Value) -> Value:
+    return replace(value, value=value.value * 2)
+
+
+def test_binary_save_and_load(tmp_path):
+    game = Game(name='Binary')
+    game = game.make_action(action=Action(actual_value=Value(value=42, name='Answer'), duration_in_seconds=6))
+    game = game.add_character('Gimli')
+    hit_points = Value(value=10, name='Hit points', short_description='HP')
+    game = game.make_action(action=Action(actual_value=hit_points))
+    game = game.make_action(action=change_value(value_to_change=hit_points, changing_function=lambda v: Value(-3)))
+    game = game.make_action(action=Action(previous_value=hit_points, actual_value=double(hit_points),
+                                          function=double))
+    filename = str(tmp_path / 'binary.game')
+    assert game.save_to_disk(filename=filename, file_format='binary') == 'OK'
+    assert game.save_to_disk(filename=str(tmp_path / 'pickle.game'), file_format='pickle') != 'OK'  # lambda
+
+    loaded_game = Game.load_from_disk(filename=filename)
+    assert (loaded_game.name, loaded_game.timer, loaded_game.dice_seed) == (game.name, game.timer, game.dice_seed)
+    assert list(loaded_game.objects_dict) == list(game.objects_dict)
+    for object_id, game_object in game.objects_dict.items():
+        loaded_object = loaded_game.objects_dict[object_id]
+        assert (loaded_object.value, loaded_object.name, loaded_object.short_description) == \
+               (game_object.value, game_object.name, game_object.short_description)
+    assert len(loaded_game.actions_list) == 5
+    assert [a.name for a in loaded_game.actions_list] == [a.name for a in game.actions_list]
+    assert loaded_game.actions_list[1] == game.actions_list[1]
+    assert loaded_game.actions_list[-1].function is double
+    assert loaded_game.actions_list[3].function is None  # lambdas are not saved
+    assert loaded_game.actions_list[3].rollback_function() == loaded_game.actions_list[3].previous_value
+    assert loaded_game.actions_index == game.actions_index
+
+    cancelled_game = loaded_game.cancel_action(action_id=game.actions_list[3].id)
+    assert cancelled_game.objects_dict[hit_points.id].value == 20
+    continued_game = loaded_game.make_action(action=Action(actual_value=Value(value=1)))
+    assert len(continued_game.actions_list) == 6
+    assert pickle.loads(pickle.dumps(continued_game)) == continued_game
+
+
+def test_binary_file_of_simple_game_is_loaded_equal(tmp_path):
+    game = random_session(seed=1, actions_number=300, snapshot_interval=50)
+    filename = str(tmp_path / 'session.game')
+    assert game.save_to_disk(filename=filename, file_format='binary') == 'OK'
+    loaded_game = Game.load_from_disk(filename=filename)
+    assert loaded_game == game
+    assert loaded_game.full_text_search(text_to_search='12') == game.full_text_search(text_to_search='12')
+
+
+def test_binary_file_keeps_actions_which_do_not_change_values(tmp_path):
+    game = Game().make_action(action=Action(actual_value=Value(value=1)))
+    game = game.make_action(action=Action(actual_value=Value(value=2), changes_value=False))
+    filename = str(tmp_path / 'marks.game')
+    assert game.save_to_disk(filename=filename, file_format='binary') == 'OK'
+    loaded_game = Game.load_from_disk(filename=filename)
+    assert [a.changes_value for a in loaded_game.actions_list] == [True, False]
+    assert loaded_game == game
+
+
+def test_binary_game_is_saved_over_its_own_file(tmp_path):
+    game = random_session(seed=2, actions_number=200, snapshot_interval=50)
+    filename = str(tmp_path / 'session.game')
+    assert game.save_to_disk(filename=filename, file_format='binary') == 'OK'
+    loaded_game = Game.load_from_disk(filename=filename)
+    continued_game = loaded_game.make_action(action=Action(actual_value=Value(value=1)))
+    assert continued_game.save_to_disk(filename=filename, file_format='binary') == 'OK'
+    assert list(loaded_game.actions_list) == list(game.actions_list)
+    reloaded_game = Game.load_from_disk(filename=filename)
+    assert reloaded_game == continued_game
+    loaded_game.close()
+    reloaded_game.close()
+
+
+def journal_session(game: Game, first_number: int, actions_number: int) -> Game:
+    for i in range(first_number, first_number + actions_number):
+        game = game.make_action(action=Action(actual_value=Value(value=i), duration_in_seconds=1))
+    return game
+
+
+def test_game_is_recovered_from_journal(tmp_path):
+    filename = str(tmp_path / 'session.journal')
+    game = journal_session(Game.open_journal(filename=filename, sync_every=1), 0, 20)
+    game = game.cancel_action(action_id=game.actions_list[5].id)
+    game, _ = game.roll(formula=Formula(text_representation='2d6'))
+    # the process "crashes": the journal is not closed
+    recovered_game = Game.open_journal(filename=filename)
+    assert recovered_game == game
+    assert len(recovered_game.actions_list) == 19
+    assert (recovered_game.dice_seed, recovered_game.dice_position) == (game.dice_seed, game.dice_position)
+
+
+def test_journal_group_commit_and_torn_record(tmp_path):
+    filename = str(tmp_path / 'session.journal')
+    game = journal_session(Game.open_journal(filename=filename, sync_every=10, sync_interval=3600), 0, 15)
+    # the first batch is the dice seed and 9 actions, the second one is not synced yet
+    assert len(Game.open_journal(filename=filename).actions_list) == 9
+    game.journal.sync()
+    with open(filename, 'ab') as journal_file:
+        journal_file.write(b'\x30\x00\x00\x00torn')
+    recovered_game = Game.open_journal(filename=filename)
+    assert recovered_game == game
+    recovered_game = journal_session(recovered_game, 15, 1)
+    recovered_game.journal.close()
+    assert len(Game.open_journal(filename=filename).actions_list) == 16
+
+
+def test_journal_checkpoint(tmp_path):
+    filename = str(tmp_path / 'session.journal')
+    game = journal_session(Game.open_journal(filename=filename, sync_every=1), 0, 50)
+    with open(filename, 'rb') as journal_file:
+        journal_before_checkpoint = journal_file.read()
+    assert game.checkpoint() == 'OK'
+    assert os.path.getsize(filename) < 100
+    game = journal_session(game, 50, 5)
+    assert Game.open_journal(filename=filename) == game
+
+    # crash right after the checkpoint was written: the old journal must not be replayed once again
+    game.journal.close()
+    with open(filename, 'wb') as journal_file:
+        journal_file.write(journal_before_checkpoint)
+    recovered_game = Game.open_journal(filename=filename)
+    assert len(recovered_game.actions_list) == 50
+    assert os.path.getsize(filename) < 100
+
+
+def test_journal_keeps_histories_of_values(tmp_path):
+    filename = str(tmp_path / 'session.journal')
+    hit_points = Value(value=10, name='Hit points')
+    game = Game.open_journal(filename=filename, sync_every=1).make_action(action=Action(actual_value=hit_points))
+    game = game.make_action(action=change_value(value_to_change=hit_points, changing_function=double))
+    assert game.checkpoint() == 'OK'
+    for _ in range(2):
+        hit_points = game.objects_dict[hit_points.id]
+        game = game.make_actions(actions=[change_value(value_to_change=hit_points, changing_function=double)])
+    recovered_game = Game.open_journal(filename=filename)
+    assert recovered_game == game
+    recovered_points = recovered_game.objects_dict[hit_points.id]
+    assert len(recovered_points.actions_sequence) == 3
+    assert roll_back_value(value=recovered_points).value == 40
+    first_change_id = game.actions_list[1].id
+    assert roll_back_value(value=recovered_points, action_id_to_rollback=first_change_id).value == \
+           roll_back_value(value=game.objects_dict[hit_points.id], action_id_to_rollback=first_change_id).value
+
+
+def test_journal_follows_one_line_of_versions(tmp_path):
+    game = Game.open_journal(filename=str(tmp_path / 'session.journal'))
+    changed_game = game.make_action(action=Action(actual_value=Value(value=1)))
+    with pytest.raises(GameJournalError):
+        game.make_action(action=Action(actual_value=Value(value=2)))
+    undone_game = changed_game.undo()
+    with pytest.raises(GameJournalError):
+        changed_game.cancel_last_action()
+    assert undone_game.redo() == changed_game
+    game.journal.close()
+
+
+def test_finished_effects_are_removed_from_game_objects():
+    def bless(v: Value) -> Value:
+        return replace(v, value=v.value + 2)
+
+    def unbless(v: Value) -> Value:
+        return replace(v, value=v.value - 2)
+
+    allies = [Value(value=10, name=f'Ally {i}') for i in range(3)]
+    round_counter = Value(value=0, name='Round')
+    game = Game().make_actions(actions=[Action(actual_value=v) for v in allies + [round_counter]])
+    blessed, bless_effect = apply_effect_to_values(
+            effect=Effect(name='Bless', action=Action(function=bless, rollback_function=unbless), duration_in_seconds=12),
+            values=allies)
+    game = game.make_actions(actions=[Action(previous_value=a, actual_value=b) for a, b in zip(allies, blessed)])
+    game = replace(game, timer=subscribe_effect_to_timer(effect=bless_effect, timer=game.timer))
+    rounds = [Action(previous_value=round_counter, actual_value=replace(round_counter, value=i), duration_in_seconds=6)
+              for i in range(1, 4)]
+
+    sequential_game = game
+    for action in rounds:
+        sequential_game = sequential_game.make_action(action=action)
+        finished = sequential_game.timer.seconds_passed >= 12
+        assert [sequential_game.objects_dict[a.id].value for a in allies] == [10 if finished else 12] * 3
+    assert sequential_game.full_text_search(text_to_search='12') == {}
+    assert sequential_game.objects_dict[allies[0].id].last_action.name == 'Effects Bless finished'
+    batch_game = game.make_actions(actions=rounds)
+    assert [batch_game.objects_dict[a.id].value for a in allies] == [10] * 3
+    assert (batch_game.actions_list, batch_game.timer) == (sequential_game.actions_list, sequential_game.timer)
+
+
+def test_undo_and_redo():
+    versions = [Game(undo_limit=5)]
+    for i in range(12):
+        versions.append(versions[-1].make_action(action=Action(actual_value=Value(value=i))))
+    game = versions[-1].cancel_action_by_number(3)
+    game, _ = game.roll(formula=Formula(text_representation='d20'))
+    # 13 changes: the stack was cut to 5 versions at 10 ones
+    for version in reversed(versions[5:]):
+        game = game.undo()
+        assert game == version
+        assert list(game.objects_dict) == list(version.objects_dict)
+    assert game.undo() is game
+    assert game.dice_position == 1
+    for version in versions[6:]:
+        game = game.redo()
+        assert game == version
+    assert game.redo() == versions[-1].cancel_action_by_number(3)
+    game = game.undo().make_action(action=Action(actual_value=Value(value='new')))
+    assert game.redo() is game
+    assert len(pickle.loads(pickle.dumps(game)).undo_versions) == 0
+
+
+def test_journal_keeps_undo_and_redo(tmp_path):
+    filename = str(tmp_path / 'session.journal')
+    game = journal_session(Game.open_journal(filename=filename, sync_every=1), 0, 10)
+    game = game.cancel_action(action_id=game.actions_list[2].id).undo().undo().undo().redo()
+    assert len(game.actions_list) == 9
+    assert Game.open_journal(filename=filename) == game
+    assert game.checkpoint() == 'OK'
+    game = journal_session(game, 10, 1)
+    undone_game = game.undo()
+    assert undone_game.undo() is undone_game  # the checkpoint can't be undone
+    game = undone_game.redo()
+    assert Game.open_journal(filename=filename) == game
+
+
+def test_make_actions_gives_the_same_game_as_make_action():
+    game = random_session(seed=11, actions_number=300, snapshot_interval=20)
+    removed_object = game.actions_list[0].actual_value
+    actions = list(game.actions_list) + [Action(previous_value=removed_object,
+                                                actual_value=replace(removed_object, value=-1))]
+    cancelled = game.cancel_action(action_id=game.actions_list[0].id)
+    sequential_game, batch_game = Game(snapshot_interval=20), Game(snapshot_interval=20)
+    for action in actions:
+        sequential_game = sequential_game.make_action(action=action)
+    for actions_list in (PersistentVector(), ColumnarActionLog()):
+        initial_game = Game(actions_list=actions_list, snapshot_interval=20)
+        batch_game = initial_game.make_actions(actions=actions).make_actions(actions=[])
+        assert batch_game == sequential_game
+        assert list(batch_game.objects_dict) == list(sequential_game.objects_dict)
+        assert batch_game.timer == sequential_game.timer
+        assert batch_game.actions_index == sequential_game.actions_index
+        assert [s.actions_count for s in batch_game.snapshots] == [s.actions_count for s in sequential_game.snapshots]
+        assert batch_game.full_text_search(text_to_search='1') == sequential_game.full_text_search(text_to_search='1')
+        action_id = actions[100].id
+        assert batch_game.cancel_action(action_id=action_id) == sequential_game.cancel_action(action_id=action_id)
+    assert cancelled.make_actions(actions=actions[-1:]) == cancelled
@@ -0,0 +1,201 @@
+import pickle
+import random
+import pytest
+from persistent_collections import PersistentVector, PersistentMap, FloatLog, PersistentHeap, PersistentStack
+
+
+class CollidingKey:
+    def __init__(self, name):
+        self.name = name
+
+    def __hash__(self):
+        return 42
+
+    def __eq__(self, other):
+        return isinstance(other, CollidingKey) and other.name == self.name
+
+
+def test_empty_vector():
+    vector = PersistentVector()
+    assert len(vector) == 0
+    assert list(vector) == []
+
+
+def test_vector_append_keeps_previous_versions():
+    versions = [PersistentVector()]
+    for i in range(3000):
+        versions.append(versions[-1].append(i))
+    for length in (0, 1, 31, 32, 33, 1024, 1025, 3000):
+        assert list(versions[length]) == list(range(length))
+    assert versions[3000][-1] == 2999
+    assert versions[3000][1500] == 1500
+
+
+def test_vector_branching():
+    base = PersistentVector(range(100))
+    first = base.append('first')
+    second = base.append('second')
+    assert first[-1] == 'first'
+    assert second[-1] == 'second'
+    assert len(base) == 100
+
+
+def test_vector_slice_and_equality():
+    vector = PersistentVector(range(100))
+    assert vector[10:13] == (10, 11, 12)
+    assert vector == tuple(range(100))
+    assert vector == PersistentVector(range(100))
+    assert vector != PersistentVector(range(99))
+
+
+def test_vector_pickle():
+    vector = PersistentVector(range(2000))
+    assert pickle.loads(pickle.dumps(vector)) == vector
+
+
+def test_empty_map():
+    persistent_map = PersistentMap()
+    assert len(persistent_map) == 0
+    assert 'a' not in persistent_map
+    assert persistent_map.get('a') is None
+
+
+def test_map_set_keeps_previous_versions():
+    versions = [PersistentMap()]
+    for i in range(2000):
+        versions.append(versions[-1].set(i, str(i)))
+    assert len(versions[1000]) == 1000
+    assert 1500 not in versions[1000]
+    assert versions[2000][1500] == '1500'
+
+
+def test_map_keeps_insertion_order_like_dict():
+    keys = list(range(500))
+    random.shuffle(keys)
+    persistent_map = PersistentMap()
+    for key in keys:
+        persistent_map = persistent_map.set(key, key)
+    persistent_map = persistent_map.set(keys[0], 'changed')
+    assert list(persistent_map) == keys
+    assert persistent_map.values()[0] == 'changed'
+
+
+def test_map_randomized_against_dict():
+    rng = random.Random(7)
+    reference = {}
+    persistent_map = PersistentMap()
+    for _ in range(5000):
+        key = rng.randrange(300)
+        if rng.random() < 0.3 and key in reference:
+            del reference[key]
+            persistent_map = persistent_map.delete(key)
+        else:
+            reference[key] = rng.random()
+            persistent_map = persistent_map.set(key, reference[key])
+    assert len(persistent_map) == len(reference)
+    assert list(persistent_map.items()) == list(reference.items())
+    assert persistent_map == reference
+
+
+def test_map_hash_collisions():
+    first, second, third = CollidingKey('first'), CollidingKey('second'), CollidingKey('third')
+    persistent_map = PersistentMap({first: 1, second: 2, third: 3})
+    assert persistent_map[second] == 2
+    persistent_map = persistent_map.delete(second)
+    assert second not in persistent_map
+    assert persistent_map[first] == 1
+    assert persistent_map[third] == 3
+
+
+def test_map_pickle():
+    persistent_map = PersistentMap((i, i * 2) for i in range(1000))
+    loaded_map = pickle.loads(pickle.dumps(persistent_map))
+    assert loaded_map == persistent_map
+    assert list(loaded_map) == list(persistent_map)
+
+
+def test_float_log_keeps_running_total_and_previous_versions():
+    versions = [FloatLog()]
+    for i in range(100):
+        versions.append(versions[-1].append(i / 2))
+    assert versions[10].total == sum(i / 2 for i in range(10))
+    assert list(versions[10]) == [i / 2 for i in range(10)]
+    assert versions[100].total == sum(versions[100])
+
+
+def test_float_log_branching():
+    base = FloatLog((1, 2, 3))
+    first = base.append(10)
+    second = base.append(20)
+    assert list(first) == [1, 2, 3, 10]
+    assert list(second) == [1, 2, 3, 20]
+    assert (first.total, second.total, base.total) == (16, 26, 6)
+    assert pickle.loads(pickle.dumps(second)) == second
+
+
+def test_heap_pops_items_in_key_order():
+    rng = random.Random(3)
+    keys = [rng.random() for _ in range(1000)]
+    heap = PersistentHeap()
+    for number, key in enumerate(keys):
+        heap = heap.push(key, number)
+    popped = []
+    full_heap = heap
+    while heap:
+        key, number = heap.peek()
+        assert keys[number] == key
+        popped.append(key)
+        heap = heap.pop()
+    assert popped == sorted(keys)
+    assert len(full_heap) == 1000
+    assert sorted(k for k, _ in pickle.loads(pickle.dumps(full_heap))) == sorted(keys)
+
+
+def test_stack_versions_share_their_bottom():
+    bottom = PersistentStack([1, 2])
+    first, second = bottom.push(3), bottom.push(30)
+    assert (list(first), list(second), list(bottom)) == ([3, 2, 1], [30, 2, 1], [2, 1])
+    assert (first.peek(), len(first.pop()), list(first.limited(2))) == (3, 2, [3, 2])
+    assert list(pickle.loads(pickle.dumps(first))) == [3, 2, 1]
+    with pytest.raises(IndexError):
+        PersistentStack().pop()
+
+
+def test_map_construction_is_the_same_as_setting_keys_one_by_one():
+    rng = random.Random(11)
+    items = [(rng.randrange(3000), rng.random()) for _ in range(5000)] + [(CollidingKey(str(i % 7)), i)
+                                                                           for i in range(20)]
+    built_map = PersistentMap(items)
+    set_map = PersistentMap()
+    for key, value in items:
+        set_map = set_map.set(key, value)
+    assert built_map.items() == set_map.items() == list(dict(items).items())
+    assert len(built_map.delete(items[0][0])) == len(dict(items)) - 1
+
+
+def test_extend_is_the_same_as_appending_one_by_one():
+    rng = random.Random(3)
+    vector, log = PersistentVector(range(40)), FloatLog([0.1, 0.2])
+    for _ in range(30):
+        items = [rng.random() for _ in range(rng.randrange(100))]
+        appended_vector, appended_log = vector, log
+        for item in items:
+            appended_vector, appended_log = appended_vector.append(item), appended_log.append(item)
+        extended_vector, extended_log = vector.extend(items), log.extend(items)
+        assert list(extended_vector) == list(appended_vector)
+        assert list(extended_log) == list(appended_log)
+        assert extended_log.total == appended_log.total
+        vector, log = extended_vector, extended_log
+    assert list(vector[:40]) == list(range(40))
+
+
+def test_map_update_of_many_keys_is_the_same_as_setting_them():
+    rng = random.Random(5)
+    base = PersistentMap((CollidingKey(i) if i % 10 == 0 else i, i) for i in range(200))
+    for items_number in (3, 150, 400):
+        items = [(rng.randrange(300), rng.random()) for _ in range(items_number)] + [(CollidingKey(20), 'x')]
+        updated = base
+        for key, value in items:
+            updated = updated.set(key, value)
+        assert list(base.update(items).items()) == list(updated.items())
+        assert len(base.update(items)) == len(updated)